@@ -0,0 +1,464 @@
+"""Headless JSON API over the same tables, write path and caches as food_app.py.
+
+Runs next to the Streamlit UI as its own process (stdlib HTTP server, one
+thread per connection, HTTP/1.1 keep-alive):
+
+    python api.py serve [--host 0.0.0.0] [--port 8080]
+
+Endpoints, where <resource> is providers, receivers, listings or claims:
+
+    GET    /<resource>?limit=100&after=<id>  keyset page, ordered by ID; next_after
+                                             is the cursor of the following page
+    GET    /<resource>/<id>
+    POST   /<resource>                       one object or a list (bulk); missing
+                                             IDs are allocated from id_sequences;
+                                             given IDs below its next ID are 409
+    PUT    /<resource>/<id>                  full replacement of the row
+    DELETE /<resource>/<id>
+    POST   /<resource>/delete                {"ids": [...]} bulk delete
+    GET    /deletion-jobs/<id>               progress of a background delete
+    GET    /queries                          canned query names and questions
+    GET    /queries/<name>                   result of one canned query (queries.py)
+    GET    /health
+
+Writes go through crud.Store, so rollups stay exact and key validation is
+the same as in the app. With deletes.background, deleting providers or
+receivers answers 202 with the IDs of the deletion jobs that remove their
+children (see deletions.py); reads hide soft-deleted rows meanwhile. Reads go through the shared cache (cache.backend)
+when it is on; a write bumps its data version, so API and Streamlit workers
+invalidate each other. Every GET carries an ETag over the response body and
+answers If-None-Match with 304. The API's Store keeps the same per-process
+caches as the app's (proximity index, column statistics and, with
+analytics.backend = "sketch", the sketch snapshot), built on the first write
+that needs them. Requests wait up to database.connect_timeout for a pooled
+connection and then answer 503. The API works on the one database only and
+refuses to start with sharding.enabled.
+
+`python api.py loadtest` measures requests per second at a fixed p99
+latency against a running server.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import mysql.connector
+import pandas as pd
+
+import columnar
+import crud
+import deletions
+import geo
+import ids
+import queries
+import shared_cache
+import sketches
+import table_stats
+import validation
+from config import ConfigError, load_config
+
+RESOURCES = {
+    "providers": "providers_data",
+    "receivers": "receivers_data",
+    "listings": "food_listings_data",
+    "claims": "claims_data",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.payload = {"error": message, **details}
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an integer")
+
+
+class Api:
+    """Request handling independent of HTTP: handle() returns (status, payload)."""
+
+    def __init__(self, config):
+        if config.sharding.enabled:
+            # Reads and writes below go to the one database; ShardedStore serves only the Streamlit app
+            raise ConfigError("the HTTP API does not support sharding; turn sharding.enabled off to serve it")
+        self.config = config
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.cache = shared_cache.create_shared_cache(config.cache)
+        self.registry = validation.IdRegistry(self.connect)
+        self.allocator = ids.IdAllocator(self.connect, config.database.id_block_size)
+        self.store = crud.Store(self.connect, registry=lambda: self.registry, on_change=self.changed,
+                                outbox=config.outbox.enabled, geo_index=self.geo_index,
+                                sketch_store=self.sketch_store, table_stats=self.table_stats)
+
+    def connect(self):
+        """Pooled connection; waits up to connect_timeout for a free one, then answers 503."""
+        db = self.config.database
+        deadline = time.monotonic() + db.connect_timeout
+        while True:
+            try:
+                return mysql.connector.connect(
+                    host=db.host,
+                    user=db.user,
+                    password=db.password,
+                    database=db.database,
+                    port=db.port,
+                    pool_name="food_api",
+                    pool_size=db.pool_size,
+                    connection_timeout=db.connect_timeout,
+                    init_command=f"SET SESSION MAX_EXECUTION_TIME={db.read_timeout * 1000}"
+                )
+            except mysql.connector.errors.PoolError:
+                if time.monotonic() >= deadline:
+                    raise ApiError(503, "all database connections are busy, retry later")
+                time.sleep(0.05)
+
+    def resource(self, name, build):
+        """Build a per-process cache once, on first use (the API's counterpart of st.cache_resource)."""
+        with self.lock:
+            if name not in self.resources:
+                self.resources[name] = build()
+            return self.resources[name]
+
+    def geo_index(self):
+        def build():
+            # Geocoding the tables happens in the background on the index's first read, never on a write
+            geo_config = self.config.geo
+            gazetteer = geo.Gazetteer.load(geo_config.gazetteer_path, geo_config.approximate_unknown)
+            return geo.LazyProximityIndex(gazetteer, self.connect, geo_config.cell_km, geo_config.rebuild_seconds)
+        return self.resource("geo_index", build)
+
+    def sketch_store(self):
+        if self.config.analytics.backend != "sketch":
+            return None
+
+        def build():
+            store = sketches.SketchStore(self.config.analytics.sketch_path, self.config.analytics.sketch_save_seconds)
+            if not store.load():
+                conn = self.connect()
+                try:
+                    store.rebuild(conn)
+                finally:
+                    conn.close()
+            return store
+        return self.resource("sketch_store", build)
+
+    def table_stats(self):
+        return self.resource("table_stats", lambda: table_stats.TableStats(self.connect, self.config.ui.table_stats_refresh_seconds))
+
+    def changed(self):
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def fetch(self, key, sql, params=()):
+        """Run a read, through the shared cache when it is on; returns the rows as tuples."""
+        def load():
+            conn = self.connect()
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+                conn.close()
+        if self.cache is None:
+            return load()
+        return self.cache.get_or_load(key, load)
+
+    def handle(self, method, path, query, body):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok"}
+        if parts and parts[0] == "queries" and method == "GET":
+            return self.canned_query(parts[1] if len(parts) > 1 else None)
+        if len(parts) == 2 and parts[0] == "deletion-jobs" and method == "GET":
+            return self.deletion_job(_int(parts[1], "id"))
+        if not parts or parts[0] not in RESOURCES or len(parts) > 2:
+            raise ApiError(404, f"no such endpoint: {path}")
+        table = RESOURCES[parts[0]]
+        if len(parts) == 1:
+            if method == "GET":
+                return self.list_rows(table, query)
+            if method == "POST":
+                return self.create(table, body)
+        elif parts[1] == "delete" and method == "POST":
+            if not isinstance(body, dict) or not isinstance(body.get("ids"), list):
+                raise ApiError(400, 'body must be an object like {"ids": [1, 2]}')
+            keys = [_int(key, "ids") for key in body["ids"]]
+            if self.background_deletes(table):
+                jobs = [self.store.soft_delete(table, key) for key in keys]
+                return 202, {"jobs": [job for job in jobs if job is not None]}
+            return 200, {"deleted": self.store.delete(table, keys)}
+        else:
+            key = _int(parts[1], "id")
+            if method == "GET":
+                return self.get_row(table, key)
+            if method == "PUT":
+                return self.replace_row(table, key, body)
+            if method == "DELETE" and self.background_deletes(table):
+                job = self.store.soft_delete(table, key)
+                if job is None:
+                    raise ApiError(404, f"no row {key} in {parts[0]}")
+                return 202, {"job": job}
+            if method == "DELETE":
+                if self.store.delete(table, [key]) == 0:
+                    raise ApiError(404, f"no row {key} in {parts[0]}")
+                return 204, None
+        raise ApiError(405, f"{method} not allowed on {path}")
+
+    def background_deletes(self, table):
+        return self.config.deletes.background and table in validation.SOFT_DELETE_TABLES
+
+    def deletion_job(self, job_id):
+        job = deletions.get_job(self.connect, job_id)
+        if job is None:
+            raise ApiError(404, f"no deletion job {job_id}")
+        return 200, job
+
+    def list_rows(self, table, query):
+        columns = crud.TABLE_COLUMNS[table]
+        limit = min(_int(query.get("limit", self.config.api.page_size), "limit"), self.config.api.max_page_size)
+        after = _int(query.get("after", 0), "after")
+        if limit <= 0:
+            raise ApiError(400, "limit must be positive")
+        # Keyset pagination: the primary key index finds the page start without skipping rows
+        rows = self.fetch(
+            f"api:{table}:after={after}:limit={limit}",
+            f"{deletions.live_query(table)} AND {columns[0]} > %s ORDER BY {columns[0]} LIMIT %s",
+            (after, limit + 1)
+        )
+        items = [dict(zip(columns, row)) for row in rows[:limit]]
+        next_after = items[-1][columns[0]] if len(rows) > limit else None
+        return 200, {"items": items, "next_after": next_after}
+
+    def get_row(self, table, key):
+        columns = crud.TABLE_COLUMNS[table]
+        rows = self.fetch(f"api:{table}:{key}",
+                          f"{deletions.live_query(table)} AND {columns[0]} = %s", (key,))
+        if not rows:
+            raise ApiError(404, f"no row {key} in {table}")
+        return 200, dict(zip(columns, rows[0]))
+
+    def create(self, table, body):
+        records = body if isinstance(body, list) else [body]
+        if not records or not all(isinstance(r, dict) for r in records):
+            raise ApiError(400, "body must be an object or a non-empty list of objects")
+        columns = crud.TABLE_COLUMNS[table]
+        missing_ids = [r for r in records if r.get(columns[0]) is None]
+        explicit_keys = [r[columns[0]] for r in records if r.get(columns[0]) is not None]
+        for record, new_id in zip(missing_ids, self.allocator.allocate(table, len(missing_ids))):
+            record[columns[0]] = new_id
+        rows = pd.DataFrame(records).reindex(columns=columns)
+        problems = validation.validate_batch(self.registry, table, rows)
+        if not problems.empty:
+            raise ApiError(400, "validation failed",
+                           problems=json.loads(problems.to_json(orient="records", default_handler=str)))
+        try:
+            keys = self.store.insert(table, [{c: r.get(c) for c in columns} for r in records],
+                                     explicit_keys=explicit_keys)
+        except ids.ExplicitIdError as e:
+            raise ApiError(409, str(e))
+        except mysql.connector.IntegrityError as e:
+            self.registry.invalidate()
+            raise ApiError(409, f"key conflict: {e}")
+        return 201, {"ids": keys}
+
+    def replace_row(self, table, key, body):
+        columns = crud.TABLE_COLUMNS[table]
+        if not isinstance(body, dict):
+            raise ApiError(400, "body must be an object")
+        missing = [c for c in columns[1:] if c not in body]
+        if missing:
+            raise ApiError(400, f"missing columns: {', '.join(missing)}")
+        row = {**{c: body[c] for c in columns[1:]}, columns[0]: key}
+        problems = validation.validate_batch(self.registry, table, pd.DataFrame([row]), check_existing_keys=False)
+        if not problems.empty:
+            raise ApiError(400, "validation failed",
+                           problems=json.loads(problems.to_json(orient="records", default_handler=str)))
+        if self.store.update(table, row) == 0:
+            raise ApiError(404, f"no row {key} in {table} (or nothing changed)")
+        return 200, row
+
+    def canned_query(self, name):
+        if name is None:
+            return 200, [{"name": n, "question": q} for n, (q, _, _) in queries.CANNED_QUERIES.items()]
+        if name not in queries.CANNED_QUERIES:
+            raise ApiError(404, f"no canned query '{name}'")
+        _, sql, columns = queries.CANNED_QUERIES[name]
+
+        def load():
+            conn = self.connect()
+            try:
+                return columnar.read_frame(conn, sql, self.config.database, columns=columns)
+            finally:
+                conn.close()
+        # Same cache key as run_query() in food_app.py, so the UI and the API share results
+        key = f"query-frame:{hashlib.sha1(sql.encode()).hexdigest()}"
+        frame = load() if self.cache is None else self.cache.get_or_load(key, load)
+        rows = frame.astype(object).where(frame.notna(), None).values.tolist()
+        return 200, {"columns": columns, "rows": rows}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api = None
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            status, payload = self.api.handle(method, url.path, query, body)
+        except ApiError as e:
+            status, payload = e.status, e.payload
+        except json.JSONDecodeError as e:
+            status, payload = 400, {"error": f"invalid JSON: {e}"}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+
+        data = b"" if payload is None else json.dumps(payload, default=_json_default).encode()
+        etag = None
+        if method == "GET" and status == 200:
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                status, data = 304, b""
+        self.send_response(status)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(config, host=None, port=None):
+    Handler.api = Api(config)
+    server = ThreadingHTTPServer((host or config.api.host, port or config.api.port), Handler)
+    server.daemon_threads = True
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}")
+    server.serve_forever()
+
+
+def load_test(url, paths, p99_ms, seconds, max_concurrency):
+    """Double the client count until p99 exceeds p99_ms; report the best throughput within it."""
+    from http.client import HTTPConnection
+
+    target = urlsplit(url)
+    results = []
+    concurrency = 1
+    while concurrency <= max_concurrency:
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def client(offset):
+            conn = HTTPConnection(target.hostname, target.port or 80, timeout=30)
+            etags = {}
+            local, failed, i = [], 0, offset
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                # Half the requests revalidate with If-None-Match, as a polling integration would
+                headers = {"If-None-Match": etags[path]} if path in etags and i % 2 else {}
+                start = time.perf_counter()
+                try:
+                    conn.request("GET", path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                except OSError:
+                    failed += 1
+                    conn.close()
+                    conn = HTTPConnection(target.hostname, target.port or 80, timeout=30)
+                    continue
+                local.append(time.perf_counter() - start)
+                if response.status >= 400:
+                    failed += 1
+                elif response.getheader("ETag"):
+                    etags[path] = response.getheader("ETag")
+            conn.close()
+            with lock:
+                latencies.extend(local)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ordered = sorted(latencies)
+        p99 = ordered[int(len(ordered) * 0.99) - 1] * 1000 if ordered else float("inf")
+        results.append({"clients": concurrency, "rps": round(len(latencies) / seconds, 1),
+                        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2) if ordered else None,
+                        "p99_ms": round(p99, 2), "errors": errors[0]})
+        print(results[-1])
+        if p99 > p99_ms:
+            break
+        concurrency *= 2
+
+    within = [r for r in results if r["p99_ms"] <= p99_ms]
+    if within:
+        best = max(within, key=lambda r: r["rps"])
+        print(f"{best['rps']} requests/s at p99 {best['p99_ms']} ms <= {p99_ms} ms with {best['clients']} clients")
+    else:
+        print(f"p99 was above {p99_ms} ms even with one client")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the API server")
+    serve_parser.add_argument("--host")
+    serve_parser.add_argument("--port", type=int)
+    test_parser = commands.add_parser("loadtest", help="measure requests/s at a fixed p99 against a running server")
+    test_parser.add_argument("--url", default="http://127.0.0.1:8080")
+    test_parser.add_argument("--path", action="append", dest="paths",
+                             help="GET path to request (repeatable); default is a mix of pages and canned queries")
+    test_parser.add_argument("--p99-ms", type=float, default=50.0)
+    test_parser.add_argument("--seconds", type=float, default=10.0)
+    test_parser.add_argument("--max-clients", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(load_config(), args.host, args.port)
+    else:
+        load_test(args.url, args.paths or ["/providers?limit=100", "/listings?limit=100", "/claims?limit=100",
+                                           "/queries/top_claim_status", "/queries/claim_status_percentages"],
+                  args.p99_ms, args.seconds, args.max_clients)
@@ -0,0 +1,307 @@
+"""Expiry sweeper: move expired listings and closed claims into monthly archives.
+
+food_listings_archive and claims_archive mirror the hot tables plus an
+Archived_At column. They are RANGE partitioned by month on Expiry_Date and
+Timestamp, so a month can be read on its own
+(SELECT ... FROM claims_archive PARTITION (p202601)) or dropped in one
+statement with drop_partitions_before(). Partitioned tables cannot have
+foreign keys, so the archives have none.
+
+Each batch moves at most batch_size rows in its own short transaction:
+- listings whose Expiry_Date is more than listing_grace_days in the past,
+  together with all their claims (otherwise ON DELETE CASCADE would drop them);
+- Completed/Cancelled claims older than claim_retention_days.
+
+claims_rollup is left untouched, so claim trends keep covering archived history;
+archived listings are subtracted from listings_rollup. With events=True the
+moved rows are also recorded in change_outbox as "archive" events. Given a
+crud.Store, the moved rows are read before each batch deletes them and
+Store.forget() drops them from the ID registry, sketches, table statistics
+and proximity index after commit, as for a delete through the Store.
+
+Archive months get their own partition before rows are moved into them; a
+missing month is split off the partition that covers it (the next monthly
+partition above it, or pmax), so backdated rows and months below dropped
+ones are handled too.
+
+Run once from cron with `python archive.py`, or let food_app.py start an
+ArchiveSweeper thread when archive.enabled is set.
+"""
+import bisect
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+import outbox
+import rollups
+from config import load_config
+
+logger = logging.getLogger(__name__)
+
+CLOSED_CLAIM_STATUSES = ("Completed", "Cancelled")
+
+ARCHIVE_TABLES = {
+    "food_listings_archive": "Expiry_Date",
+    "claims_archive": "Timestamp",
+}
+
+
+def create_archive_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS food_listings_archive (
+            Food_ID INT NOT NULL,
+            Food_Name VARCHAR(255),
+            Quantity INT,
+            Expiry_Date DATE NOT NULL,
+            Provider_ID INT,
+            Provider_Type VARCHAR(100),
+            Location VARCHAR(255),
+            Food_Type VARCHAR(100),
+            Meal_Type VARCHAR(100),
+            Archived_At DATETIME NOT NULL,
+            PRIMARY KEY (Food_ID, Expiry_Date)
+        ) ENGINE=InnoDB
+        PARTITION BY RANGE (TO_DAYS(Expiry_Date)) (PARTITION pmax VALUES LESS THAN MAXVALUE);
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS claims_archive (
+            Claim_ID INT NOT NULL,
+            Food_ID INT,
+            Receiver_ID INT,
+            Status VARCHAR(100),
+            Timestamp DATETIME NOT NULL,
+            Archived_At DATETIME NOT NULL,
+            PRIMARY KEY (Claim_ID, Timestamp)
+        ) ENGINE=InnoDB
+        PARTITION BY RANGE (TO_DAYS(Timestamp)) (PARTITION pmax VALUES LESS THAN MAXVALUE);
+    """)
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def next_month(day):
+    return date(day.year + (day.month == 12), day.month % 12 + 1, 1)
+
+
+def existing_partitions(cursor, table):
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    """, (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _partition_month(name):
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+
+def ensure_partitions(cursor, table, first_day, last_day):
+    """Give every month in [first_day, last_day] its own partition.
+
+    A missing month is split off the partition that currently holds it: the
+    lowest monthly partition above it (RANGE partitions hold everything below
+    their bound), or pmax. Names pYYYYMM sort in month order.
+    """
+    monthly = sorted(existing_partitions(cursor, table) - {"pmax"})
+    month = month_start(first_day)
+    while month <= last_day:
+        name = f"p{month:%Y%m}"
+        if name not in monthly:
+            position = bisect.bisect(monthly, name)
+            covering = monthly[position] if position < len(monthly) else "pmax"
+            bound = ("MAXVALUE" if covering == "pmax"
+                     else f"(TO_DAYS('{next_month(_partition_month(covering)):%Y-%m-%d}'))")
+            cursor.execute(f"""
+                ALTER TABLE {table} REORGANIZE PARTITION {covering} INTO (
+                    PARTITION {name} VALUES LESS THAN (TO_DAYS('{next_month(month):%Y-%m-%d}')),
+                    PARTITION {covering} VALUES LESS THAN {bound}
+                )
+            """)
+            monthly.insert(position, name)
+        month = next_month(month)
+
+
+def drop_partitions_before(cursor, table, before_month):
+    """Drop whole archive months older than before_month; returns the dropped partition names."""
+    cutoff = f"p{month_start(before_month):%Y%m}"
+    old = sorted(name for name in existing_partitions(cursor, table) if name != "pmax" and name < cutoff)
+    if old:
+        cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(old)}")
+    return old
+
+
+def _oldest(cursor, sql, params):
+    cursor.execute(sql, params)
+    value = cursor.fetchone()[0]
+    if isinstance(value, datetime):
+        value = value.date()
+    return value
+
+
+def _move_batch(conn, select_ids_sql, params, move_statements, batch_size):
+    """Pick up to batch_size ids and run move_statements for them in one transaction."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"{select_ids_sql} LIMIT {int(batch_size)}", params)
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            conn.rollback()
+            return ids, {}
+        placeholders = ", ".join(["%s"] * len(ids))
+        moved = {}
+        for name, step in move_statements:
+            if callable(step):
+                step(cursor, ids)
+                continue
+            cursor.execute(step.format(ids=placeholders), tuple(ids))
+            moved[name] = cursor.rowcount
+        conn.commit()
+        return ids, moved
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+LISTING_MOVES = (
+    ("claims_archived", """
+        REPLACE INTO claims_archive (Claim_ID, Food_ID, Receiver_ID, Status, Timestamp, Archived_At)
+        SELECT Claim_ID, Food_ID, Receiver_ID, Status, COALESCE(Timestamp, NOW()), NOW()
+        FROM claims_data WHERE Food_ID IN ({ids})
+    """),
+    ("claims_deleted", "DELETE FROM claims_data WHERE Food_ID IN ({ids})"),
+    ("listing_rollup", lambda cursor, ids: rollups.apply_listing_delta(
+        cursor, f"f.Food_ID IN ({', '.join(['%s'] * len(ids))})", tuple(ids), -1)),
+    ("listings_archived", """
+        REPLACE INTO food_listings_archive
+            (Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID, Provider_Type, Location, Food_Type, Meal_Type, Archived_At)
+        SELECT Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID, Provider_Type, Location, Food_Type, Meal_Type, NOW()
+        FROM food_listings_data WHERE Food_ID IN ({ids})
+    """),
+    ("listings_deleted", "DELETE FROM food_listings_data WHERE Food_ID IN ({ids})"),
+)
+
+CLAIM_MOVES = (
+    ("claims_archived", """
+        REPLACE INTO claims_archive (Claim_ID, Food_ID, Receiver_ID, Status, Timestamp, Archived_At)
+        SELECT Claim_ID, Food_ID, Receiver_ID, Status, Timestamp, NOW()
+        FROM claims_data WHERE Claim_ID IN ({ids})
+    """),
+    ("claims_deleted", "DELETE FROM claims_data WHERE Claim_ID IN ({ids})"),
+)
+
+
+def _archive_events(table, primary_key):
+    return ("events", lambda cursor, ids: outbox.record(
+        cursor, outbox.delete_events(cursor, table, primary_key, ids, "archive")))
+
+
+def _capture_removal(store, table, removals):
+    return ("capture", lambda cursor, ids: removals.append(store.capture_removal(cursor, table, ids)))
+
+
+def sweep(conn, settings, today=None, events=False, store=None):
+    """Run one archive pass and return a report of rows moved; store is an optional crud.Store to keep current."""
+    today = today or date.today()
+    listing_cutoff = today - timedelta(days=settings.listing_grace_days)
+    claim_cutoff = datetime.combine(today - timedelta(days=settings.claim_retention_days), datetime.min.time())
+    status_placeholders = ", ".join(["%s"] * len(CLOSED_CLAIM_STATUSES))
+    report = {"started_at": datetime.now(), "batches": 0, "listings_moved": 0, "claims_moved": 0}
+    start = time.perf_counter()
+
+    cursor = conn.cursor()
+    try:
+        create_archive_tables(cursor)
+        oldest_listing = _oldest(cursor, "SELECT MIN(Expiry_Date) FROM food_listings_data WHERE Expiry_Date < %s",
+                                 (listing_cutoff,))
+        oldest_claim = _oldest(cursor, "SELECT MIN(Timestamp) FROM claims_data WHERE Timestamp < %s", (claim_cutoff,))
+        if oldest_listing:
+            ensure_partitions(cursor, "food_listings_archive", oldest_listing, today)
+        if oldest_listing or oldest_claim:
+            ensure_partitions(cursor, "claims_archive", min(d for d in (oldest_listing, oldest_claim) if d), today)
+        conn.commit()
+    finally:
+        cursor.close()
+
+    listing_moves, claim_moves = LISTING_MOVES, CLAIM_MOVES
+    if events:
+        # Read the event keys before the moves delete the rows
+        listing_moves = (_archive_events("food_listings_data", "Food_ID"),) + listing_moves
+        claim_moves = (_archive_events("claims_data", "Claim_ID"),) + claim_moves
+    removals = []
+    if store is not None:
+        # Read the moved rows for the caches before any step of the batch deletes them
+        listing_moves = (_capture_removal(store, "food_listings_data", removals),) + listing_moves
+        claim_moves = (_capture_removal(store, "claims_data", removals),) + claim_moves
+    passes = (
+        ("SELECT Food_ID FROM food_listings_data WHERE Expiry_Date < %s ORDER BY Food_ID",
+         (listing_cutoff,), listing_moves),
+        (f"SELECT Claim_ID FROM claims_data WHERE Timestamp < %s AND Status IN ({status_placeholders}) ORDER BY Claim_ID",
+         (claim_cutoff,) + CLOSED_CLAIM_STATUSES, claim_moves),
+    )
+    for select_ids_sql, params, moves in passes:
+        while report["batches"] < settings.max_batches:
+            ids, moved = _move_batch(conn, select_ids_sql, params, moves, settings.batch_size)
+            for removal in removals:
+                store.forget(removal)
+            removals.clear()
+            if not ids:
+                break
+            report["batches"] += 1
+            report["listings_moved"] += moved.get("listings_deleted", 0)
+            report["claims_moved"] += moved.get("claims_deleted", 0)
+            if settings.batch_pause_ms:
+                time.sleep(settings.batch_pause_ms / 1000)
+
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info("Archive sweep moved %(listings_moved)s listings and %(claims_moved)s claims "
+                "in %(batches)s batches (%(seconds)ss)", report)
+    return report
+
+
+class ArchiveSweeper(threading.Thread):
+    """Daemon thread that runs sweep() every interval_seconds and keeps recent reports."""
+
+    def __init__(self, connect, settings, history_size=20, events=False, store=None):
+        super().__init__(name="archive-sweeper", daemon=True)
+        self.connect = connect
+        self.settings = settings
+        self.events = events
+        self.store = store
+        self.history = []
+        self.history_size = history_size
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                conn = self.connect()
+                try:
+                    self.history.append(sweep(conn, self.settings, events=self.events, store=self.store))
+                    del self.history[:-self.history_size]
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception("Archive sweep failed")
+            self.stop_event.wait(self.settings.interval_seconds)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    config = load_config()
+    db = config.database
+    conn = mysql.connector.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                   database=db.database, connection_timeout=db.connect_timeout)
+    try:
+        print(sweep(conn, config.archive, events=config.outbox.enabled))
+    finally:
+        conn.close()
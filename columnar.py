@@ -0,0 +1,171 @@
+"""Columnar result fetching for table loads and canned queries.
+
+read_frame() turns a query result into a DataFrame without first building
+the whole result as a list of Python tuples:
+
+- with connectorx installed (and database.arrow_fetch on), the result set is
+  decoded in native code straight into Arrow record batches; text columns are
+  handed to pandas as Arrow-backed strings that keep the Arrow buffers, and
+  numeric and timestamp columns become NumPy arrays, without a copy where no
+  NULLs need filling. Other types (DATE, DECIMAL) become Python objects as
+  with the DBAPI path, so code working on the frames sees the same dtypes
+  apart from text columns, whose NULLs are pd.NA instead of None;
+- otherwise rows are streamed from the DBAPI connection with fetchmany() and
+  turned into columns FETCH_BATCH_ROWS rows at a time, so only one batch of
+  tuples exists at once.
+
+connectorx opens its own connection to the same host and port as the given
+DBAPI connection (so replica routing still applies), but does not take
+query parameters or the session's MAX_EXECUTION_TIME; parameterized queries
+always use the DBAPI path.
+
+`python columnar.py [rows]` compares the paths on a generated result of
+`rows` rows (default 1,000,000), each in its own process: latency, Python
+heap peak (tracemalloc), Arrow memory pool peak, peak RSS and the size of
+the resulting DataFrame.
+"""
+import contextlib
+from urllib.parse import quote
+
+import pandas as pd
+
+try:
+    import connectorx
+except ImportError:
+    connectorx = None
+
+FETCH_BATCH_ROWS = 50_000
+
+
+def _uri(conn, user, password, database):
+    return f"mysql://{quote(user, safe='')}:{quote(password, safe='')}@{conn.server_host}:{conn.server_port}/{database}"
+
+
+def _arrow_string_types(arrow_type):
+    import pyarrow
+    if arrow_type in (pyarrow.string(), pyarrow.large_string()):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def read_arrow(conn, sql, user, password, database):
+    """Result of sql as a pyarrow Table, read by connectorx from conn's server."""
+    return connectorx.read_sql(_uri(conn, user, password, database), sql, return_type="arrow")
+
+
+def read_batches(conn, sql, params=None, batch_rows=FETCH_BATCH_ROWS):
+    """Stream the result of sql through the DBAPI cursor, one column-oriented batch at a time."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params or ())
+        names = [d[0] for d in cursor.description]
+        frames = []
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            frames.append(pd.DataFrame.from_records(rows, columns=names))
+        if not frames:
+            return pd.DataFrame(columns=names)
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    finally:
+        cursor.close()
+
+
+def read_frame(conn, sql, settings, params=None, columns=None):
+    """DataFrame of the result of sql; settings is the DatabaseConfig that conn was opened with.
+
+    columns, if given, renames the result columns (canned queries label them).
+    """
+    if params is None and settings.arrow_fetch and connectorx is not None:
+        # A workload.CapturingConnection records the statement, which bypasses its cursors
+        capture = getattr(conn, "capture", None)
+        with capture(sql) if capture else contextlib.nullcontext():
+            table = read_arrow(conn, sql, settings.user, settings.password, settings.database)
+        frame = table.to_pandas(types_mapper=_arrow_string_types)
+    else:
+        frame = read_batches(conn, sql, params)
+    if columns is not None:
+        frame.columns = columns
+    return frame
+
+
+def bench_sql(rows):
+    """A claims-shaped result of `rows` rows (a power of ten) generated by the server, no table needed."""
+    digits = "(SELECT 0 AS d UNION ALL " + " UNION ALL ".join(f"SELECT {i}" for i in range(1, 10)) + ")"
+    places = max(len(str(rows)) - 1, 1)
+    number = " + ".join(f"{10 ** i} * t{i}.d" for i in range(places))
+    sources = ", ".join(f"{digits} AS t{i}" for i in range(places))
+    return f"""
+        SELECT n AS Claim_ID, n % 1000 AS Food_ID, n % 500 AS Receiver_ID,
+               ELT(1 + n % 3, 'Pending', 'Completed', 'Cancelled') AS Status,
+               TIMESTAMP('2025-01-01') + INTERVAL n SECOND AS Timestamp
+        FROM (SELECT {number} AS n FROM {sources}) numbers
+    """
+
+
+if __name__ == "__main__":
+    import gc
+    import resource
+    import subprocess
+    import sys
+    import time
+    import tracemalloc
+
+    import mysql.connector
+
+    from config import load_config
+
+    db = load_config().database
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sql = bench_sql(rows)
+
+    def tuples_then_frame(conn):
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        frame = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+        cursor.close()
+        return frame
+
+    paths = {
+        "fetchall+DataFrame": tuples_then_frame,
+        "read_sql_query": lambda conn: pd.read_sql_query(sql, conn),
+        "batched": lambda conn: read_batches(conn, sql),
+    }
+    if connectorx is not None:
+        paths["arrow"] = lambda conn: read_arrow(conn, sql, db.user, db.password, db.database).to_pandas(
+            types_mapper=_arrow_string_types)
+
+    if len(sys.argv) < 3:
+        # One process per path, so peak RSS and the Arrow pool peak are not shared between them
+        if connectorx is None:
+            print("connectorx is not installed; the Arrow path is skipped")
+        print(f"{'path':<20} {'seconds':>8} {'heap peak MB':>13} {'arrow peak MB':>14} {'peak RSS MB':>12} {'frame MB':>9}")
+        for name in paths:
+            subprocess.run([sys.executable, __file__, str(rows), name], check=True)
+        sys.exit(0)
+
+    name = sys.argv[2]
+    read = paths[name]
+    conn = mysql.connector.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                   database=db.database)
+    # Timed run without tracing, then a traced run for the Python heap peak
+    start = time.perf_counter()
+    frame = read(conn)
+    seconds = time.perf_counter() - start
+    assert len(frame) == rows, f"{name} returned {len(frame)} rows"
+    size = frame.memory_usage(deep=True).sum() / 2**20
+    del frame
+    gc.collect()
+    tracemalloc.start()
+    read(conn)
+    heap_peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    conn.close()
+    try:
+        import pyarrow
+        arrow_peak = pyarrow.default_memory_pool().max_memory() / 2**20
+    except ImportError:
+        arrow_peak = 0.0
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{name:<20} {seconds:>8.2f} {heap_peak:>13.1f} {arrow_peak:>14.1f} {rss_peak:>12.1f} {size:>9.1f}")
@@ -0,0 +1,351 @@
+"""Application settings for the Local Food Waste Management System.
+
+Settings are resolved once at startup in this order (later wins):
+built-in defaults -> TOML config file -> environment variables.
+
+The config file is read from $FOOD_APP_CONFIG, or food_app.toml next to
+this module if it exists. Example:
+
+    [database]
+    host = "db.internal"
+    replicas = ["replica1:3306", "replica2:3306"]
+    pool_size = 10
+
+    [cache]
+    table_ttl = 30
+"""
+import os
+import tomllib
+from dataclasses import dataclass, field, fields, replace
+from typing import List, Optional
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_FILE = os.path.join(APP_DIR, "food_app.toml")
+
+ANALYTICS_BACKENDS = ("mysql", "sketch")
+CACHE_BACKENDS = ("none", "sqlite", "redis")
+TRUE_VALUES = ("true", "1", "yes")
+FALSE_VALUES = ("false", "0", "no")
+
+
+class ConfigError(ValueError):
+    """Raised when a setting is missing or out of range."""
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    host: str
+    port: int
+
+    @classmethod
+    def parse(cls, value: str) -> "Endpoint":
+        host, _, port = value.strip().partition(":")
+        try:
+            return cls(host=host, port=int(port) if port else 3306)
+        except ValueError:
+            raise ConfigError(f"Invalid endpoint '{value}', expected host:port")
+
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    host: str = "localhost"
+    port: int = 3306
+    user: str = "root"
+    password: str = "Localhost@123"
+    database: str = "food_data"
+    replicas: List[Endpoint] = field(default_factory=list)
+    max_replica_lag: int = 10
+    pool_size: int = 5
+    connect_timeout: int = 10
+    read_timeout: int = 30
+    id_block_size: int = 100
+    arrow_fetch: bool = True
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    table_ttl: int = 5
+    max_entries: int = 100
+    backend: str = "none"
+    shared_path: str = os.path.join(APP_DIR, ".cache", "shared_cache.sqlite")
+    shared_max_bytes: int = 512 * 1024 * 1024
+    redis_url: str = "redis://localhost:6379/0"
+
+
+@dataclass(frozen=True)
+class UIConfig:
+    page_size: int = 100
+    export_chunk_size: int = 10000
+    dashboard_image: Optional[str] = None
+    dashboard_refresh_seconds: int = 10
+    table_stats_refresh_seconds: int = 600
+
+
+@dataclass(frozen=True)
+class AnalyticsConfig:
+    backend: str = "mysql"
+    sketch_path: str = "food_sketches.pkl"
+    sketch_save_seconds: int = 5
+
+
+@dataclass(frozen=True)
+class GeoConfig:
+    gazetteer_path: str = os.path.join(APP_DIR, "gazetteer.csv")
+    cell_km: float = 10.0
+    approximate_unknown: bool = True
+    rebuild_seconds: int = 600
+
+
+@dataclass(frozen=True)
+class ArchiveConfig:
+    enabled: bool = False
+    interval_seconds: int = 3600
+    batch_size: int = 500
+    max_batches: int = 200
+    batch_pause_ms: int = 50
+    listing_grace_days: int = 0
+    claim_retention_days: int = 30
+
+
+@dataclass(frozen=True)
+class OutboxConfig:
+    enabled: bool = False
+    log_dir: str = os.path.join(APP_DIR, "events")
+    relay_interval_seconds: int = 1
+    batch_size: int = 1000
+
+
+@dataclass(frozen=True)
+class DeletesConfig:
+    background: bool = False
+    batch_size: int = 500
+    batch_pause_ms: int = 50
+    poll_seconds: int = 2
+
+
+@dataclass(frozen=True)
+class ForecastConfig:
+    history_days: int = 120
+    horizon_days: int = 7
+    holdout_days: int = 14
+    refresh_seconds: int = 3600
+
+
+@dataclass(frozen=True)
+class ShardingConfig:
+    enabled: bool = False
+    shards: List[str] = field(default_factory=list)
+    directory: str = ""
+
+
+@dataclass(frozen=True)
+class CaptureConfig:
+    enabled: bool = False
+    log_dir: str = os.path.join(APP_DIR, "workload")
+
+
+@dataclass(frozen=True)
+class ApiConfig:
+    host: str = "127.0.0.1"
+    port: int = 8080
+    page_size: int = 100
+    max_page_size: int = 1000
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    database: DatabaseConfig = field(default_factory=DatabaseConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    ui: UIConfig = field(default_factory=UIConfig)
+    analytics: AnalyticsConfig = field(default_factory=AnalyticsConfig)
+    geo: GeoConfig = field(default_factory=GeoConfig)
+    archive: ArchiveConfig = field(default_factory=ArchiveConfig)
+    outbox: OutboxConfig = field(default_factory=OutboxConfig)
+    deletes: DeletesConfig = field(default_factory=DeletesConfig)
+    sharding: ShardingConfig = field(default_factory=ShardingConfig)
+    forecast: ForecastConfig = field(default_factory=ForecastConfig)
+    capture: CaptureConfig = field(default_factory=CaptureConfig)
+    api: ApiConfig = field(default_factory=ApiConfig)
+
+
+# Environment variable -> (section, setting)
+ENV_VARS = {
+    "MYSQL_HOST": ("database", "host"),
+    "MYSQL_PORT": ("database", "port"),
+    "MYSQL_USER": ("database", "user"),
+    "MYSQL_PASSWORD": ("database", "password"),
+    "MYSQL_DATABASE": ("database", "database"),
+    "MYSQL_REPLICAS": ("database", "replicas"),
+    "MYSQL_MAX_REPLICA_LAG": ("database", "max_replica_lag"),
+    "MYSQL_POOL_SIZE": ("database", "pool_size"),
+    "MYSQL_CONNECT_TIMEOUT": ("database", "connect_timeout"),
+    "MYSQL_READ_TIMEOUT": ("database", "read_timeout"),
+    "FOOD_APP_ID_BLOCK_SIZE": ("database", "id_block_size"),
+    "FOOD_APP_ARROW_FETCH": ("database", "arrow_fetch"),
+    "FOOD_APP_CACHE_TTL": ("cache", "table_ttl"),
+    "FOOD_APP_CACHE_MAX_ENTRIES": ("cache", "max_entries"),
+    "FOOD_APP_CACHE_BACKEND": ("cache", "backend"),
+    "FOOD_APP_CACHE_PATH": ("cache", "shared_path"),
+    "FOOD_APP_CACHE_MAX_BYTES": ("cache", "shared_max_bytes"),
+    "FOOD_APP_REDIS_URL": ("cache", "redis_url"),
+    "FOOD_APP_PAGE_SIZE": ("ui", "page_size"),
+    "FOOD_APP_EXPORT_CHUNK_SIZE": ("ui", "export_chunk_size"),
+    "FOOD_APP_DASHBOARD_IMAGE": ("ui", "dashboard_image"),
+    "FOOD_APP_DASHBOARD_REFRESH": ("ui", "dashboard_refresh_seconds"),
+    "FOOD_APP_TABLE_STATS_REFRESH": ("ui", "table_stats_refresh_seconds"),
+    "FOOD_APP_ANALYTICS_BACKEND": ("analytics", "backend"),
+    "FOOD_APP_SKETCH_PATH": ("analytics", "sketch_path"),
+    "FOOD_APP_SKETCH_SAVE_SECONDS": ("analytics", "sketch_save_seconds"),
+    "FOOD_APP_GAZETTEER": ("geo", "gazetteer_path"),
+    "FOOD_APP_GEO_CELL_KM": ("geo", "cell_km"),
+    "FOOD_APP_GEO_APPROXIMATE_UNKNOWN": ("geo", "approximate_unknown"),
+    "FOOD_APP_GEO_REBUILD_SECONDS": ("geo", "rebuild_seconds"),
+    "FOOD_APP_ARCHIVE_ENABLED": ("archive", "enabled"),
+    "FOOD_APP_ARCHIVE_INTERVAL": ("archive", "interval_seconds"),
+    "FOOD_APP_ARCHIVE_BATCH_SIZE": ("archive", "batch_size"),
+    "FOOD_APP_OUTBOX_ENABLED": ("outbox", "enabled"),
+    "FOOD_APP_EVENT_LOG_DIR": ("outbox", "log_dir"),
+    "FOOD_APP_BACKGROUND_DELETES": ("deletes", "background"),
+    "FOOD_APP_DELETE_BATCH_SIZE": ("deletes", "batch_size"),
+    "FOOD_APP_SHARDING_ENABLED": ("sharding", "enabled"),
+    "FOOD_APP_SHARDS": ("sharding", "shards"),
+    "FOOD_APP_SHARD_DIRECTORY": ("sharding", "directory"),
+    "FOOD_APP_FORECAST_HISTORY_DAYS": ("forecast", "history_days"),
+    "FOOD_APP_FORECAST_HORIZON_DAYS": ("forecast", "horizon_days"),
+    "FOOD_APP_CAPTURE_ENABLED": ("capture", "enabled"),
+    "FOOD_APP_CAPTURE_DIR": ("capture", "log_dir"),
+    "FOOD_APP_API_HOST": ("api", "host"),
+    "FOOD_APP_API_PORT": ("api", "port"),
+}
+
+
+def _coerce(section, name, value):
+    """Convert a raw file/env value to the type of the dataclass field."""
+    default = getattr(section, name)
+    if name == "replicas":
+        if isinstance(value, str):
+            value = [v for v in value.split(",") if v.strip()]
+        return [v if isinstance(v, Endpoint) else Endpoint.parse(v) for v in value]
+    if isinstance(default, list):
+        if isinstance(value, str):
+            value = [v.strip() for v in value.split(",") if v.strip()]
+        return [str(v) for v in value]
+    if isinstance(default, bool):
+        text = str(value).strip().lower()
+        if text not in TRUE_VALUES + FALSE_VALUES:
+            raise ConfigError(f"Setting '{name}' must be one of {', '.join(TRUE_VALUES + FALSE_VALUES)}, got '{value}'")
+        return text in TRUE_VALUES
+    if isinstance(default, int):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ConfigError(f"Setting '{name}' must be an integer, got '{value}'")
+    if isinstance(default, float):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ConfigError(f"Setting '{name}' must be a number, got '{value}'")
+    return str(value) if value is not None else None
+
+
+def _apply(config, overrides):
+    """Return a copy of config with {section: {setting: value}} overrides applied."""
+    sections = {}
+    for section_name, values in overrides.items():
+        if not hasattr(config, section_name):
+            raise ConfigError(f"Unknown config section '{section_name}'")
+        section = getattr(config, section_name)
+        known = {f.name for f in fields(section)}
+        changes = {}
+        for name, value in values.items():
+            if name not in known:
+                raise ConfigError(f"Unknown setting '{section_name}.{name}'")
+            changes[name] = _coerce(section, name, value)
+        sections[section_name] = replace(section, **changes)
+    return replace(config, **sections)
+
+
+def validate(config):
+    """Check settings that would otherwise fail later at runtime."""
+    db = config.database
+    if not db.host:
+        raise ConfigError("database.host must not be empty")
+    for name in ("port", "pool_size", "connect_timeout", "read_timeout", "id_block_size"):
+        if getattr(db, name) <= 0:
+            raise ConfigError(f"database.{name} must be positive")
+    if db.max_replica_lag < 0:
+        raise ConfigError("database.max_replica_lag must not be negative")
+    if config.cache.table_ttl < 0 or config.cache.max_entries <= 0:
+        raise ConfigError("cache.table_ttl must be >= 0 and cache.max_entries > 0")
+    if config.cache.backend not in CACHE_BACKENDS:
+        raise ConfigError(f"cache.backend must be one of {', '.join(CACHE_BACKENDS)}")
+    if config.cache.shared_max_bytes <= 0:
+        raise ConfigError("cache.shared_max_bytes must be positive")
+    ui = config.ui
+    if min(ui.page_size, ui.export_chunk_size, ui.dashboard_refresh_seconds, ui.table_stats_refresh_seconds) <= 0:
+        raise ConfigError("ui.page_size, export_chunk_size, dashboard_refresh_seconds and table_stats_refresh_seconds "
+                          "must be positive")
+    if config.analytics.backend not in ANALYTICS_BACKENDS:
+        raise ConfigError(f"analytics.backend must be one of {', '.join(ANALYTICS_BACKENDS)}")
+    if config.analytics.sketch_save_seconds <= 0:
+        raise ConfigError("analytics.sketch_save_seconds must be positive")
+    if not os.path.exists(config.geo.gazetteer_path):
+        raise ConfigError(f"geo.gazetteer_path '{config.geo.gazetteer_path}' does not exist")
+    if config.geo.cell_km <= 0:
+        raise ConfigError("geo.cell_km must be positive")
+    if config.geo.rebuild_seconds <= 0:
+        raise ConfigError("geo.rebuild_seconds must be positive")
+    archive = config.archive
+    if min(archive.interval_seconds, archive.batch_size, archive.max_batches) <= 0:
+        raise ConfigError("archive.interval_seconds, batch_size and max_batches must be positive")
+    if min(archive.batch_pause_ms, archive.listing_grace_days, archive.claim_retention_days) < 0:
+        raise ConfigError("archive.batch_pause_ms, listing_grace_days and claim_retention_days must not be negative")
+    if min(config.outbox.relay_interval_seconds, config.outbox.batch_size) <= 0:
+        raise ConfigError("outbox.relay_interval_seconds and outbox.batch_size must be positive")
+    deletes = config.deletes
+    if min(deletes.batch_size, deletes.poll_seconds) <= 0 or deletes.batch_pause_ms < 0:
+        raise ConfigError("deletes.batch_size and poll_seconds must be positive, batch_pause_ms not negative")
+    sharding = config.sharding
+    if sharding.enabled:
+        if not sharding.shards:
+            raise ConfigError("sharding.shards must list at least one database when sharding is enabled")
+        for url in sharding.shards + ([sharding.directory] if sharding.directory else []):
+            if not url.startswith(("mysql://", "sqlite:///")):
+                raise ConfigError(f"Shard URL '{url}' must start with mysql:// or sqlite:///")
+        if (deletes.background or config.archive.enabled or config.analytics.backend == "sketch"
+                or config.outbox.enabled or config.capture.enabled):
+            raise ConfigError("deletes.background, archive.enabled, analytics.backend = \"sketch\", outbox.enabled "
+                              "and capture.enabled are not supported together with sharding")
+    forecast = config.forecast
+    if min(forecast.history_days, forecast.horizon_days, forecast.holdout_days, forecast.refresh_seconds) <= 0:
+        raise ConfigError("forecast.history_days, horizon_days, holdout_days and refresh_seconds must be positive")
+    if forecast.history_days < 7:
+        raise ConfigError("forecast.history_days must cover at least one week")
+    api = config.api
+    if min(api.port, api.page_size, api.max_page_size) <= 0 or api.page_size > api.max_page_size:
+        raise ConfigError("api.port, page_size and max_page_size must be positive, with page_size <= max_page_size")
+    return config
+
+
+def load_config(path=None, environ=None):
+    """Build the validated AppConfig from defaults, the config file and the environment."""
+    environ = os.environ if environ is None else environ
+    config = AppConfig()
+
+    path = path or environ.get("FOOD_APP_CONFIG")
+    if path is None and os.path.exists(DEFAULT_CONFIG_FILE):
+        path = DEFAULT_CONFIG_FILE
+    if path:
+        try:
+            with open(path, "rb") as f:
+                config = _apply(config, tomllib.load(f))
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            raise ConfigError(f"Could not read config file '{path}': {e}")
+
+    env_overrides = {}
+    for var, (section, name) in ENV_VARS.items():
+        if var in environ:
+            env_overrides.setdefault(section, {})[name] = environ[var]
+    config = _apply(config, env_overrides)
+
+    return validate(config)
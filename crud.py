@@ -0,0 +1,302 @@
+"""Transactional writes for the four tables, shared by food_app.py and api.py.
+
+Each write runs in one transaction that also keeps claims_rollup and
+listings_rollup current: the rows a change touches are subtracted before it
+and added back after it (ON DELETE CASCADE bypasses that bookkeeping, so
+deletes subtract the cascaded rows up front). After commit the analytics
+sketches, the ID registry and the proximity index are updated and
+on_change() runs. With outbox=True every changed row is also recorded in
+change_outbox within the same transaction (see outbox.py). When a
+table_stats object is given, the rows an update or delete replaces are read
+inside the transaction and the column statistics are adjusted after commit.
+soft_delete() hides a provider or receiver and queues a deletion job whose
+children are then removed in batches by deletions.DeletionWorker; the
+statistics count live rows only, so soft_delete() has them re-profiled and
+deletes leave rows that were already hidden out of their adjustment.
+Writers that delete with their own SQL (the archive sweeper) call
+capture_removal() inside their transaction and forget() after commit, so
+the same caches are updated as by delete().
+
+Store takes its supporting objects as zero-argument callables so the caller
+decides how they are built and shared (st.cache_resource in the app); any of
+them may be left out or return None. Errors propagate to the caller, e.g.
+mysql.connector.IntegrityError for a key conflict.
+"""
+import ids
+import outbox as change_outbox
+import rollups
+from sketches import SketchStore
+from validation import CASCADE_FILTERS, LIVE_FILTERS
+
+TABLE_COLUMNS = {
+    "providers_data": ["Provider_ID", "Name", "Type", "Address", "City", "Contact"],
+    "receivers_data": ["Receiver_ID", "Name", "Type", "City", "Contact"],
+    "food_listings_data": ["Food_ID", "Food_Name", "Quantity", "Expiry_Date", "Provider_ID", "Provider_Type", "Location", "Food_Type", "Meal_Type"],
+    "claims_data": ["Claim_ID", "Food_ID", "Receiver_ID", "Status", "Timestamp"],
+}
+
+INSERT_CHUNK_SIZE = 1000
+
+# (listing filter, claim filter) of the rollup/sketch rows a write to {keys} touches
+INSERT_SCOPE = {
+    "providers_data": (None, None),
+    "receivers_data": (None, None),
+    "food_listings_data": ("f.Food_ID IN ({keys})", None),
+    "claims_data": (None, "c.Claim_ID IN ({keys})"),
+}
+UPDATE_SCOPE = {
+    "providers_data": (None, None),
+    "receivers_data": (None, None),
+    "food_listings_data": ("f.Food_ID IN ({keys})", "c.Food_ID IN ({keys})"),
+    "claims_data": (None, "c.Claim_ID IN ({keys})"),
+}
+DELETE_SCOPE = {
+    "providers_data": ("f.Provider_ID IN ({keys})", "f.Provider_ID IN ({keys})"),
+    "receivers_data": (None, "c.Receiver_ID IN ({keys})"),
+    "food_listings_data": ("f.Food_ID IN ({keys})", "c.Food_ID IN ({keys})"),
+    "claims_data": (None, "c.Claim_ID IN ({keys})"),
+}
+
+
+def _none():
+    return None
+
+
+def fetch_rows(cursor, table, where, params):
+    """Rows of table matching where, as dicts keyed by column name."""
+    columns = TABLE_COLUMNS[table]
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {where}", params)
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def fetch_live_rows(cursor, table, where, params):
+    """fetch_rows() without the rows a soft delete hides, which the table statistics no longer count."""
+    return fetch_rows(cursor, table, f"({where}) AND {LIVE_FILTERS[table]}", params)
+
+
+class Store:
+    def __init__(self, connect, registry=None, geo_index=None, sketch_store=None, on_change=None, outbox=False,
+                 table_stats=None):
+        self.connect = connect
+        self.outbox = outbox
+        self.table_stats = table_stats or _none
+        self.registry = registry or _none
+        self.geo_index = geo_index or _none
+        self.sketch_store = sketch_store or _none
+        self.on_change = on_change or _none
+
+    @staticmethod
+    def _rollups(cursor, listing_where, claim_where, params, sign):
+        if claim_where:
+            rollups.apply_claim_delta(cursor, claim_where, params, sign)
+        if listing_where:
+            rollups.apply_listing_delta(cursor, listing_where, params, sign)
+
+    def _write(self, scope, keys, run, subtract=True, add=True):
+        """Run run(cursor) in one transaction with rollup and sketch bookkeeping; return its row count."""
+        placeholders = ", ".join(["%s"] * len(keys))
+        listing_where, claim_where = (where and where.format(keys=placeholders) for where in scope)
+        params = tuple(keys)
+        store = self.sketch_store() if listing_where or claim_where else None
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            before = SketchStore.capture(cursor, listing_where, claim_where, params) if store else None
+            if subtract:
+                self._rollups(cursor, listing_where, claim_where, params, -1)
+            count = run(cursor)
+            if add:
+                self._rollups(cursor, listing_where, claim_where, params, 1)
+            after = SketchStore.capture(cursor, listing_where, claim_where, params) if store else None
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        if store is not None:
+            store.apply(before, -1)
+            store.apply(after, 1)
+        return count
+
+    def _index_rows(self, table, rows):
+        index = self.geo_index()
+        if index is None:
+            return
+        for row in rows:
+            if table == "food_listings_data":
+                expiry_date = None if row["Expiry_Date"] is None else str(row["Expiry_Date"])[:10]
+                index.upsert_listing(row["Food_ID"], row["Location"], expiry_date, row["Quantity"], row["Provider_ID"])
+            elif table == "receivers_data":
+                index.upsert_receiver(row["Receiver_ID"], row["City"])
+
+    def insert(self, table, rows, explicit_keys=()):
+        """Insert rows (dicts keyed by column name) in one transaction and return their primary keys.
+
+        explicit_keys are the primary keys the caller chose itself rather than
+        allocated; ids.claim() moves the sequence past them, or raises
+        ids.ExplicitIdError.
+        """
+        if not rows:
+            return []
+        columns = TABLE_COLUMNS[table]
+        keys = [int(row[columns[0]]) for row in rows]
+        records = [tuple(row.get(column) for column in columns) for row in rows]
+        insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+        def run(cursor):
+            if explicit_keys:
+                ids.claim(cursor, table, explicit_keys)
+            for start in range(0, len(records), INSERT_CHUNK_SIZE):
+                cursor.executemany(insert_sql, records[start:start + INSERT_CHUNK_SIZE])
+            if self.outbox:
+                change_outbox.record(cursor, [(table, "insert", key, dict(zip(columns, record)))
+                                              for key, record in zip(keys, records)])
+            return len(records)
+
+        self._write(INSERT_SCOPE[table], keys, run, subtract=False)
+        registry = self.registry()
+        if registry is not None:
+            registry.add(table, keys)
+        stats = self.table_stats()
+        if stats is not None:
+            stats.apply(table, rows, 1)
+        self._index_rows(table, rows)
+        self.on_change()
+        return keys
+
+    def update(self, table, row):
+        """Overwrite every column of one row; returns the number of rows changed."""
+        columns = TABLE_COLUMNS[table]
+        update_sql = f"UPDATE {table} SET {', '.join(f'{c} = %s' for c in columns[1:])} WHERE {columns[0]} = %s"
+        values = tuple(row[column] for column in columns[1:]) + (row[columns[0]],)
+        stats = self.table_stats()
+        replaced = []
+
+        def run(cursor):
+            if stats is not None:
+                replaced.extend(fetch_live_rows(cursor, table, f"{columns[0]} = %s", (row[columns[0]],)))
+            cursor.execute(update_sql, values)
+            updated = cursor.rowcount
+            if self.outbox and updated > 0:
+                change_outbox.record(cursor, [(table, "update", row[columns[0]], {c: row[c] for c in columns})])
+            return updated
+
+        updated = self._write(UPDATE_SCOPE[table], [row[columns[0]]], run)
+        if updated > 0:
+            # A row hidden by a soft delete is not in the statistics, before or after
+            if stats is not None and replaced:
+                stats.apply(table, replaced, -1)
+                stats.apply(table, [row], 1)
+            self._index_rows(table, [row])
+            self.on_change()
+        return updated
+
+    def delete(self, table, keys):
+        """Delete rows by primary key (children go through ON DELETE CASCADE); returns the number deleted."""
+        if not keys:
+            return 0
+        primary_key = TABLE_COLUMNS[table][0]
+        placeholders = ", ".join(["%s"] * len(keys))
+        delete_sql = f"DELETE FROM {table} WHERE {primary_key} IN ({placeholders})"
+        stats = self.table_stats()
+        removed = {}
+
+        def run(cursor):
+            events = change_outbox.delete_events(cursor, table, primary_key, keys) if self.outbox else None
+            if stats is not None:
+                for child, where in CASCADE_FILTERS[table]:
+                    removed[child] = fetch_live_rows(cursor, child, where.format(keys=placeholders), tuple(keys))
+                removed[table] = fetch_live_rows(cursor, table, f"{primary_key} IN ({placeholders})", tuple(keys))
+            cursor.execute(delete_sql, tuple(keys))
+            deleted = cursor.rowcount
+            if events:
+                change_outbox.record(cursor, events)
+            return deleted
+
+        deleted = self._write(DELETE_SCOPE[table], keys, run, add=False)
+        if deleted > 0:
+            self._forget(table, keys, removed)
+        return deleted
+
+    def _forget(self, table, keys, removed):
+        """Drop deleted rows from the registry, statistics and proximity index; removed is {table: rows}."""
+        registry = self.registry()
+        if registry is not None:
+            registry.remove(table, keys)
+        stats = self.table_stats()
+        if stats is not None:
+            for removed_table, rows in removed.items():
+                stats.apply(removed_table, rows, -1)
+        index = self.geo_index()
+        if index is not None:
+            remove = {
+                "providers_data": index.remove_provider,
+                "receivers_data": index.remove_receiver,
+                "food_listings_data": index.remove_listing,
+            }.get(table)
+            if remove is not None:
+                for key in keys:
+                    remove(key)
+        self.on_change()
+
+    def capture_removal(self, cursor, table, keys):
+        """Read what deleting keys from table (and its cascades) removes, inside the deleting transaction.
+
+        For writers that delete with their own SQL; pass the result to
+        forget() once the transaction has committed. Rollups are left to the
+        caller.
+        """
+        placeholders = ", ".join(["%s"] * len(keys))
+        params = tuple(keys)
+        listing_where, claim_where = (where and where.format(keys=placeholders) for where in DELETE_SCOPE[table])
+        sketch_rows = SketchStore.capture(cursor, listing_where, claim_where, params) if self.sketch_store() else None
+        removed = {}
+        if self.table_stats() is not None:
+            for child, where in CASCADE_FILTERS[table]:
+                removed[child] = fetch_live_rows(cursor, child, where.format(keys=placeholders), params)
+            removed[table] = fetch_live_rows(cursor, table, f"{TABLE_COLUMNS[table][0]} IN ({placeholders})", params)
+        return table, list(keys), sketch_rows, removed
+
+    def forget(self, removal):
+        """Update the caches after a delete captured with capture_removal() has committed."""
+        table, keys, sketch_rows, removed = removal
+        store = self.sketch_store()
+        if store is not None and sketch_rows is not None:
+            store.apply(sketch_rows, -1)
+        self._forget(table, keys, removed)
+
+    def soft_delete(self, table, key):
+        """Hide one provider or receiver and queue a deletion job for it (see deletions.py).
+
+        Returns the job ID, or None when the row does not exist or is already deleted.
+        """
+        primary_key = TABLE_COLUMNS[table][0]
+
+        def run(cursor):
+            cursor.execute(f"UPDATE {table} SET Deleted_At = NOW() WHERE {primary_key} = %s AND Deleted_At IS NULL",
+                           (key,))
+            if cursor.rowcount == 0:
+                return None
+            cursor.execute("INSERT INTO deletion_jobs (Table_Name, Row_Key) VALUES (%s, %s)", (table, key))
+            job_id = cursor.lastrowid
+            if self.outbox:
+                change_outbox.record(cursor, [(table, "soft_delete", key, {primary_key: key, "job_id": job_id})])
+            return job_id
+
+        # Nothing is removed yet, so there is no rollup or sketch bookkeeping
+        job_id = self._write((None, None), [key], run, subtract=False, add=False)
+        if job_id is not None:
+            registry = self.registry()
+            if registry is not None:
+                registry.remove(table, [key])
+            index = self.geo_index()
+            if index is not None:
+                {"providers_data": index.remove_provider, "receivers_data": index.remove_receiver}[table](key)
+            stats = self.table_stats()
+            if stats is not None:
+                # The hidden rows are not read here (there may be many); the statistics re-profile instead
+                stats.expire([table] + [child for child, _ in CASCADE_FILTERS[table]])
+            self.on_change()
+        return job_id
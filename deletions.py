@@ -0,0 +1,194 @@
+"""Background cascade deletes for providers and receivers.
+
+Deleting a large provider in one statement lets ON DELETE CASCADE remove
+all of its listings and their claims inside a single long transaction that
+blocks the listing and claim writers. In background mode (deletes.background)
+a delete instead:
+
+1. soft-deletes the parent (Deleted_At = NOW()) and queues a row in
+   deletion_jobs, in one short transaction (crud.Store.soft_delete);
+2. a DeletionWorker removes the children through crud.Store.delete in
+   batches of batch_size, deepest first (claims, then listings), each in
+   its own transaction, so rollups, sketches, statistics and the outbox stay
+   exact; progress is written to the job after every batch;
+3. deletes the parent itself, which no longer cascades into anything big.
+
+Reads hide soft-deleted parents and everything below them in the meantime:
+LIVE_FILTERS is applied to the View Tables / CRUD data and to the API.
+The canned queries read the same live rows; rollups and sketches converge
+as the batches go through.
+Jobs are claimed with a heartbeat, so a job whose worker died is picked up
+again by another worker and continues where it stopped.
+
+The Streamlit app runs a worker per process when deletes.background is on;
+`python deletions.py` runs one on its own.
+"""
+import logging
+import os
+import threading
+import time
+
+from crud import TABLE_COLUMNS
+from validation import CASCADE_FILTERS, LIVE_FILTERS, SCHEMA, SOFT_DELETE_TABLES
+
+logger = logging.getLogger(__name__)
+
+# A running job whose heartbeat is older than this is considered abandoned
+STALE_JOB_SECONDS = 120
+
+
+def live_query(table):
+    """SELECT of the table's columns without soft-deleted rows or their children."""
+    return f"SELECT {', '.join(TABLE_COLUMNS[table])} FROM {table} WHERE {LIVE_FILTERS[table]}"
+
+
+def create_deletion_tables(cursor):
+    for table in SOFT_DELETE_TABLES:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'Deleted_At'
+        """, (table,))
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN Deleted_At DATETIME NULL")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deletion_jobs (
+            Job_ID BIGINT AUTO_INCREMENT PRIMARY KEY,
+            Table_Name VARCHAR(64) NOT NULL,
+            Row_Key INT NOT NULL,
+            Status VARCHAR(16) NOT NULL DEFAULT 'pending',
+            Rows_Total INT,
+            Rows_Deleted INT NOT NULL DEFAULT 0,
+            Worker VARCHAR(64),
+            Error TEXT,
+            Created_At DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            Updated_At DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX (Status, Job_ID)
+        ) ENGINE=InnoDB;
+    """)
+
+
+def _execute(connect, sql, params=(), fetch=False):
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        result = cursor.fetchall() if fetch else cursor.rowcount
+        conn.commit()
+        return result
+    finally:
+        cursor.close()
+        conn.close()
+
+
+JOB_COLUMNS = ("Job_ID", "Table_Name", "Row_Key", "Status", "Rows_Deleted", "Rows_Total", "Error",
+               "Created_At", "Updated_At")
+
+
+def recent_jobs(connect, limit=20):
+    """Newest jobs first, as tuples in JOB_COLUMNS order."""
+    return _execute(connect, f"SELECT {', '.join(JOB_COLUMNS)} FROM deletion_jobs ORDER BY Job_ID DESC "
+                             f"LIMIT {int(limit)}", fetch=True)
+
+
+def get_job(connect, job_id):
+    """One job as a dict keyed by JOB_COLUMNS, or None."""
+    rows = _execute(connect, f"SELECT {', '.join(JOB_COLUMNS)} FROM deletion_jobs WHERE Job_ID = %s",
+                    (job_id,), fetch=True)
+    return dict(zip(JOB_COLUMNS, rows[0])) if rows else None
+
+
+def _child_batch_sql(table, child, where, batch_size):
+    return f"SELECT {SCHEMA[child][0]} FROM {child} WHERE {where.format(keys='%s')} LIMIT {int(batch_size)}"
+
+
+def claim_job(connect, worker):
+    """Take the oldest pending (or abandoned) job; returns (job_id, table, key) or None."""
+    candidates = _execute(connect, f"""
+        SELECT Job_ID, Table_Name, Row_Key FROM deletion_jobs
+        WHERE Status = 'pending' OR (Status = 'running' AND Updated_At < NOW() - INTERVAL {STALE_JOB_SECONDS} SECOND)
+        ORDER BY Job_ID LIMIT 5
+    """, fetch=True)
+    for job_id, table, key in candidates:
+        # Conditional update: only one worker wins each job
+        claimed = _execute(connect, f"""
+            UPDATE deletion_jobs SET Status = 'running', Worker = %s, Updated_At = NOW()
+            WHERE Job_ID = %s AND (Status = 'pending'
+                OR (Status = 'running' AND Updated_At < NOW() - INTERVAL {STALE_JOB_SECONDS} SECOND))
+        """, (worker, job_id))
+        if claimed:
+            return job_id, table, key
+    return None
+
+
+def run_job(store, connect, job_id, table, key, batch_size, batch_pause_ms=0):
+    """Delete the children of a soft-deleted row in batches, then the row itself."""
+    cascades = tuple(reversed(CASCADE_FILTERS[table]))
+    total = 1
+    for child, where in cascades:
+        total += _execute(connect, f"SELECT COUNT(*) FROM {child} WHERE {where.format(keys='%s')}", (key,), fetch=True)[0][0]
+    _execute(connect, "UPDATE deletion_jobs SET Rows_Total = %s, Updated_At = NOW() WHERE Job_ID = %s", (total, job_id))
+
+    for child, where in cascades:
+        select_sql = _child_batch_sql(table, child, where, batch_size)
+        while True:
+            child_keys = [row[0] for row in _execute(connect, select_sql, (key,), fetch=True)]
+            if not child_keys:
+                break
+            deleted = store.delete(child, child_keys)
+            _execute(connect, "UPDATE deletion_jobs SET Rows_Deleted = Rows_Deleted + %s, Updated_At = NOW() "
+                              "WHERE Job_ID = %s", (deleted, job_id))
+            if batch_pause_ms:
+                time.sleep(batch_pause_ms / 1000)
+
+    deleted = store.delete(table, [key])
+    _execute(connect, "UPDATE deletion_jobs SET Status = 'done', Rows_Deleted = Rows_Deleted + %s, Updated_At = NOW() "
+                      "WHERE Job_ID = %s", (deleted, job_id))
+
+
+class DeletionWorker(threading.Thread):
+    """Daemon thread that runs queued deletion jobs one at a time."""
+
+    def __init__(self, store, connect, settings):
+        super().__init__(name="deletion-worker", daemon=True)
+        self.store = store
+        self.connect = connect
+        self.settings = settings
+        self.worker_id = f"{os.uname().nodename}:{os.getpid()}"
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            job = None
+            try:
+                job = claim_job(self.connect, self.worker_id)
+                if job:
+                    run_job(self.store, self.connect, *job, self.settings.batch_size, self.settings.batch_pause_ms)
+                    continue
+            except Exception as e:
+                logger.exception("Deletion job failed")
+                if job:
+                    _execute(self.connect, "UPDATE deletion_jobs SET Status = 'failed', Error = %s WHERE Job_ID = %s",
+                             (str(e), job[0]))
+            self.stop_event.wait(self.settings.poll_seconds)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    import mysql.connector
+
+    import crud
+    from config import load_config
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    config = load_config()
+    db = config.database
+
+    def connect():
+        return mysql.connector.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                       database=db.database, connection_timeout=db.connect_timeout)
+
+    worker = DeletionWorker(crud.Store(connect, outbox=config.outbox.enabled), connect, config.deletes)
+    worker.start()
+    worker.join()
@@ -0,0 +1,133 @@
+"""Streaming export of query results as CSV, gzip-compressed CSV or Parquet.
+
+export_query() reads the result with an unbuffered cursor, chunk_size rows
+at a time, and encodes each chunk into the output file before fetching the
+next, so memory use does not grow with the row count. food_app.py writes
+exports under static/exports/ and links to them; the Streamlit server
+(server.enableStaticServing) then sends the file from disk in blocks
+instead of holding it in memory for a download button.
+"""
+import csv
+import gzip
+import os
+
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/octet-stream"),
+}
+CHUNK_SIZE = 10000
+
+
+def iter_query_chunks(conn, query, params=None, chunk_size=CHUNK_SIZE):
+    """Yield (description, rows) chunks of a query using an unbuffered cursor.
+
+    description is the cursor's, the same for every chunk.
+    """
+    # Unbuffered cursor: rows stay on the server until fetched, so only one chunk is in memory
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params or ())
+        description = cursor.description
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield description, rows
+    finally:
+        cursor.close()
+
+
+def write_csv(chunks, fileobj):
+    """Encode query chunks as CSV into a text file object."""
+    writer = csv.writer(fileobj)
+    header_written = False
+    for description, rows in chunks:
+        if not header_written:
+            writer.writerow([column[0] for column in description])
+            header_written = True
+        writer.writerows(rows)
+
+
+def arrow_schema(description, rows):
+    """Arrow schema of a query result.
+
+    MySQL columns are typed from their cursor.description type code, so a
+    column that happens to be NULL throughout the first chunk still gets its
+    real type. Drivers that report no types (SQLite) are typed from rows;
+    columns that are NULL throughout rows become strings.
+    """
+    import pyarrow as pa
+
+    mysql_types = {
+        **dict.fromkeys(["TINY", "SHORT", "INT24", "LONG", "LONGLONG", "YEAR"], pa.int64()),
+        **dict.fromkeys(["FLOAT", "DOUBLE", "DECIMAL", "NEWDECIMAL"], pa.float64()),
+        **dict.fromkeys(["DATE", "NEWDATE"], pa.date32()),
+        **dict.fromkeys(["DATETIME", "TIMESTAMP"], pa.timestamp("us")),
+        "TIME": pa.duration("us"),
+    }
+    fields = []
+    for position, column in enumerate(description):
+        name, type_code = column[0], column[1]
+        if isinstance(type_code, int):
+            from mysql.connector import FieldType
+            arrow_type = mysql_types.get(FieldType.get_info(type_code), pa.string())
+        else:
+            values = [row[position] for row in rows if row[position] is not None]
+            arrow_type = pa.array(values).type if values else pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _arrow_table(schema, rows):
+    import pyarrow as pa
+
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        # DECIMAL values arrive as Decimal and text may arrive as bytes; Arrow converts neither implicitly
+        if pa.types.is_floating(field.type):
+            values = [None if value is None else float(value) for value in values]
+        elif pa.types.is_string(field.type):
+            values = [value.decode("utf-8", "replace") if isinstance(value, (bytes, bytearray))
+                      else None if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(chunks, fileobj):
+    """Encode query chunks as Parquet, one row group per chunk; the schema comes from arrow_schema()."""
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for description, rows in chunks:
+            if writer is None:
+                writer = pq.ParquetWriter(fileobj, arrow_schema(description, rows))
+            writer.write_table(_arrow_table(writer.schema, rows))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_query(conn, query, export_format, path, params=None, chunk_size=CHUNK_SIZE):
+    """Stream a query result into path in export_format (a FORMATS key).
+
+    Raises ImportError for Parquet without pyarrow; a partly written file is
+    removed on any error.
+    """
+    chunks = iter_query_chunks(conn, query, params, chunk_size)
+    try:
+        if export_format == "CSV":
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                write_csv(chunks, f)
+        elif export_format == "CSV (gzip)":
+            with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+                write_csv(chunks, f)
+        else:
+            with open(path, "wb") as f:
+                write_parquet(chunks, f)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
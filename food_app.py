@@ -2,7 +2,33 @@ import streamlit as st
 import pandas as pd
 import mysql.connector
 import os
-from datetime import datetime
+import secrets
+import shutil
+import time
+import hashlib
+import functools
+from datetime import datetime, timedelta
+from config import load_config, ConfigError
+import rollups
+import sketches
+import geo
+import archive
+import dedup
+import validation
+import ids
+import shared_cache
+import queries
+import crud
+import columnar
+import outbox
+import deletions
+import sharding
+import forecasting
+import refreshing_cache
+import workload
+import table_stats
+import export
+import routing
 
 # -------------------------
 # Streamlit page config and sidebar navigation
@@ -21,23 +47,105 @@ page = st.sidebar.selectbox("Choose a page:",
 # -------------------------
 # MySQL Configuration - Single Connection Point
 # -------------------------
-MYSQL_HOST = "localhost"
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "Localhost@123"  
-MYSQL_DATABASE = "food_data"
-MYSQL_PORT = 3306
-
-def get_mysql_connection():
-    """Establish and return a MySQL database connection."""
+@st.cache_resource
+def get_config():
+    """Load settings once per server process (see config.py)."""
+    return load_config()
+
+try:
+    CONFIG = get_config()
+except ConfigError as e:
+    st.error(f"Invalid configuration: {e}")
+    st.stop()
+
+MYSQL_HOST = CONFIG.database.host
+MYSQL_USER = CONFIG.database.user
+MYSQL_PASSWORD = CONFIG.database.password
+MYSQL_DATABASE = CONFIG.database.database
+MYSQL_PORT = CONFIG.database.port
+
+# Read replicas; empty means every read goes to the primary
+MYSQL_REPLICAS = [{"host": r.host, "port": r.port} for r in CONFIG.database.replicas]
+MAX_REPLICA_LAG_SECONDS = CONFIG.database.max_replica_lag
+
+@st.cache_resource
+def get_router():
+    """Shared router so endpoint load is counted across all sessions."""
+    primary = {"host": MYSQL_HOST, "port": MYSQL_PORT}
+    return routing.EndpointRouter(primary, MYSQL_REPLICAS, MAX_REPLICA_LAG_SECONDS)
+
+@st.cache_resource
+def get_workload_recorder():
+    """Statement log of this process when capture.enabled is on (see workload.py), else None."""
+    return workload.Recorder(CONFIG.capture.log_dir) if CONFIG.capture.enabled else None
+
+# Resolved here, in the script thread: connect_endpoint() and connect() also run in the refresh,
+# deletion, archive and outbox threads, which must not call Streamlit
+ROUTER = get_router()
+WORKLOAD_RECORDER = get_workload_recorder()
+
+# Worker threads of the process-wide result cache (warm-up and background refreshes)
+CACHE_REFRESH_WORKERS = 4
+
+def background_connections():
+    """Connections this process's background threads can hold at once.
+
+    They share the endpoint pools with the sessions, so the pools get this
+    many connections on top of database.pool_size: the cache refresh
+    workers, the archive sweeper, the deletion worker, the outbox relay and
+    one for the ID registry, allocator and table statistics loads.
+    """
+    return (CACHE_REFRESH_WORKERS + CONFIG.archive.enabled + CONFIG.deletes.background
+            + CONFIG.outbox.enabled + 1)
+
+POOL_SIZE = min(CONFIG.database.pool_size + background_connections(), mysql.connector.pooling.CNX_POOL_MAXSIZE)
+
+def connect_endpoint(endpoint):
+    """Get a pooled connection to an endpoint, with connect and statement timeouts.
+
+    When every pooled connection is checked out, waits up to connect_timeout
+    for one to be returned instead of failing at once.
+    """
+    deadline = time.monotonic() + CONFIG.database.connect_timeout
+    while True:
+        try:
+            conn = mysql.connector.connect(
+                host=endpoint["host"],
+                user=MYSQL_USER,
+                password=MYSQL_PASSWORD,
+                database=MYSQL_DATABASE,
+                port=endpoint["port"],
+                pool_name=f"food_{endpoint['host']}_{endpoint['port']}",
+                pool_size=POOL_SIZE,
+                connection_timeout=CONFIG.database.connect_timeout,
+                init_command=f"SET SESSION MAX_EXECUTION_TIME={CONFIG.database.read_timeout * 1000}"
+            )
+            break
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+    return WORKLOAD_RECORDER.wrap(conn, endpoint) if WORKLOAD_RECORDER else conn
+
+def read_role():
+    """Send reads to the primary for a while after this session wrote, so it sees its own writes."""
+    last_write = st.session_state.get("last_write_time")
+    if last_write and time.time() - last_write < MAX_REPLICA_LAG_SECONDS:
+        return "primary"
+    return "replica"
+
+def connect(role="primary"):
+    """Connection for role through the router; raises mysql.connector.Error. Safe in worker threads."""
+    return ROUTER.connect(role, connect_endpoint)
+
+def get_mysql_connection(role="primary"):
+    """Establish and return a MySQL database connection.
+
+    role="replica" tries the read replicas first and falls back to the primary
+    when none is reachable or all are lagging past MAX_REPLICA_LAG_SECONDS.
+    """
     try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE,
-            port=MYSQL_PORT
-        )
-        return conn
+        return connect(role)
     except mysql.connector.Error as err:
         st.error(f"Error connecting to MySQL database: {err}")
         return None
@@ -53,7 +161,8 @@ def init_mysql_db():
             host=MYSQL_HOST,
             user=MYSQL_USER,
             password=MYSQL_PASSWORD,
-            port=MYSQL_PORT
+            port=MYSQL_PORT,
+            connection_timeout=CONFIG.database.connect_timeout
         )
         cursor = conn.cursor()
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {MYSQL_DATABASE}")
@@ -115,6 +224,16 @@ def init_mysql_db():
             ) ENGINE=InnoDB;
         """)
 
+        ids.create_sequence_table(cursor)
+        outbox.create_outbox_table(cursor)
+        deletions.create_deletion_tables(cursor)
+        rollups.create_rollup_table(cursor)
+        if rollups.rollups_empty(cursor):
+            rollups.rebuild_rollups(cursor)
+        rollups.create_listing_rollup_table(cursor)
+        if rollups.listing_rollups_empty(cursor):
+            rollups.rebuild_listing_rollups(cursor)
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -126,9 +245,23 @@ def init_mysql_db():
         st.error(f"Unexpected error during database initialization: {e}")
         return False
 
+@st.cache_resource
+def init_database_once():
+    """Run init_mysql_db once per server process instead of once per session (failures are retried)."""
+    if not init_mysql_db():
+        raise RuntimeError("database initialization failed")
+    return True
+
 # Initialize database on startup
 if 'db_initialized' not in st.session_state:
-    st.session_state.db_initialized = init_mysql_db()
+    try:
+        st.session_state.db_initialized = init_database_once()
+    except RuntimeError:
+        st.session_state.db_initialized = False
+
+if MYSQL_REPLICAS:
+    with st.sidebar.expander("Database Endpoints"):
+        st.dataframe(get_router().load_report(), hide_index=True)
 
 # -------------------------
 # Session state initialization
@@ -145,25 +278,402 @@ if 'selected_claim_data' not in st.session_state:
 # -------------------------
 # Data Loading Functions
 # -------------------------
-@st.cache_data(ttl=5)
-def load_table_data(table_name):
-    """Load data from MySQL table"""
-    conn = get_mysql_connection()
-    if conn is None:
-        return pd.DataFrame()
-    
+@st.cache_resource
+def get_shared_cache():
+    """Cache shared by all worker processes (cache.backend), or None when it is off."""
+    return shared_cache.create_shared_cache(CONFIG.cache)
+
+@st.cache_resource
+def get_shard_set():
+    """Shard databases and their directory (sharding.enabled); tables are created on first use."""
+    return sharding.create_shard_set(CONFIG.sharding, CONFIG.database)
+
+# The loaders below run in the refresh workers too, so they use these instead of the cached getters
+SHARED_CACHE = get_shared_cache()
+SHARD_SET = get_shard_set() if CONFIG.sharding.enabled else None
+
+@st.cache_resource
+def get_refreshing_cache():
+    """Table and canned query results of this process, served stale while they refresh (see refreshing_cache.py)."""
+    return refreshing_cache.RefreshingCache(CONFIG.cache.table_ttl, CONFIG.cache.max_entries, CACHE_REFRESH_WORKERS)
+
+def read_with_connection(role, read):
+    """Run read(conn) on a connection for role; raises if no database is reachable. Safe in worker threads."""
+    conn = connect(role)
     try:
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+        return read(conn)
+    finally:
         conn.close()
-        return df
+
+def read_with_cursor(role, read):
+    """Run read(cursor) on a connection for role, closing both; raises if no database is reachable."""
+    def with_cursor(conn):
+        cursor = conn.cursor()
+        try:
+            return read(cursor)
+        finally:
+            cursor.close()
+    return read_with_connection(role, with_cursor)
+
+def read_table(table_name, role):
+    """Load a whole table, through the shared cache when it is on."""
+    if CONFIG.sharding.enabled:
+        def load():
+            return SHARD_SET.table(table_name)
+    else:
+        def load():
+            return read_with_connection(
+                role, lambda conn: columnar.read_frame(conn, deletions.live_query(table_name), CONFIG.database))
+    return load() if SHARED_CACHE is None else SHARED_CACHE.get_or_load(f"table:{table_name}", load)
+
+def read_query(query, columns, role):
+    """Execute a canned query into a DataFrame, through the shared cache when it is on."""
+    def load():
+        return read_with_connection(role, lambda conn: columnar.read_frame(conn, query, CONFIG.database, columns=columns))
+    return load() if SHARED_CACHE is None else SHARED_CACHE.get_or_load(f"query-frame:{hashlib.sha1(query.encode()).hexdigest()}", load)
+
+def load_table_data(table_name, role="replica"):
+    """Load data from MySQL table"""
+    try:
+        return get_refreshing_cache().get(("table", table_name, role), lambda: read_table(table_name, role))
     except Exception as e:
         st.error(f"Error loading {table_name}: {e}")
-        conn.close()
         return pd.DataFrame()
 
+def run_query(query, columns, role="replica"):
+    """Canned query result from the refreshing cache."""
+    return get_refreshing_cache().get(("query", query, role), lambda: read_query(query, columns, role))
+
+@st.cache_resource
+def start_warm_up():
+    """Load every table and canned query in the background once per server process."""
+    loads = {("table", table, "replica"): functools.partial(read_table, table, "replica") for table in crud.TABLE_COLUMNS}
+    if not CONFIG.sharding.enabled:
+        loads.update({("query", sql, "replica"): functools.partial(read_query, sql, columns, "replica")
+                      for _, sql, columns in queries.CANNED_QUERIES.values()})
+    return get_refreshing_cache().warm(loads)
+
+if st.session_state.db_initialized:
+    start_warm_up()
+
 def clear_cache():
     """Clear all cached data"""
-    load_table_data.clear()
+    get_refreshing_cache().invalidate()
+    if get_shared_cache() is not None:
+        get_shared_cache().invalidate()
+    # Called after every successful write, so it also marks the session for read-your-writes routing
+    st.session_state.last_write_time = time.time()
+
+# -------------------------
+# Analytics Sketch Functions
+# -------------------------
+def sketches_enabled():
+    return CONFIG.analytics.backend == "sketch"
+
+@st.cache_resource
+def get_sketch_store():
+    """Load the sketch snapshot from disk, or build it from MySQL on first use."""
+    store = sketches.SketchStore(CONFIG.analytics.sketch_path, CONFIG.analytics.sketch_save_seconds)
+    if not store.load():
+        conn = get_mysql_connection()
+        if conn is not None:
+            store.rebuild(conn)
+            conn.close()
+    return store
+
+# -------------------------
+# Geospatial Functions
+# -------------------------
+@st.cache_resource
+def get_geo_index():
+    """Proximity index geocoded in the background on first read and every geo.rebuild_seconds; CRUD writes keep it current."""
+    gazetteer = geo.Gazetteer.load(CONFIG.geo.gazetteer_path, CONFIG.geo.approximate_unknown)
+    return geo.LazyProximityIndex(gazetteer, lambda: connect_endpoint(ROUTER.primary),
+                                  CONFIG.geo.cell_km, CONFIG.geo.rebuild_seconds)
+
+# -------------------------
+# Change Event Relay
+# -------------------------
+@st.cache_resource
+def start_outbox_relay():
+    """Start one relay thread per server process; concurrent relays serialize on the outbox."""
+    relay = outbox.Relay(lambda: connect_endpoint(ROUTER.primary), CONFIG.outbox.log_dir, CONFIG.outbox.batch_size)
+    thread = outbox.RelayThread(relay, CONFIG.outbox.relay_interval_seconds)
+    thread.start()
+    return thread
+
+if CONFIG.outbox.enabled:
+    relay_thread = start_outbox_relay()
+    st.sidebar.caption(f"Change events relayed by this process: {relay_thread.relayed}")
+
+# -------------------------
+# Duplicate Detection Functions
+# -------------------------
+def warn_possible_duplicates(table, record):
+    """After an insert, warn if the new provider/receiver looks like an existing one in its city."""
+    if CONFIG.sharding.enabled:
+        # Providers and receivers are placed by city, so all candidates are on the new row's shard
+        shard_set = get_shard_set()
+        shard = shard_set.shards[shard_set.shard_for_city(record.get("City"))]
+        try:
+            show_duplicate_warning(table, shard.transaction(lambda cursor: dedup.find_matches(cursor, table, record)))
+        except Exception as e:
+            st.error(f"Error checking for duplicates: {e}")
+        return
+    conn = get_mysql_connection()
+    if conn is None:
+        return
+    cursor = conn.cursor()
+    try:
+        show_duplicate_warning(table, dedup.find_matches(cursor, table, record))
+    except Exception as e:
+        st.error(f"Error checking for duplicates: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+def show_duplicate_warning(table, matches):
+    if not matches.empty:
+        id_column = dedup.ID_COLUMNS[table]
+        similar = ", ".join(f"{row['Name']} (ID {row[id_column]}, score {row['score']})" for _, row in matches.head(5).iterrows())
+        st.warning(f"Possible duplicate of: {similar}")
+
+def duplicates_widget(df, table, key):
+    """Button that scans a whole providers/receivers table for merge candidates."""
+    if st.button("🔎 Find Possible Duplicates", key=key):
+        candidates = dedup.find_duplicates(df, table)
+        if candidates.empty:
+            st.info("No likely duplicates found.")
+        else:
+            st.dataframe(candidates, use_container_width=True, hide_index=True)
+
+# -------------------------
+# Key Validation Functions
+# -------------------------
+TABLE_COLUMNS = crud.TABLE_COLUMNS
+
+@st.cache_resource
+def get_id_registry():
+    """ID bitmaps shared by all sessions; loaded per table on first use."""
+    if CONFIG.sharding.enabled:
+        return sharding.DirectoryRegistry(get_shard_set().directory)
+    return validation.IdRegistry(lambda: connect_endpoint(ROUTER.primary))
+
+@st.cache_resource
+def get_id_allocator():
+    """Per-process ID allocator; reserves blocks of IDs from the id_sequences table."""
+    return ids.IdAllocator(lambda: connect_endpoint(ROUTER.primary), CONFIG.database.id_block_size)
+
+def check_keys(table, row, check_existing_keys=True):
+    """Validate one form row against the cached ID sets; show every problem and return False if any."""
+    problems = validation.validate_batch(get_id_registry(), table, pd.DataFrame([row]), check_existing_keys)
+    for _, problem in problems.iterrows():
+        st.error(f"{problem['column']} {problem['value']}: {problem['problem']}.")
+    return problems.empty
+
+# -------------------------
+# Write Functions
+# -------------------------
+def primary_connection():
+    """Connection to the primary for a write, counted in the endpoint load report."""
+    conn = connect_endpoint(ROUTER.primary)
+    ROUTER.record(ROUTER.primary, "writes")
+    return conn
+
+@st.cache_resource
+def get_store():
+    """Transactional write path (see crud.py) shared by all sessions."""
+    if CONFIG.sharding.enabled:
+        return sharding.ShardedStore(get_shard_set(), registry=get_id_registry, sequences=primary_connection)
+    return crud.Store(
+        primary_connection,
+        registry=get_id_registry,
+        geo_index=get_geo_index,
+        sketch_store=lambda: get_sketch_store() if sketches_enabled() else None,
+        outbox=CONFIG.outbox.enabled,
+        table_stats=get_table_stats,
+    )
+
+@st.cache_resource
+def get_table_stats():
+    """Column statistics shared by all sessions; each table is profiled in SQL on first view."""
+    return table_stats.TableStats(lambda: connect_endpoint(ROUTER.primary), CONFIG.ui.table_stats_refresh_seconds)
+
+# -------------------------
+# Background Deletion Jobs
+# -------------------------
+@st.cache_resource
+def start_deletion_worker():
+    """Start one deletion worker per server process; workers claim jobs one at a time."""
+    worker = deletions.DeletionWorker(get_store(), lambda: connect_endpoint(ROUTER.primary), CONFIG.deletes)
+    worker.start()
+    return worker
+
+if CONFIG.deletes.background and st.session_state.db_initialized:
+    start_deletion_worker()
+    with st.sidebar.expander("Deletion Jobs"):
+        try:
+            jobs = pd.DataFrame(deletions.recent_jobs(lambda: connect_endpoint(ROUTER.primary), limit=10),
+                                columns=deletions.JOB_COLUMNS)
+            if jobs.empty:
+                st.write("No deletion jobs yet.")
+            else:
+                st.dataframe(jobs, hide_index=True)
+        except mysql.connector.Error as e:
+            st.error(f"Error loading deletion jobs: {e}")
+
+# -------------------------
+# Background Archive Sweeper
+# -------------------------
+@st.cache_resource
+def start_archive_sweeper():
+    """Start one sweeper thread per server process (not per session)."""
+    sweeper = archive.ArchiveSweeper(lambda: connect_endpoint(ROUTER.primary), CONFIG.archive,
+                                     events=CONFIG.outbox.enabled, store=get_store())
+    sweeper.start()
+    return sweeper
+
+if CONFIG.archive.enabled:
+    sweeper = start_archive_sweeper()
+    with st.sidebar.expander("Archive Sweeper"):
+        if sweeper.history:
+            st.dataframe(pd.DataFrame(sweeper.history[::-1]), hide_index=True)
+        else:
+            st.write("No sweep has finished yet.")
+
+# -------------------------
+# Data Export Functions
+# -------------------------
+EXPORT_CHUNK_SIZE = CONFIG.ui.export_chunk_size
+# Served by Streamlit from disk at app/static/exports/ (server.enableStaticServing in .streamlit/config.toml)
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+EXPORT_MAX_AGE_SECONDS = 3600
+
+def remove_old_exports():
+    """Delete prepared exports whose links have expired."""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    for token in os.listdir(EXPORT_DIR):
+        folder = os.path.join(EXPORT_DIR, token)
+        if time.time() - os.path.getmtime(folder) > EXPORT_MAX_AGE_SECONDS:
+            shutil.rmtree(folder, ignore_errors=True)
+
+def export_widget(query, base_name, key):
+    """Render the export format picker; the prepared file is downloaded through a link, not held in memory."""
+    with st.expander("⬇️ Export Data"):
+        export_format = st.selectbox("Export format", list(export.FORMATS.keys()), key=f"{key}_format")
+        if st.button("Prepare Export", key=f"{key}_prepare"):
+            remove_old_exports()
+            extension, mime = export.FORMATS[export_format]
+            file_name = f"{base_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+            # An unguessable folder per export, so one session cannot fetch another's file
+            token = secrets.token_urlsafe(16)
+            os.makedirs(os.path.join(EXPORT_DIR, token))
+            path = os.path.join(EXPORT_DIR, token, file_name)
+            try:
+                read_with_connection(read_role(), lambda conn: export.export_query(
+                    conn, query, export_format, path, chunk_size=EXPORT_CHUNK_SIZE))
+            except ImportError:
+                st.error("Parquet export requires the 'pyarrow' package.")
+                return
+            except Exception as e:
+                st.error(f"Error exporting data: {e}")
+                return
+            if st.get_option("server.enableStaticServing"):
+                st.markdown(f'<a href="app/static/exports/{token}/{file_name}" download="{file_name}">'
+                            f'Download {file_name}</a>', unsafe_allow_html=True)
+                st.caption(f"{os.path.getsize(path) / 2**20:,.1f} MB; the link expires in "
+                           f"{EXPORT_MAX_AGE_SECONDS // 60} minutes.")
+            else:
+                # Without static serving the button has to hold the whole file in memory
+                with open(path, "rb") as f:
+                    st.download_button("Download", data=f, file_name=file_name, mime=mime, key=f"{key}_download")
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+@st.cache_data(ttl=CONFIG.ui.dashboard_refresh_seconds)
+def load_dashboard_kpis(today):
+    """Dashboard numbers from the rollup tables, shared by every session until the TTL expires."""
+    conn = get_mysql_connection("replica")
+    if conn is None:
+        return None
+    cursor = conn.cursor()
+    try:
+        return rollups.dashboard_kpis(cursor, today)
+    finally:
+        cursor.close()
+        conn.close()
+
+@st.fragment(run_every=CONFIG.ui.dashboard_refresh_seconds)
+def live_dashboard():
+    """KPI panel; reruns on its own timer without rerunning the rest of the page."""
+    kpis = load_dashboard_kpis(datetime.today().date())
+    if kpis is None:
+        st.warning("Live figures are unavailable until the database connection works.")
+        return
+
+    claims_by_status = dict(kpis["claims_by_status"])
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Open listings", f"{kpis['open_listings']:,}")
+    col2.metric("Quantity expiring today", f"{kpis['expiring_today']:,}")
+    col3.metric("Completed claims", f"{int(claims_by_status.get('Completed', 0)):,}")
+    col4.metric("Pending claims", f"{int(claims_by_status.get('Pending', 0)):,}")
+
+    left, right = st.columns(2)
+    with left:
+        st.markdown("**Claims by status**")
+        st.bar_chart(pd.DataFrame(kpis["claims_by_status"], columns=["Status", "Claims"]).set_index("Status"))
+    with right:
+        st.markdown("**Top cities by open listings**")
+        st.bar_chart(pd.DataFrame(kpis["top_cities"], columns=["City", "Open listings"]).set_index("City"))
+
+    st.markdown("**Claims per day (last 90 days)**")
+    trend = pd.DataFrame(kpis["claims_trend"], columns=["Day", "Status", "Claims", "Quantity"])
+    if trend.empty:
+        st.info("No claims in the last 90 days.")
+    else:
+        st.line_chart(trend.pivot_table(index="Day", columns="Status", values="Claims", aggfunc="sum").fillna(0))
+    st.caption(f"Refreshes every {CONFIG.ui.dashboard_refresh_seconds} s from pre-aggregated rollups.")
+
+@st.cache_data(ttl=CONFIG.forecast.refresh_seconds)
+def load_demand_forecast(today):
+    """Demand forecasts for every City x Food_Type x Meal_Type, shared by every session until the TTL expires."""
+    conn = get_mysql_connection("replica")
+    if conn is None:
+        return None
+    cursor = conn.cursor()
+    try:
+        settings = CONFIG.forecast
+        return forecasting.forecast_demand(cursor, today, settings.history_days, settings.horizon_days,
+                                           settings.holdout_days)
+    finally:
+        cursor.close()
+        conn.close()
+
+def demand_forecast_panel():
+    """Forecast of claimed quantity per city, food type and meal type for the coming days."""
+    forecast = load_demand_forecast(datetime.today().date())
+    if forecast is None:
+        return
+    st.subheader(f"📈 Demand Forecast (next {CONFIG.forecast.horizon_days} days)")
+    if forecast.empty:
+        st.info(f"No claims in the last {CONFIG.forecast.history_days} days to forecast from.")
+        return
+    cities = sorted(forecast["City"].unique())
+    city = st.selectbox("City", ["All cities"] + cities, key="forecast_city")
+    shown = forecast if city == "All cities" else forecast[forecast["City"] == city]
+    day_columns = [c for c in forecast.columns if c not in forecasting.SERIES_KEYS + ["Model", "Holdout_MAE", "Forecast_Total"]]
+    st.line_chart(shown.groupby("Food_Type")[day_columns].sum().T)
+    st.dataframe(shown.head(50), use_container_width=True, hide_index=True)
+    st.caption(f"{len(forecast):,} series; each uses the model with the lowest error over the last "
+               f"{CONFIG.forecast.holdout_days} days. Recomputed every {CONFIG.forecast.refresh_seconds // 60} min.")
+
+@st.cache_resource
+def load_dashboard_image(path):
+    """Read the configured dashboard image once instead of on every render."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
 
 # ===========================
 # Dashboard Page
@@ -172,12 +682,18 @@ if page == "Dashboard":
     st.markdown('<h1 class="main-header">🌱 Local Food Waste Management System</h1>', unsafe_allow_html=True)
     left_co, cent_co, right_co = st.columns(3)
     with cent_co:
-        # Use a placeholder image or remove this line if image doesn't exist
-        try:
-            st.image("C:/Users/ACER/Desktop/image/food_waste.jpeg", width=600)
-        except:
+        image = load_dashboard_image(CONFIG.ui.dashboard_image)
+        if image:
+            st.image(image, width=600)
+        else:
             st.info("🌱 Welcome to Food Waste Management System")
     
+    if st.session_state.db_initialized and CONFIG.sharding.enabled:
+        st.info("Live figures and forecasts come from rollups on the primary database, which sharded writes do not update.")
+    elif st.session_state.db_initialized:
+        live_dashboard()
+        demand_forecast_panel()
+
     st.subheader("Introduction")
     st.markdown('''
         <p style="
@@ -227,18 +743,35 @@ elif page == "View Tables":
     table_name = table_dict[selected_table_name]
 
     # Load data from MySQL
-    df = load_table_data(table_name)
+    df = load_table_data(table_name, read_role())
     
     if df.empty:
         st.info(f"No {selected_table_name} found in database. Please add data using CRUD Operations.")
     else:
         st.subheader(f"Preview: {selected_table_name}")
-        st.dataframe(df, use_container_width=True)
+        page_size = CONFIG.ui.page_size
+        page_count = max((len(df) - 1) // page_size + 1, 1)
+        page_number = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+        start = (page_number - 1) * page_size
+        st.dataframe(df.iloc[start:start + page_size], use_container_width=True)
+        if not CONFIG.sharding.enabled:
+            export_widget(deletions.live_query(table_name), table_name, "table_export")
 
         with st.expander(f"Show Data Summary for {selected_table_name}"):
-            st.write(f"Total rows: {len(df)}")
-            st.write("Column types:")
-            st.write(df.dtypes)
+            if CONFIG.sharding.enabled:
+                # Column statistics are kept by crud.Store only; summarize the rows gathered from the shards
+                st.write(f"Total rows: {len(df)}")
+                st.write("Column types:")
+                st.write(df.dtypes)
+            else:
+                stats = get_table_stats()
+                st.write(f"Total rows: {stats.row_count(table_name)}")
+                st.dataframe(stats.summary(table_name), use_container_width=True, hide_index=True)
+                st.caption(f"Maintained incrementally on this process's writes and re-profiled every "
+                           f"{CONFIG.ui.table_stats_refresh_seconds} s; distinct counts are HyperLogLog estimates.")
+                if st.button("Recompute statistics", key="recompute_stats"):
+                    stats.rebuild(table_name)
+                    st.rerun()
 
         st.markdown("---")
         st.markdown("### Search and Filter Rows")
@@ -271,259 +804,186 @@ elif page == "CRUD Operations":
 
     # Providers CRUD
     def add_provider(provider_id, name, p_type, address, city, contact):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
+        record = {"Provider_ID": provider_id, "Name": name, "Type": p_type, "Address": address, "City": city, "Contact": contact}
         try:
-            cursor.execute(
-                "INSERT INTO providers_data (Provider_ID, Name, Type, Address, City, Contact) VALUES (%s, %s, %s, %s, %s, %s)",
-                (provider_id, name, p_type, address, city, contact)
-            )
-            conn.commit()
+            get_store().insert("providers_data", [record])
             st.success(f"Provider '{name}' (ID: {provider_id}) added successfully!")
+            warn_possible_duplicates("providers_data", record)
             clear_cache()
         except mysql.connector.IntegrityError:
-            st.error(f"Error: Provider ID '{provider_id}' already exists. Please use a unique ID.")
+            st.error(f"Error: the assigned Provider ID '{provider_id}' is already taken by a row written outside "
+                     f"this app. Please submit the form again to get a new ID.")
         except Exception as e:
             st.error(f"Error adding provider: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def update_provider(provider_id, name, p_type, address, city, contact):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                "UPDATE providers_data SET Name = %s, Type = %s, Address = %s, City = %s, Contact = %s WHERE Provider_ID = %s",
-                (name, p_type, address, city, contact, provider_id)
-            )
-            conn.commit()
-            if cursor.rowcount > 0:
+            record = {"Provider_ID": provider_id, "Name": name, "Type": p_type, "Address": address, "City": city, "Contact": contact}
+            if get_store().update("providers_data", record) > 0:
                 st.success(f"Provider ID {provider_id} updated successfully!")
                 clear_cache()
             else:
                 st.warning(f"No provider found with ID {provider_id} to update.")
         except Exception as e:
             st.error(f"Error updating provider: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def delete_provider(provider_id):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute("DELETE FROM providers_data WHERE Provider_ID = %s", (provider_id,))
-            conn.commit()
-            if cursor.rowcount > 0:
+            if CONFIG.deletes.background:
+                job_id = get_store().soft_delete("providers_data", provider_id)
+                if job_id is not None:
+                    st.success(f"Provider ID {provider_id} deleted; its listings and claims are being removed "
+                               f"in the background (job {job_id}).")
+                    clear_cache()
+                else:
+                    st.warning(f"No provider found with ID {provider_id} to delete.")
+            elif get_store().delete("providers_data", [provider_id]) > 0:
                 st.success(f"Provider ID {provider_id} deleted successfully!")
                 clear_cache()
             else:
                 st.warning(f"No provider found with ID {provider_id} to delete.")
         except Exception as e:
             st.error(f"Error deleting provider: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     # Similar functions for receivers, food_listings, and claims
     def add_receiver(receiver_id, name, r_type, city, contact):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
+        record = {"Receiver_ID": receiver_id, "Name": name, "Type": r_type, "City": city, "Contact": contact}
         try:
-            cursor.execute(
-                "INSERT INTO receivers_data (Receiver_ID, Name, Type, City, Contact) VALUES (%s, %s, %s, %s, %s)",
-                (receiver_id, name, r_type, city, contact)
-            )
-            conn.commit()
+            get_store().insert("receivers_data", [record])
             st.success(f"Receiver '{name}' (ID: {receiver_id}) added successfully!")
+            warn_possible_duplicates("receivers_data", record)
             clear_cache()
         except mysql.connector.IntegrityError:
-            st.error(f"Error: Receiver ID '{receiver_id}' already exists. Please use a unique ID.")
+            st.error(f"Error: the assigned Receiver ID '{receiver_id}' is already taken by a row written outside "
+                     f"this app. Please submit the form again to get a new ID.")
         except Exception as e:
             st.error(f"Error adding receiver: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def update_receiver(receiver_id, name, r_type, city, contact):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                "UPDATE receivers_data SET Name = %s, Type = %s, City = %s, Contact = %s WHERE Receiver_ID = %s",
-                (name, r_type, city, contact, receiver_id)
-            )
-            conn.commit()
-            if cursor.rowcount > 0:
+            record = {"Receiver_ID": receiver_id, "Name": name, "Type": r_type, "City": city, "Contact": contact}
+            if get_store().update("receivers_data", record) > 0:
                 st.success(f"Receiver ID {receiver_id} updated successfully!")
                 clear_cache()
             else:
                 st.warning(f"No receiver found with ID {receiver_id} to update.")
         except Exception as e:
             st.error(f"Error updating receiver: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def delete_receiver(receiver_id):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute("DELETE FROM receivers_data WHERE Receiver_ID = %s", (receiver_id,))
-            conn.commit()
-            if cursor.rowcount > 0:
+            if CONFIG.deletes.background:
+                job_id = get_store().soft_delete("receivers_data", receiver_id)
+                if job_id is not None:
+                    st.success(f"Receiver ID {receiver_id} deleted; its listings and claims are being removed "
+                               f"in the background (job {job_id}).")
+                    clear_cache()
+                else:
+                    st.warning(f"No receiver found with ID {receiver_id} to delete.")
+            elif get_store().delete("receivers_data", [receiver_id]) > 0:
                 st.success(f"Receiver ID {receiver_id} deleted successfully!")
                 clear_cache()
             else:
                 st.warning(f"No receiver found with ID {receiver_id} to delete.")
         except Exception as e:
             st.error(f"Error deleting receiver: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def add_food_listing(food_id, food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                "INSERT INTO food_listings_data (Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID, Provider_Type, Location, Food_Type, Meal_Type) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                (food_id, food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type)
-            )
-            conn.commit()
+            get_store().insert("food_listings_data", [{
+                "Food_ID": food_id, "Food_Name": food_name, "Quantity": quantity, "Expiry_Date": expiry_date,
+                "Provider_ID": provider_id, "Provider_Type": provider_type, "Location": location,
+                "Food_Type": food_type, "Meal_Type": meal_type,
+            }])
             st.success(f"Food Listing '{food_name}' (ID: {food_id}) added successfully!")
             clear_cache()
-        except mysql.connector.IntegrityError:
-            st.error(f"Error: Food ID '{food_id}' already exists. Please use a unique ID.")
+        except mysql.connector.IntegrityError as e:
+            # Food_ID is assigned automatically, so this is usually a provider that no longer exists
+            st.error(f"Error: the database rejected food listing {food_id}: {e}")
         except Exception as e:
             st.error(f"Error adding food listing: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def update_food_listing(food_id, food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                "UPDATE food_listings_data SET Food_Name = %s, Quantity = %s, Expiry_Date = %s, Provider_ID = %s, Provider_Type = %s, Location = %s, Food_Type = %s, Meal_Type = %s WHERE Food_ID = %s",
-                (food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type, food_id)
-            )
-            conn.commit()
-            if cursor.rowcount > 0:
+            record = {
+                "Food_ID": food_id, "Food_Name": food_name, "Quantity": quantity, "Expiry_Date": expiry_date,
+                "Provider_ID": provider_id, "Provider_Type": provider_type, "Location": location,
+                "Food_Type": food_type, "Meal_Type": meal_type,
+            }
+            if get_store().update("food_listings_data", record) > 0:
                 st.success(f"Food Listing ID {food_id} updated successfully!")
                 clear_cache()
             else:
                 st.warning(f"No food listing found with ID {food_id} to update.")
         except Exception as e:
             st.error(f"Error updating food listing: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def delete_food_listing(food_id):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute("DELETE FROM food_listings_data WHERE Food_ID = %s", (food_id,))
-            conn.commit()
-            if cursor.rowcount > 0:
+            if get_store().delete("food_listings_data", [food_id]) > 0:
                 st.success(f"Food Listing ID {food_id} deleted successfully!")
                 clear_cache()
             else:
                 st.warning(f"No food listing found with ID {food_id} to delete.")
         except Exception as e:
             st.error(f"Error deleting food listing: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def add_claim(claim_id, food_id, receiver_id, status, timestamp):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                "INSERT INTO claims_data (Claim_ID, Food_ID, Receiver_ID, Status, Timestamp) VALUES (%s, %s, %s, %s, %s)",
-                (claim_id, food_id, receiver_id, status, timestamp)
-            )
-            conn.commit()
+            get_store().insert("claims_data", [{
+                "Claim_ID": claim_id, "Food_ID": food_id, "Receiver_ID": receiver_id, "Status": status, "Timestamp": timestamp,
+            }])
             st.success(f"Claim '{claim_id}' added successfully!")
             clear_cache()
-        except mysql.connector.IntegrityError:
-            st.error(f"Error: Claim ID '{claim_id}' already exists. Please use a unique ID.")
+        except mysql.connector.IntegrityError as e:
+            # Claim_ID is assigned automatically, so this is usually a listing or receiver that no longer exists
+            st.error(f"Error: the database rejected claim {claim_id}: {e}")
         except Exception as e:
             st.error(f"Error adding claim: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def update_claim(claim_id, food_id, receiver_id, status, timestamp):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                "UPDATE claims_data SET Food_ID = %s, Receiver_ID = %s, Status = %s, Timestamp = %s WHERE Claim_ID = %s",
-                (food_id, receiver_id, status, timestamp, claim_id)
-            )
-            conn.commit()
-            if cursor.rowcount > 0:
+            record = {"Claim_ID": claim_id, "Food_ID": food_id, "Receiver_ID": receiver_id, "Status": status, "Timestamp": timestamp}
+            if get_store().update("claims_data", record) > 0:
                 st.success(f"Claim ID {claim_id} updated successfully!")
                 clear_cache()
             else:
                 st.warning(f"No claim found with ID {claim_id} to update.")
         except Exception as e:
             st.error(f"Error updating claim: {e}")
-        finally:
-            cursor.close()
-            conn.close()
 
     def delete_claim(claim_id):
-        conn = get_mysql_connection()
-        if conn is None:
-            return
-        cursor = conn.cursor()
         try:
-            cursor.execute("DELETE FROM claims_data WHERE Claim_ID = %s", (claim_id,))
-            conn.commit()
-            if cursor.rowcount > 0:
+            if get_store().delete("claims_data", [claim_id]) > 0:
                 st.success(f"Claim ID {claim_id} deleted successfully!")
                 clear_cache()
             else:
                 st.warning(f"No claim found with ID {claim_id} to delete.")
         except Exception as e:
             st.error(f"Error deleting claim: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+
+    # Bulk insert of pre-validated rows
+    def bulk_insert(table, rows, explicit_keys):
+        records = [{column: None if pd.isna(value) else value for column, value in record.items()}
+                   for record in rows[TABLE_COLUMNS[table]].to_dict("records")]
+        try:
+            get_store().insert(table, records, explicit_keys=explicit_keys)
+            st.success(f"Imported {len(records)} rows into {table}.")
+            clear_cache()
+        except ids.ExplicitIdError as e:
+            st.error(f"Import rolled back: {e}")
+        except mysql.connector.IntegrityError as e:
+            # The ID cache was stale (e.g. rows written outside this app); reload it next time
+            get_id_registry().invalidate()
+            st.error(f"Import rolled back, a key conflicted with the database: {e}")
+        except Exception as e:
+            st.error(f"Error importing rows: {e}")
 
     # Load current data for CRUD operations
-    df_providers = load_table_data("providers_data")
-    df_receivers = load_table_data("receivers_data")
-    df_food_listings = load_table_data("food_listings_data")
-    df_claims = load_table_data("claims_data")
+    df_providers = load_table_data("providers_data", read_role())
+    df_receivers = load_table_data("receivers_data", read_role())
+    df_food_listings = load_table_data("food_listings_data", read_role())
+    df_claims = load_table_data("claims_data", read_role())
 
     # -------- Providers CRUD Interface ---
     st.header("👤 Providers Data")
@@ -532,7 +992,7 @@ elif page == "CRUD Operations":
         # Add New Provider
         st.subheader("➕ Add New Provider")
         with st.form("add_provider_form", clear_on_submit=True):
-            new_Provider_ID = st.number_input("Provider ID", min_value=1, step=1, format="%d", key="add_provider_id")
+            st.caption("Provider ID is assigned automatically.")
             new_Name = st.text_input("Provider Name", max_chars=255, key="add_provider_name")
             new_Type = st.text_input("Type", max_chars=100, key="add_provider_type")
             new_Address = st.text_input("Address", max_chars=255, key="add_provider_address")
@@ -541,8 +1001,8 @@ elif page == "CRUD Operations":
 
             submit_add = st.form_submit_button("Add Provider")
             if submit_add:
-                if all([new_Provider_ID, new_Name, new_Type, new_Address, new_City, new_Contact]):
-                    add_provider(int(new_Provider_ID), new_Name, new_Type, new_Address, new_City, new_Contact)
+                if all([new_Name, new_Type, new_Address, new_City, new_Contact]):
+                    add_provider(get_id_allocator().next_id("providers_data"), new_Name, new_Type, new_Address, new_City, new_Contact)
                     st.rerun()
                 else:
                     st.warning("Please fill in all fields to add a provider.")
@@ -611,6 +1071,10 @@ elif page == "CRUD Operations":
         else:
             st.info("Select a provider above to delete.")
 
+        st.markdown("---")
+        st.subheader("🧬 Duplicate Providers")
+        duplicates_widget(df_providers, "providers_data", "find_duplicate_providers")
+
     # ------- RECEIVERS CRUD SECTION --------
     st.markdown("---")
     st.header("👥 Receivers Data")
@@ -619,7 +1083,7 @@ elif page == "CRUD Operations":
         # Add New Receiver
         st.subheader("➕ Add New Receiver")
         with st.form("add_receiver_form", clear_on_submit=True):
-            new_Receiver_ID = st.number_input("Receiver ID", min_value=1, step=1, format="%d", key="add_receiver_id")
+            st.caption("Receiver ID is assigned automatically.")
             new_Name_receiver = st.text_input("Receiver Name", max_chars=255, key="add_receiver_name")
             new_Type_receiver = st.text_input("Type", max_chars=100, key="add_receiver_type")
             new_City_receiver = st.text_input("City", max_chars=100, key="add_receiver_city")
@@ -627,8 +1091,8 @@ elif page == "CRUD Operations":
 
             submit_add_receiver = st.form_submit_button("Add Receiver")
             if submit_add_receiver:
-                if all([new_Receiver_ID, new_Name_receiver, new_Type_receiver, new_City_receiver, new_Contact_receiver]):
-                    add_receiver(int(new_Receiver_ID), new_Name_receiver, new_Type_receiver, new_City_receiver, new_Contact_receiver)
+                if all([new_Name_receiver, new_Type_receiver, new_City_receiver, new_Contact_receiver]):
+                    add_receiver(get_id_allocator().next_id("receivers_data"), new_Name_receiver, new_Type_receiver, new_City_receiver, new_Contact_receiver)
                     st.rerun()
                 else:
                     st.warning("Please fill in all fields to add a receiver.")
@@ -699,6 +1163,11 @@ elif page == "CRUD Operations":
 
         st.markdown("---")
 
+        st.subheader("🧬 Duplicate Receivers")
+        duplicates_widget(df_receivers, "receivers_data", "find_duplicate_receivers")
+
+        st.markdown("---")
+
         # Current Receivers List (at the end)
         st.subheader("📋 Current Receivers List")
         if not df_receivers.empty:
@@ -714,7 +1183,7 @@ elif page == "CRUD Operations":
         # Add New Food Listing
         st.subheader("➕ Add New Food Listing")
         with st.form("add_food_listing_form", clear_on_submit=True):
-            new_Food_ID = st.number_input("Food ID", min_value=1, step=1, format="%d", key="add_food_id")
+            st.caption("Food ID is assigned automatically.")
             new_Food_Name = st.text_input("Food Name", max_chars=255, key="add_food_name")
             new_Quantity = st.number_input("Quantity", min_value=0, step=1, format="%d", key="add_quantity")
             new_Expiry_Date = st.date_input("Expiry Date", value=datetime.today(), key="add_expiry_date")
@@ -727,11 +1196,13 @@ elif page == "CRUD Operations":
             submit_add_food = st.form_submit_button("Add Food Listing")
 
             if submit_add_food:
-                if all([new_Food_ID, new_Food_Name, new_Quantity is not None, new_Expiry_Date, new_Provider_ID_food, new_Provider_Type_food,
+                if all([new_Food_Name, new_Quantity is not None, new_Expiry_Date, new_Provider_ID_food, new_Provider_Type_food,
                         new_Location_food, new_Food_Type, new_Meal_Type]):
-                    add_food_listing(int(new_Food_ID), new_Food_Name, int(new_Quantity), new_Expiry_Date.strftime('%Y-%m-%d'),
-                                     int(new_Provider_ID_food), new_Provider_Type_food, new_Location_food, new_Food_Type, new_Meal_Type)
-                    st.rerun()
+                    new_Food_ID = get_id_allocator().next_id("food_listings_data")
+                    if check_keys("food_listings_data", {"Food_ID": new_Food_ID, "Provider_ID": int(new_Provider_ID_food)}, check_existing_keys=False):
+                        add_food_listing(new_Food_ID, new_Food_Name, int(new_Quantity), new_Expiry_Date.strftime('%Y-%m-%d'),
+                                         int(new_Provider_ID_food), new_Provider_Type_food, new_Location_food, new_Food_Type, new_Meal_Type)
+                        st.rerun()
                 else:
                     st.warning("Please fill in all fields to add a food listing.")
 
@@ -783,10 +1254,11 @@ elif page == "CRUD Operations":
                     if submit_update_food:
                         if all([update_Food_Name, update_Quantity is not None, update_Expiry_Date, update_Provider_ID_food,
                                 update_Provider_Type_food, update_Location_food, update_Food_Type, update_Meal_Type]):
-                            update_food_listing(sel['Food_ID'], update_Food_Name, int(update_Quantity), update_Expiry_Date.strftime('%Y-%m-%d'),
-                                                int(update_Provider_ID_food), update_Provider_Type_food, update_Location_food, update_Food_Type, update_Meal_Type)
-                            st.session_state.selected_food_listing_data = {}
-                            st.rerun()
+                            if check_keys("food_listings_data", {"Food_ID": sel['Food_ID'], "Provider_ID": int(update_Provider_ID_food)}, check_existing_keys=False):
+                                update_food_listing(sel['Food_ID'], update_Food_Name, int(update_Quantity), update_Expiry_Date.strftime('%Y-%m-%d'),
+                                                    int(update_Provider_ID_food), update_Provider_Type_food, update_Location_food, update_Food_Type, update_Meal_Type)
+                                st.session_state.selected_food_listing_data = {}
+                                st.rerun()
                         else:
                             st.warning("Please fill in all fields to update the food listing.")
 
@@ -830,7 +1302,7 @@ elif page == "CRUD Operations":
         # Add New Claim
         st.subheader("➕ Add New Claim")
         with st.form("add_claim_form", clear_on_submit=True):
-            new_Claim_ID = st.number_input("Claim ID", min_value=1, step=1, format="%d", key="add_claim_id")
+            st.caption("Claim ID is assigned automatically.")
             new_Food_ID_claim = st.number_input("Food ID (FK)", min_value=1, step=1, format="%d", key="add_food_id_claim")
             new_Receiver_ID_claim = st.number_input("Receiver ID (FK)", min_value=1, step=1, format="%d", key="add_receiver_id_claim")
             new_Status = st.selectbox("Status", ["Pending", "Completed", "Cancelled"], key="add_status")
@@ -838,9 +1310,11 @@ elif page == "CRUD Operations":
 
             submit_add_claim = st.form_submit_button("Add Claim")
             if submit_add_claim:
-                if all([new_Claim_ID, new_Food_ID_claim, new_Receiver_ID_claim, new_Status, new_Timestamp]):
-                    add_claim(int(new_Claim_ID), int(new_Food_ID_claim), int(new_Receiver_ID_claim), new_Status, new_Timestamp)
-                    st.rerun()
+                if all([new_Food_ID_claim, new_Receiver_ID_claim, new_Status, new_Timestamp]):
+                    new_Claim_ID = get_id_allocator().next_id("claims_data")
+                    if check_keys("claims_data", {"Claim_ID": new_Claim_ID, "Food_ID": int(new_Food_ID_claim), "Receiver_ID": int(new_Receiver_ID_claim)}, check_existing_keys=False):
+                        add_claim(new_Claim_ID, int(new_Food_ID_claim), int(new_Receiver_ID_claim), new_Status, new_Timestamp)
+                        st.rerun()
                 else:
                     st.warning("Please fill in all fields to add a claim.")
 
@@ -881,9 +1355,10 @@ elif page == "CRUD Operations":
 
                     if submit_update_claim:
                         if all([update_Food_ID_claim, update_Receiver_ID_claim, update_Status, update_Timestamp]):
-                            update_claim(sel['Claim_ID'], int(update_Food_ID_claim), int(update_Receiver_ID_claim), update_Status, update_Timestamp)
-                            st.session_state.selected_claim_data = {}
-                            st.rerun()
+                            if check_keys("claims_data", {"Claim_ID": sel['Claim_ID'], "Food_ID": int(update_Food_ID_claim), "Receiver_ID": int(update_Receiver_ID_claim)}, check_existing_keys=False):
+                                update_claim(sel['Claim_ID'], int(update_Food_ID_claim), int(update_Receiver_ID_claim), update_Status, update_Timestamp)
+                                st.session_state.selected_claim_data = {}
+                                st.rerun()
                         else:
                             st.warning("Please fill in all fields to update the claim.")
 
@@ -919,6 +1394,46 @@ elif page == "CRUD Operations":
         else:
             st.info("No claims found in database.")
 
+    # ------- BULK IMPORT SECTION --------
+    st.markdown("---")
+    st.header("📥 Bulk Import")
+    with st.expander("Import rows from CSV"):
+        import_tables = {
+            "Providers Data": "providers_data",
+            "Receivers Data": "receivers_data",
+            "Food Listings Data": "food_listings_data",
+            "Claims Data": "claims_data"
+        }
+        import_table = import_tables[st.selectbox("Target table", list(import_tables.keys()), key="import_table")]
+        st.caption(f"Expected columns: {', '.join(TABLE_COLUMNS[import_table])} (the ID column may be left out)")
+        uploaded = st.file_uploader("CSV file", type="csv", key="import_file")
+        if uploaded is not None:
+            import_df = pd.read_csv(uploaded)
+            # Rows without a primary key get IDs from the allocator in one reserved block
+            primary_key = validation.SCHEMA[import_table][0]
+            if primary_key not in import_df.columns:
+                import_df[primary_key] = pd.NA
+            needs_id = import_df[primary_key].isna()
+            explicit_keys = import_df.loc[~needs_id, primary_key].tolist()
+            if needs_id.any():
+                # Reserved once per uploaded file, not on every rerun of the page
+                import_key = (import_table, hashlib.sha256(uploaded.getvalue()).hexdigest())
+                if st.session_state.get("import_ids", (None, None))[0] != import_key:
+                    st.session_state.import_ids = (import_key, get_id_allocator().allocate(import_table, int(needs_id.sum())))
+                import_df.loc[needs_id, primary_key] = st.session_state.import_ids[1]
+            missing = [c for c in TABLE_COLUMNS[import_table] if c not in import_df.columns]
+            if missing:
+                st.error(f"Missing columns: {', '.join(missing)}")
+            else:
+                # All key problems are found up front, in one pass against the cached ID sets
+                problems = validation.validate_batch(get_id_registry(), import_table, import_df)
+                if not problems.empty:
+                    st.error(f"{len(problems)} key problems found; nothing was imported.")
+                    st.dataframe(problems, use_container_width=True, hide_index=True)
+                elif st.button(f"Import {len(import_df)} rows", key="import_confirm"):
+                    bulk_insert(import_table, import_df, explicit_keys)
+                    st.session_state.pop("import_ids", None)
+
 # ===========================
 # SQL Queries Page (MySQL)
 # ===========================
@@ -930,253 +1445,106 @@ elif page == "SQL Queries":
         st.error("Database not initialized. Please check your MySQL connection.")
         st.stop()
 
-    # Query options
+    # Query options; the rollups and the proximity index are single-database, so not offered when sharded
     options = st.selectbox("Select the Query", (
-        "How many food providers and receivers are there in each city",
-        "Which type of food provider (restaurant, grocery store, etc.) contributes the most food",
-        "What is the contact information of food providers in a specific city",
-        "Which receivers have claimed the most food",
-        "What is the total quantity of food available from all providers",
-        "Which city has the highest number of food listings",
-        "What are the most commonly available food types",
-        "How many food claims have been made for each food item",
-        "Which provider has had the highest number of successful food claims",
-        "What percentage of food claims are completed vs. pending vs. canceled",
-        "What is the average quantity of food claimed per receiver",
-        "Which meal type (breakfast, lunch, dinner, snacks) is claimed the most",
-        "What is the total quantity of food donated by each provider",
-        "Which food name and food type are most provided",
-        "Which status has the highest number of claims"
+        *queries.QUESTIONS,
+        *(() if CONFIG.sharding.enabled else ("How have claims changed over time",
+                                              "Which open food listings are near a receiver"))
     ))
 
-    conn = get_mysql_connection()
-    if conn is None:
-        st.error("Could not connect to MySQL database.")
-        st.stop()
-
+    # Canned queries the sketch backend can answer without scanning the tables
+    sketch_queries = {
+        "What are the most commonly available food types": ("listings_by_food_type", "Food_Type", "count_food"),
+        "Which city has the highest number of food listings": ("listings_by_city", "city", "count_listing"),
+        "Which provider has had the highest number of successful food claims": ("completed_claims_by_provider_type", "Provider_Type", "successful_claims"),
+        "Which status has the highest number of claims": ("claims_by_status", "Status", "count"),
+    }
+    average_query = "What is the average quantity of food claimed per receiver"
+    if sketches_enabled() and (options in sketch_queries or options == average_query):
+        answer_mode = st.radio("Answer from", ["Sketch (approximate)", "SQL (exact)"], horizontal=True)
+        if answer_mode == "Sketch (approximate)":
+            store = get_sketch_store()
+            if options == average_query:
+                estimate, relative_error = store.average_quantity_per_receiver()
+                st.dataframe(pd.DataFrame([[estimate]], columns=["average_quantity_per_receiver"]))
+                st.caption(f"Receiver count is a HyperLogLog estimate (±{relative_error:.1%} standard error).")
+            else:
+                sketch_name, key_column, count_column = sketch_queries[options]
+                top, error_bound = store.top(sketch_name, 1)
+                st.dataframe(pd.DataFrame(top, columns=[key_column, count_column]))
+                st.caption(f"Count-Min estimate: overcounts by at most {error_bound} with 99% probability.")
+            st.stop()
+
+    # Canned queries read through run_query; the other answers take a connection only while they use it
+    query = None
     try:
-        cursor = conn.cursor()
-
-        if options == "How many food providers and receivers are there in each city":
-            query = """
-            WITH base AS (
-                SELECT
-                    COALESCE(p.city, r.city) AS city,
-                    IFNULL(p.Providers_count, 0) AS Providers_count,
-                    IFNULL(r.receivers_count, 0) AS receivers_count
-                FROM
-                    (SELECT p.City AS city, COUNT(DISTINCT p.Provider_ID) AS Providers_count FROM providers_data p GROUP BY 1) AS p
-                LEFT JOIN
-                    (SELECT r.City AS city, COUNT(DISTINCT r.Receiver_ID) AS receivers_count FROM receivers_data r GROUP BY 1) AS r
-                ON p.City = r.City
-
-                UNION
-
-                SELECT
-                    COALESCE(p.city, r.city) AS city,
-                    IFNULL(p.Providers_count, 0) AS Providers_count,
-                    IFNULL(r.receivers_count, 0) AS receivers_count
-                FROM
-                    (SELECT p.City AS city, COUNT(DISTINCT p.Provider_ID) AS Providers_count FROM providers_data p GROUP BY 1) AS p
-                RIGHT JOIN
-                    (SELECT r.City AS city, COUNT(DISTINCT r.Receiver_ID) AS receivers_count FROM receivers_data r GROUP BY 1) AS r
-                ON p.City = r.City
-            )
-            SELECT DISTINCT *
-            FROM base
-            ORDER BY Providers_Count DESC
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-            df1 = pd.DataFrame(result, columns=["city", "Providers_Count", "Receivers_count"])
-            st.dataframe(df1)
-        if options=="Which type of food provider (restaurant, grocery store, etc.) contributes the most food":
-            query="""
-                SELECT provider_Type,sum(Quantity) as provided_quantity from food_listings_data
-                group by provider_Type
-                order by provided_quantity desc
-                limit 1;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df2 = pd.DataFrame(result, columns=["provider_Type","provided_quantity"])
-            st.dataframe(df2)
-        if options=="What is the contact information of food providers in a specific city":
-            query="""
-                SELECT * from providers_data
-                where City="Lake Jesusview";
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df3 = pd.DataFrame(result, columns=["provider_id","Name","Type","Address","City","Contact"])
-            st.dataframe(df3)
-        if options=="Which receivers have claimed the most food":
-            query="""
-            select r.Name as receiver_name,sum(Quantity)as Food_quantity_claimed,count(c.Claim_ID)as Claim_count
-                from claims_data c
-                left join receivers_data r on c.receiver_ID=r.receiver_ID
-                left join food_listings_data f on c.food_ID=f.food_ID
-                where c.Status="Completed"
-                group by r.Name
-                order by Food_quantity_claimed desc
-                limit 1;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df4 = pd.DataFrame(result, columns=["receiver_name", "Food_quantity", "claim_count"])
-            st.dataframe(df4)
-        if options=="What is the total quantity of food available from all providers":
-            query="""
-                with base as (select distinct * from food_listings_data)
-                select sum(Quantity) as Total_Quantity from base
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df5 = pd.DataFrame(result, columns=["Total_Quantity"])
-            st.dataframe(df5)
-        if options=="Which city has the highest number of food listings":
-            query="""
-                SELECT Location, COUNT(distinct food_ID) as count_listing
-            FROM food_listings_data
-            GROUP BY Location
-            ORDER BY count_listing DESC
-            LIMIT 1;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df6 = pd.DataFrame(result, columns=["city","count_listing"])
-            st.dataframe(df6)
-        if options=="What are the most commonly available food types":
-            query="""
-                SELECT Food_Type,count(distinct Food_ID)as count_food from food_listings_data
-                group by Food_Type
-                order by count_food desc
-                limit 1;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df7 = pd.DataFrame(result, columns=["city","count"])
-            st.dataframe(df7)
-        if options=="How many food claims have been made for each food item":
-            query="""
-                SELECT Food_Name,count(distinct food_id) as Food_count from food_listings_data
-                group by Food_Name
-                order by Food_count;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df8 = pd.DataFrame(result, columns=["Food_Name","Food_claim_count"])
-            st.dataframe(df8)
-        if options=="Which provider has had the highest number of successful food claims":
-                    query="""
-                SELECT Provider_Type,count(distinct claim_id) as successful_claims
-                from food_listings_data f join claims_data c on f.food_ID=c.food_ID
-                where c.Status="Completed"
-                group by Provider_Type
-                order by successful_claims desc
-                limit 1 ;
-            """
-                    cursor.execute(query)
-                    result = cursor.fetchall()
-                    # Convert result into a DataFrame for better readability
-                    df9 = pd.DataFrame(result, columns=["Provider_Type","successful_claims"])
-                    st.dataframe(df9)
-        if options=="What percentage of food claims are completed vs. pending vs. canceled":
-            query="""
-                SELECT Status,
-                (COUNT(distinct claim_id) * 100.0 / (SELECT COUNT(distinct claim_id) FROM claims_data)) AS percentage
-            FROM claims_data
-            GROUP BY Status;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df10 = pd.DataFrame(result, columns=["Status","percentage"])
-            st.dataframe(df10)
-        if options=="What is the average quantity of food claimed per receiver":
-            query="""
-            select sum(Quantity) / count(distinct receiver_id) as average_quantity_per_receiver
-            from food_listings_data f join claims_data c on f.food_id = c.food_id  ;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df11 = pd.DataFrame(result, columns=["average_quantity_per_receiver"])
-            st.dataframe(df11)
-        if options=="Which meal type (breakfast, lunch, dinner, snacks) is claimed the most":
-            query="""
-                    select Meal_Type, count(distinct claim_id) as count_claims
-                    from food_listings_data f
-                    join claims_data c on f.food_id = c.food_id
-                    where c.Status = 'Completed'
-                    group by Meal_Type
-                    order by count_claims desc
-                    limit 1;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df12 = pd.DataFrame(result, columns=["Meal_Type","count_meal_type"])
-            st.dataframe(df12)
-        if options=="What is the total quantity of food donated by each provider":
-            query="""
-                    select  p.Provider_ID, p.name as provider_name, sum(Quantity) as total_quantity
-            from food_listings_data f join providers_data p on f.Provider_ID = p.Provider_ID
-            group by p.Provider_ID, p.name;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df13 = pd.DataFrame(result, columns=["provider_id","provider_name","total_quantity"])
-            st.dataframe(df13)
-        if options=="Which food name and food type are most provided":
-            query="""
-                    select Food_Name,sum(Quantity) as total_quantity,Food_Type from food_listings_data
-                    group by Food_Name,Food_Type
-                    order by total_quantity desc
-                    limit 1;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df14 = pd.DataFrame(result, columns=["Food_Name","total_quantity","Food_Type"])
-            st.dataframe(df14)
-        if options=="Which status has the highest number of claims":
-            query=""" 
-                    select Status,count(distinct claim_id)as count from claims_data
-                    group by Status
-                    order by count desc
-                    limit 1;
-            """
-            cursor.execute(query)
-            result = cursor.fetchall()
-
-            # Convert result into a DataFrame for better readability
-            df15 = pd.DataFrame(result, columns=["Status","count"])
-            st.dataframe(df15)   
-
-            cursor.close()
-            conn.close()
+        if options in queries.QUESTIONS and CONFIG.sharding.enabled:
+            st.dataframe(sharding.scatter_gather(get_shard_set(), queries.QUESTIONS[options]))
+            st.caption(f"Merged from partial results of {len(get_shard_set().shards)} shards.")
+        elif options in queries.QUESTIONS:
+            _, query, columns = queries.CANNED_QUERIES[queries.QUESTIONS[options]]
+            st.dataframe(run_query(query, columns, read_role()))
+        if options=="How have claims changed over time":
+            col1, col2 = st.columns(2)
+            with col1:
+                trend_start = st.date_input("From", value=datetime.today() - timedelta(days=30), key="trend_start")
+            with col2:
+                trend_end = st.date_input("To", value=datetime.today(), key="trend_end")
+            start = datetime.combine(trend_start, datetime.min.time())
+            end = datetime.combine(trend_end, datetime.max.time())
+            grain, result = read_with_cursor(read_role(), lambda cursor: rollups.claim_trend(cursor, start, end))
+
+            df16 = pd.DataFrame(result, columns=["Bucket_Start","Status","Claim_Count","Claimed_Quantity"])
+            st.caption(f"Claims per {grain}, from pre-aggregated rollups")
+            if df16.empty:
+                st.info("No claims in this date range.")
+            else:
+                st.line_chart(df16.pivot_table(index="Bucket_Start", columns="Status", values="Claim_Count", aggfunc="sum").fillna(0))
+                st.dataframe(df16)
+        if options=="Which open food listings are near a receiver":
+            col1, col2 = st.columns(2)
+            with col1:
+                near_receiver_id = st.number_input("Receiver ID", min_value=1, step=1, format="%d", key="near_receiver_id")
+            with col2:
+                near_radius_km = st.slider("Within (km)", min_value=1, max_value=200, value=25, key="near_radius_km")
+            geo_index = get_geo_index().current()
+            report = geo_index.build_report if geo_index is not None else None
+            if report:
+                listings, receivers = report["listings"], report["receivers"]
+                st.caption(f"Located {listings['geocoded']:,} of {listings['rows']:,} listings and "
+                           f"{receivers['geocoded']:,} of {receivers['rows']:,} receivers; "
+                           f"{listings['approximate'] + receivers['approximate']:,} of them at placeholder points "
+                           "for cities missing from the gazetteer, where only same-city distances are meaningful. "
+                           f"Rebuilt every {CONFIG.geo.rebuild_seconds}s to pick up other processes' writes.")
+            nearby = None if geo_index is None else geo_index.open_listings_near_receiver(int(near_receiver_id), near_radius_km)
+            if geo_index is None:
+                st.info("Locating listings and receivers in the background; try again in a moment.")
+            elif nearby is None:
+                st.warning("This receiver has no city, or its city is not in the gazetteer, so it has no location.")
+            elif not nearby:
+                st.info("No open food listings within this distance.")
+            else:
+                # Only fetch details for the nearest listings; the index already did the filtering
+                nearest = dict(nearby[:100])
+                placeholders = ", ".join(["%s"] * len(nearest))
+
+                def fetch_listings(cursor):
+                    cursor.execute(
+                        f"SELECT Food_ID, Food_Name, Quantity, Expiry_Date, Location FROM food_listings_data WHERE Food_ID IN ({placeholders})",
+                        tuple(nearest)
+                    )
+                    return cursor.fetchall()
+                df17 = pd.DataFrame(read_with_cursor(read_role(), fetch_listings),
+                                    columns=["Food_ID","Food_Name","Quantity","Expiry_Date","Location"])
+                df17["Distance_km"] = df17["Food_ID"].map(nearest).astype(float).round(1)
+                st.caption(f"{len(nearby)} open listings within {near_radius_km} km")
+                if df17["Distance_km"].isna().any():
+                    st.caption("Distance is blank for listings in another city when either city is at a placeholder point.")
+                # Keep the index's order; it still ranks listings whose distance is hidden
+                df17["Rank"] = df17["Food_ID"].map({food_id: rank for rank, food_id in enumerate(nearest)})
+                st.dataframe(df17.sort_values("Rank").drop(columns="Rank"))
     except Exception as e:
             st.error(f"An error occurred: {e}")
-            if conn:
-                conn.close()
+
+    if query:
+        export_widget(query, "query_result", "query_export")
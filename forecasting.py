@@ -0,0 +1,149 @@
+"""Daily food demand forecasts per City x Food_Type x Meal_Type.
+
+Demand is the quantity of the listings claimed each day (claims that were
+not cancelled), read with one GROUP BY over claims_data joined to
+food_listings_data. The series become the rows of one (series x days)
+matrix and every model is fitted to all rows at once with NumPy. The only
+Python loops run over days or over the few smoothing constants, never over
+series:
+
+- seasonal naive: each weekday repeats its value from the last week;
+- exponential smoothing: simple exponential smoothing, with the smoothing
+  constant picked per series from ALPHAS by in-sample one-step error;
+- seasonal exponential smoothing: the same on the series minus its weekday
+  profile, which is added back to the forecast.
+
+Each series uses the model with the lowest mean absolute error on the last
+holdout_days of its history, refitted on the full history. Series without
+demand in the history window are not forecast.
+
+`python forecasting.py [series] [days]` times the models on synthetic
+weekly-seasonal series (default 100,000 series of 120 days).
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+MODELS = ("seasonal naive", "exponential smoothing", "seasonal exponential smoothing")
+ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.8], dtype=np.float32)
+SEASON = 7
+DEMAND_STATUSES = ("Completed", "Pending")
+SERIES_KEYS = ["City", "Food_Type", "Meal_Type"]
+
+
+def load_history(cursor, start, end):
+    """Claimed quantity per (City, Food_Type, Meal_Type, day) for days in [start, end)."""
+    cursor.execute(f"""
+        SELECT COALESCE(f.Location, ''), COALESCE(f.Food_Type, ''), COALESCE(f.Meal_Type, ''),
+               DATE(c.Timestamp), SUM(COALESCE(f.Quantity, 0))
+        FROM claims_data c JOIN food_listings_data f ON c.Food_ID = f.Food_ID
+        WHERE c.Timestamp >= %s AND c.Timestamp < %s
+          AND c.Status IN ({', '.join(['%s'] * len(DEMAND_STATUSES))})
+        GROUP BY 1, 2, 3, 4
+    """, (start, end) + DEMAND_STATUSES)
+    return pd.DataFrame(cursor.fetchall(), columns=SERIES_KEYS + ["Day", "Quantity"])
+
+
+def build_matrix(history, start, days):
+    """(series keys, float32 matrix of shape (series, days)) from load_history() rows."""
+    codes, keys = pd.MultiIndex.from_frame(history[SERIES_KEYS]).factorize()
+    day_index = (pd.to_datetime(history["Day"]) - pd.Timestamp(start)).dt.days.to_numpy()
+    matrix = np.zeros((len(keys), days), dtype=np.float32)
+    np.add.at(matrix, (codes, day_index), history["Quantity"].to_numpy(dtype=np.float32))
+    return pd.DataFrame(list(keys), columns=SERIES_KEYS), matrix
+
+
+def _smooth(series):
+    """Final level of simple exponential smoothing per row, with each row's best constant from ALPHAS."""
+    level = np.broadcast_to(series[:, 0], (len(ALPHAS), len(series))).copy()
+    errors = np.zeros_like(level)
+    for t in range(1, series.shape[1]):
+        error = series[:, t] - level
+        errors += error * error
+        level += ALPHAS[:, None] * error
+    best = errors.argmin(axis=0)
+    return level[best, np.arange(len(series))]
+
+
+def _weekday_profile(series, weekdays):
+    """Mean of each weekday minus the overall mean, per row: shape (series, SEASON)."""
+    profile = np.zeros((len(series), SEASON), dtype=np.float32)
+    for day in range(SEASON):
+        columns = weekdays == day
+        if columns.any():
+            profile[:, day] = series[:, columns].mean(axis=1)
+    return profile - series.mean(axis=1, keepdims=True)
+
+
+def model_forecasts(series, first_weekday, horizon):
+    """Forecasts of every model for every row: shape (len(MODELS), series, horizon)."""
+    days = series.shape[1]
+    weekdays = (first_weekday + np.arange(days)) % SEASON
+    future = (first_weekday + days + np.arange(horizon)) % SEASON
+    forecasts = np.empty((len(MODELS), len(series), horizon), dtype=np.float32)
+    # Day days + h has the weekday of day days - SEASON + h % SEASON
+    forecasts[0] = series[:, days - SEASON + np.arange(horizon) % SEASON]
+    forecasts[1] = _smooth(series)[:, None]
+    profile = _weekday_profile(series, weekdays)
+    forecasts[2] = _smooth(series - profile[:, weekdays])[:, None] + profile[:, future]
+    return np.maximum(forecasts, 0)
+
+
+def forecast(series, first_day, horizon, holdout_days):
+    """Pick a model per row on the holdout, refit on everything; returns (forecast, model index, holdout MAE)."""
+    rows = np.arange(len(series))
+    first_weekday = first_day.weekday()
+    if series.shape[1] >= holdout_days + 2 * SEASON:
+        backtest = model_forecasts(series[:, :-holdout_days], first_weekday, holdout_days)
+        errors = np.abs(backtest - series[None, :, -holdout_days:]).mean(axis=2)
+        choice = errors.argmin(axis=0)
+        error = errors[choice, rows]
+    else:
+        choice = np.full(len(series), len(MODELS) - 1)
+        error = np.full(len(series), np.nan, dtype=np.float32)
+    return model_forecasts(series, first_weekday, horizon)[choice, rows], choice, error
+
+
+def forecast_demand(cursor, today, history_days, horizon_days, holdout_days):
+    """One row per series: keys, chosen model, holdout MAE, total and daily forecast from today on."""
+    start = today - timedelta(days=history_days)
+    keys, series = build_matrix(load_history(cursor, start, today), start, history_days)
+    if series.shape[0] == 0 or history_days < SEASON:
+        return keys.assign(Model=[], Holdout_MAE=[], Forecast_Total=[])
+    predicted, choice, error = forecast(series, start, horizon_days, holdout_days)
+    result = keys.assign(Model=np.array(MODELS)[choice], Holdout_MAE=error.round(2),
+                         Forecast_Total=predicted.sum(axis=1).round(1))
+    daily = pd.DataFrame(predicted.round(1), columns=[str(today + timedelta(days=h)) for h in range(horizon_days)])
+    return pd.concat([result, daily], axis=1).sort_values("Forecast_Total", ascending=False, ignore_index=True)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from datetime import date
+
+    series_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    horizon, holdout = 7, 14
+    rng = np.random.default_rng(0)
+    first_day = date(2026, 1, 5)
+
+    # Weekly pattern, slow drift and Poisson noise; the last `horizon` days are kept back as truth
+    total = days + horizon
+    base = rng.gamma(2.0, 5.0, size=(series_count, 1))
+    weekly = 1 + rng.uniform(0, 0.6, size=(series_count, 1)) * np.sin(2 * np.pi * np.arange(total) / SEASON)
+    drift = 1 + rng.normal(0, 0.002, size=(series_count, 1)) * np.arange(total)
+    demand = rng.poisson(np.maximum(base * weekly * drift, 0)).astype(np.float32)
+    history, truth = demand[:, :days], demand[:, days:]
+
+    start = time.perf_counter()
+    predicted, choice, _ = forecast(history, first_day, horizon, holdout)
+    seconds = time.perf_counter() - start
+    mae = np.abs(predicted - truth).mean()
+    naive_mae = np.abs(model_forecasts(history, first_day.weekday(), horizon)[0] - truth).mean()
+    print(f"{series_count:,} series x {days} days: fitted and forecast in {seconds:.2f}s "
+          f"({series_count / seconds:,.0f} series/s)")
+    print(f"MAE over the next {horizon} days: {mae:.2f} (seasonal naive alone: {naive_mae:.2f})")
+    for index, name in enumerate(MODELS):
+        print(f"  {name:<32} chosen for {np.mean(choice == index):.1%} of series")
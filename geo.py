@@ -0,0 +1,405 @@
+"""Offline geocoding and proximity search for listings and receivers.
+
+Cities are geocoded from a bundled gazetteer CSV (City,Latitude,Longitude,
+and an optional Approximate column); nothing is fetched over the network.
+With geo.approximate_unknown on, a city missing from the gazetteer gets a
+placeholder point derived from a hash of its name, inside the area the
+gazetteer covers. Cities are then kept apart, usually by more than any
+search radius, so "near a receiver" finds the listings in the receiver's own
+city; distances between placeholder cities mean nothing, so proximity
+searches report them as None. `python geo.py gazetteer` appends every city
+of the database that the gazetteer lacks, with its placeholder point and
+Approximate=1, for an admin to correct. Listings and receivers are placed
+in a uniform lat/lon grid so "open listings within X km" only looks at the
+cells overlapping the search circle.
+
+LazyProximityIndex builds the index in a background thread on its first
+read, so no request waits for the geocoding pass; reads get None until it
+is ready. The CRUD helpers keep it current (upsert/remove on each write,
+replayed onto a build that is running). Writes that bypass every Store of
+this process (other Streamlit or API processes, `python deletions.py` /
+`python archive.py` runs, manual SQL) are not seen until the next build:
+with rebuild_seconds an index older than that is rebuilt in the background
+on its next read while the old one keeps being served.
+
+Run `python geo.py` for a benchmark over 1M synthetic listings.
+"""
+import csv
+import logging
+import math
+import threading
+import time
+import zlib
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+# (south, west, north, east) used for placeholder points when the gazetteer is empty
+DEFAULT_AREA = (8.0, 68.0, 32.0, 90.0)
+
+
+def normalize_city(name):
+    return " ".join(str(name or "").split()).casefold()
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Gazetteer:
+    def __init__(self, places=None, approximate_unknown=False, approximate=()):
+        self.places = places or {}
+        self.approximate_unknown = approximate_unknown
+        # Cities whose point is a placeholder, from the file or from placeholder_point()
+        self.approximate = set(approximate)
+        if self.places:
+            lats = [lat for lat, _ in self.places.values()]
+            lons = [lon for _, lon in self.places.values()]
+            self.area = (min(lats), min(lons), max(lats), max(lons))
+        else:
+            self.area = DEFAULT_AREA
+
+    @classmethod
+    def load(cls, path, approximate_unknown=False):
+        places, approximate = {}, set()
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                city = normalize_city(row["City"])
+                places[city] = (float(row["Latitude"]), float(row["Longitude"]))
+                if row.get("Approximate") in ("1", "true"):
+                    approximate.add(city)
+        return cls(places, approximate_unknown, approximate)
+
+    def placeholder_point(self, city):
+        """Stable point for a city name inside the gazetteer's area."""
+        south, west, north, east = self.area
+        digest = zlib.crc32(normalize_city(city).encode("utf-8"))
+        # Two independent fractions from the low and high halves of the hash
+        return (south + (north - south) * (digest & 0xFFFF) / 0xFFFF,
+                west + (east - west) * (digest >> 16) / 0xFFFF)
+
+    def geocode(self, city):
+        """Return (lat, lon) for a city name, or None if it has no location."""
+        point = self.places.get(normalize_city(city))
+        if point is None and self.approximate_unknown and normalize_city(city):
+            return self.placeholder_point(city)
+        return point
+
+    def is_approximate(self, city):
+        key = normalize_city(city)
+        return key in self.approximate or (key not in self.places and self.approximate_unknown)
+
+
+class GridIndex:
+    """Points bucketed into cell_km-sized lat/lon cells."""
+
+    def __init__(self, cell_km=10.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.cells = {}
+        self.points = {}
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg)))
+
+    def insert(self, key, lat, lon, payload=None):
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, {})[key] = (lat, lon, payload)
+        self.points[key] = cell
+
+    def remove(self, key):
+        cell = self.points.pop(key, None)
+        if cell is not None:
+            bucket = self.cells[cell]
+            bucket.pop(key, None)
+            if not bucket:
+                del self.cells[cell]
+
+    def within(self, lat, lon, radius_km):
+        """Yield (key, distance_km, payload) for points within radius_km of (lat, lon)."""
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        row_lo, col_lo = self._cell(lat - lat_span, lon - lon_span)
+        row_hi, col_hi = self._cell(lat + lat_span, lon + lon_span)
+        for row in range(row_lo, row_hi + 1):
+            for col in range(col_lo, col_hi + 1):
+                for key, (p_lat, p_lon, payload) in self.cells.get((row, col), {}).items():
+                    distance = haversine_km(lat, lon, p_lat, p_lon)
+                    if distance <= radius_km:
+                        yield key, distance, payload
+
+    def __len__(self):
+        return len(self.points)
+
+
+class ProximityIndex:
+    """Geocoded listings and receivers with proximity lookup."""
+
+    def __init__(self, gazetteer, cell_km=10.0):
+        self.gazetteer = gazetteer
+        self.listings = GridIndex(cell_km)
+        self.listings_by_provider = {}
+        self.receivers = {}
+        self.lock = threading.Lock()
+        self.build_report = None
+
+    def upsert_listing(self, food_id, location, expiry_date, quantity, provider_id):
+        point = self.gazetteer.geocode(location)
+        if isinstance(expiry_date, str):
+            expiry_date = date.fromisoformat(expiry_date)
+        with self.lock:
+            self._remove_listing(food_id)
+            if point is None:
+                return False
+            self.listings.insert(food_id, point[0], point[1],
+                                 (expiry_date, quantity, provider_id, self.gazetteer.is_approximate(location)))
+            self.listings_by_provider.setdefault(provider_id, set()).add(food_id)
+            return True
+
+    def _remove_listing(self, food_id):
+        cell = self.listings.points.get(food_id)
+        if cell is not None:
+            provider_id = self.listings.cells[cell][food_id][2][2]
+            self.listings_by_provider.get(provider_id, set()).discard(food_id)
+        self.listings.remove(food_id)
+
+    def remove_listing(self, food_id):
+        with self.lock:
+            self._remove_listing(food_id)
+
+    def remove_provider(self, provider_id):
+        with self.lock:
+            for food_id in list(self.listings_by_provider.pop(provider_id, ())):
+                self.listings.remove(food_id)
+
+    def upsert_receiver(self, receiver_id, city):
+        point = self.gazetteer.geocode(city)
+        with self.lock:
+            if point is None:
+                self.receivers.pop(receiver_id, None)
+                return False
+            self.receivers[receiver_id] = (point[0], point[1], self.gazetteer.is_approximate(city))
+            return True
+
+    def remove_receiver(self, receiver_id):
+        with self.lock:
+            self.receivers.pop(receiver_id, None)
+
+    def open_listings_near(self, lat, lon, radius_km, today=None, approximate=False):
+        """Return [(food_id, distance_km)] of unexpired listings with quantity left, nearest first.
+
+        approximate says (lat, lon) is a placeholder point. distance_km is
+        None for a listing in another city when either point is a
+        placeholder; such listings are still ordered by it.
+        """
+        today = today or date.today()
+        with self.lock:
+            matches = [
+                (food_id, distance, approximate or listing_approximate)
+                for food_id, distance, (expiry_date, quantity, _, listing_approximate)
+                in self.listings.within(lat, lon, radius_km)
+                if (expiry_date is None or expiry_date >= today) and (quantity or 0) > 0
+            ]
+        matches.sort(key=lambda m: m[1])
+        # Same-city placeholder points coincide, so a zero distance stays meaningful
+        return [(food_id, None if placeholder and distance > 0 else distance)
+                for food_id, distance, placeholder in matches]
+
+    def open_listings_near_receiver(self, receiver_id, radius_km, today=None):
+        """Like open_listings_near, centred on a receiver; None if the receiver has no location."""
+        point = self.receivers.get(receiver_id)
+        if point is None:
+            return None
+        return self.open_listings_near(point[0], point[1], radius_km, today, approximate=point[2])
+
+    def build(self, conn, chunk_size=10000):
+        """Geocode every listing and receiver in one streaming pass per table.
+
+        Returns and logs the coverage: {"listings"/"receivers": {"rows",
+        "geocoded", "approximate"}}, where approximate counts rows placed at
+        a placeholder point.
+        """
+        report = {}
+        for name, sql, add in (
+            ("listings", "SELECT Food_ID, Location, Expiry_Date, Quantity, Provider_ID FROM food_listings_data",
+             self.upsert_listing),
+            ("receivers", "SELECT Receiver_ID, City FROM receivers_data", self.upsert_receiver),
+        ):
+            counts = report[name] = {"rows": 0, "geocoded": 0, "approximate": 0}
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(sql)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        counts["rows"] += 1
+                        if add(*row):
+                            counts["geocoded"] += 1
+                            counts["approximate"] += self.gazetteer.is_approximate(row[1])
+            finally:
+                cursor.close()
+            logger.info("Geocoded %d of %d %s (%d at placeholder points)",
+                        counts["geocoded"], counts["rows"], name, counts["approximate"])
+        self.build_report = report
+        return report
+
+
+class LazyProximityIndex:
+    """A ProximityIndex built in a background thread on first read and rebuilt every rebuild_seconds.
+
+    It takes the same writes as ProximityIndex, so crud.Store can be given
+    it as its geo index.
+    """
+
+    def __init__(self, gazetteer, connect, cell_km=10.0, rebuild_seconds=None):
+        self.gazetteer = gazetteer
+        self.connect = connect
+        self.cell_km = cell_km
+        self.rebuild_seconds = rebuild_seconds
+        self.index = None
+        self.built_at = None
+        self.building = False
+        # (method, args) of the writes applied while a build runs, replayed onto it before the swap
+        self.changes = None
+        self.lock = threading.Lock()
+
+    def current(self):
+        """The last built ProximityIndex, or None until the first build finishes; starts a build when due."""
+        with self.lock:
+            due = not self.building and (
+                self.index is None
+                or self.rebuild_seconds is not None and time.monotonic() - self.built_at >= self.rebuild_seconds)
+            if due:
+                self.building = True
+                self.changes = []
+            index = self.index
+        if due:
+            threading.Thread(target=self._build, name="geo-index", daemon=True).start()
+        return index
+
+    def _build(self):
+        index = ProximityIndex(self.gazetteer, self.cell_km)
+        try:
+            conn = self.connect()
+            try:
+                index.build(conn)
+            finally:
+                conn.close()
+        except Exception:
+            # The next read tries again
+            logger.exception("Building the proximity index failed")
+            with self.lock:
+                self.building, self.changes = False, None
+            return
+        # One critical section from the end of the recording to the swap, so no write falls between them.
+        # Writes are upserts and removes by key, so replaying one the build already saw is harmless.
+        with self.lock:
+            for method, args in self.changes:
+                getattr(index, method)(*args)
+            self.index, self.built_at = index, time.monotonic()
+            self.building, self.changes = False, None
+
+    def _write(self, method, *args):
+        with self.lock:
+            if self.changes is not None:
+                self.changes.append((method, args))
+            index = self.index
+        if index is not None:
+            getattr(index, method)(*args)
+
+    def upsert_listing(self, food_id, location, expiry_date, quantity, provider_id):
+        self._write("upsert_listing", food_id, location, expiry_date, quantity, provider_id)
+
+    def remove_listing(self, food_id):
+        self._write("remove_listing", food_id)
+
+    def remove_provider(self, provider_id):
+        self._write("remove_provider", provider_id)
+
+    def upsert_receiver(self, receiver_id, city):
+        self._write("upsert_receiver", receiver_id, city)
+
+    def remove_receiver(self, receiver_id):
+        self._write("remove_receiver", receiver_id)
+
+
+def missing_cities(conn, gazetteer):
+    """Distinct provider, receiver and listing cities of the database that the gazetteer lacks."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT City FROM providers_data UNION SELECT City FROM receivers_data
+            UNION SELECT Location FROM food_listings_data
+        """)
+        cities = {" ".join(str(city).split()) for (city,) in cursor.fetchall() if normalize_city(city)}
+    finally:
+        cursor.close()
+    return sorted(city for city in cities if normalize_city(city) not in gazetteer.places)
+
+
+def extend_gazetteer(path, cities, gazetteer):
+    """Append cities to the gazetteer CSV at their placeholder points, marked Approximate=1."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fieldnames = list(reader.fieldnames)
+        rows = list(reader)
+    if "Approximate" not in fieldnames:
+        fieldnames.append("Approximate")
+    for city in cities:
+        lat, lon = gazetteer.placeholder_point(city)
+        rows.append({"City": city, "Latitude": f"{lat:.4f}", "Longitude": f"{lon:.4f}", "Approximate": "1"})
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    if sys.argv[1:] == ["gazetteer"]:
+        import mysql.connector
+
+        from config import load_config
+
+        config = load_config()
+        db = config.database
+        gazetteer = Gazetteer.load(config.geo.gazetteer_path)
+        conn = mysql.connector.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                       database=db.database, connection_timeout=db.connect_timeout)
+        try:
+            cities = missing_cities(conn, gazetteer)
+        finally:
+            conn.close()
+        extend_gazetteer(config.geo.gazetteer_path, cities, gazetteer)
+        print(f"Added {len(cities)} cities to {config.geo.gazetteer_path} at placeholder points (Approximate=1)")
+        sys.exit(0)
+
+    random.seed(0)
+    listing_count = 1_000_000
+    index = ProximityIndex(Gazetteer(), cell_km=10.0)
+    start = time.perf_counter()
+    for food_id in range(listing_count):
+        lat, lon = random.uniform(8.0, 29.0), random.uniform(72.0, 89.0)
+        index.listings.insert(food_id, lat, lon, (None, 1, food_id % 1000, False))
+    print(f"indexed {listing_count:,} listings in {time.perf_counter() - start:.1f}s")
+
+    for radius_km in (5, 25, 50):
+        timings = []
+        for _ in range(100):
+            lat, lon = random.uniform(8.0, 29.0), random.uniform(72.0, 89.0)
+            start = time.perf_counter()
+            found = index.open_listings_near(lat, lon, radius_km)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"radius {radius_km:>3} km: median {timings[50]:.2f} ms, p99 {timings[98]:.2f} ms, "
+              f"last query returned {len(found)} listings")
@@ -0,0 +1,113 @@
+"""Server-side primary key allocation with per-process block reservation.
+
+id_sequences holds the next free ID of each table. A process reserves a
+block of block_size IDs with one atomic UPDATE (LAST_INSERT_ID trick, so no
+SELECT ... FOR UPDATE round trip) and then hands them out locally, so forms
+and imports never type or probe for a free ID. Unused IDs of a block are
+simply skipped; IDs are unique, not gapless.
+
+A table's sequence starts at MAX(primary key) + 1 the first time it is used.
+IDs chosen by the caller instead (e.g. CSV imports that carry their own
+IDs) go through claim(), which moves the sequence past them in the
+inserting transaction. An explicit ID below Next_ID is rejected with
+ExplicitIdError: it may lie in a block another process has reserved and
+will hand out later. Inserts of allocated IDs never touch id_sequences.
+"""
+import threading
+
+PRIMARY_KEYS = {
+    "providers_data": "Provider_ID",
+    "receivers_data": "Receiver_ID",
+    "food_listings_data": "Food_ID",
+    "claims_data": "Claim_ID",
+}
+
+
+def create_sequence_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            Table_Name VARCHAR(64) PRIMARY KEY,
+            Next_ID BIGINT NOT NULL
+        ) ENGINE=InnoDB;
+    """)
+
+
+class ExplicitIdError(ValueError):
+    """An explicitly chosen ID that the sequence may already have handed out."""
+
+
+def _start_sequence(cursor, table):
+    cursor.execute(
+        f"INSERT IGNORE INTO id_sequences (Table_Name, Next_ID) "
+        f"SELECT %s, COALESCE(MAX({PRIMARY_KEYS[table]}), 0) + 1 FROM {table}",
+        (table,)
+    )
+
+
+def reserve_block(conn, table, size):
+    """Atomically claim [first, first + size) from the table's sequence; commits on its own."""
+    cursor = conn.cursor()
+    try:
+        _start_sequence(cursor, table)
+        cursor.execute(
+            "UPDATE id_sequences SET Next_ID = LAST_INSERT_ID(Next_ID + %s) WHERE Table_Name = %s",
+            (size, table)
+        )
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        end = cursor.fetchone()[0]
+        conn.commit()
+        return end - size
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def claim(cursor, table, keys):
+    """Move the sequence past explicitly chosen IDs (runs in the caller's transaction, before the insert).
+
+    The sequence row stays locked until the caller commits, so no block can
+    be reserved over the claimed IDs in the meantime. Raises ExplicitIdError
+    if any ID is below Next_ID.
+    """
+    keys = [int(key) for key in keys]
+    _start_sequence(cursor, table)
+    cursor.execute("SELECT Next_ID FROM id_sequences WHERE Table_Name = %s FOR UPDATE", (table,))
+    next_id = cursor.fetchone()[0]
+    if min(keys) < next_id:
+        raise ExplicitIdError(f"{PRIMARY_KEYS[table]} {min(keys)} is below {next_id}, the next ID of {table}'s "
+                              f"sequence; leave the ID out to have one assigned, or use IDs from {next_id} on")
+    cursor.execute("UPDATE id_sequences SET Next_ID = %s WHERE Table_Name = %s", (max(keys) + 1, table))
+
+
+class IdAllocator:
+    def __init__(self, connect, block_size=100):
+        self.connect = connect
+        self.block_size = block_size
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+    def _reserve(self, table, size):
+        conn = self.connect()
+        try:
+            return reserve_block(conn, table, size)
+        finally:
+            conn.close()
+
+    def next_id(self, table):
+        with self.lock:
+            next_id, end = self.blocks.get(table, (0, 0))
+            if next_id >= end:
+                next_id = self._reserve(table, self.block_size)
+                end = next_id + self.block_size
+            self.blocks[table] = (next_id + 1, end)
+            return next_id
+
+    def allocate(self, table, count):
+        """Return count fresh IDs; large requests (imports) get one dedicated block."""
+        if count <= self.block_size:
+            return [self.next_id(table) for _ in range(count)]
+        first = self._reserve(table, count)
+        return list(range(first, first + count))
+
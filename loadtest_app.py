@@ -0,0 +1,231 @@
+"""Load harness for the Streamlit app: N concurrent headless sessions of food_app.py.
+
+Each simulated session is a streamlit.testing AppTest instance running the
+real script against the configured (local) database, in its own thread.
+All sessions share one process, like the sessions of one server, so
+st.cache_resource objects (router, pools, registries) are shared the way they
+would be in production. Sessions loop through weighted user flows:
+
+- View Tables: pick a table, type a filter, submit it;
+- SQL Queries: pick a canned query;
+- CRUD add: add a provider named "loadtest-...";
+- CRUD update: change the contact of a loadtest provider.
+
+For each concurrency level it reports rerun latency percentiles, reruns per
+second, MySQL connections opened (Connections status counter) and peak
+Threads_connected, CPU used by the process (in cores) and peak RSS:
+
+    python loadtest_app.py --sessions 1,2,4,8,16 --iterations 20
+    python loadtest_app.py --cleanup        # delete the loadtest-* providers
+"""
+import argparse
+import os
+import random
+import resource
+import threading
+import time
+import uuid
+
+import mysql.connector
+from streamlit.testing.v1 import AppTest
+
+import queries
+from config import load_config
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "food_app.py")
+NAME_PREFIX = "loadtest-"
+TABLE_NAMES = ["Providers Data", "Receivers Data", "Food Listings Data", "Claims Data"]
+FILTER_TERMS = ["a", "Rice", "Completed", "Lake", "Restaurant", "zzz"]
+CITIES = ["New Jessica", "East Sheena", "Lake Jesusview", "Mumbai", "Pune"]
+
+
+def find(elements, label=None, key=None):
+    for element in elements:
+        if (key is not None and element.key == key) or (label is not None and element.label == label):
+            return element
+    raise LookupError(f"No widget with label={label!r} key={key!r} on this page")
+
+
+class Session:
+    """One simulated user; every widget interaction is one timed rerun."""
+
+    def __init__(self, rng, timeout):
+        self.rng = rng
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.latencies = []
+        self.errors = 0
+        self.rerun(self.app.run)
+
+    def rerun(self, action):
+        start = time.perf_counter()
+        try:
+            action()
+            if self.app.exception:
+                self.errors += 1
+        except Exception:
+            self.errors += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    def goto(self, page):
+        selector = find(self.app.sidebar.selectbox, label="Choose a page:")
+        if selector.value != page:
+            self.rerun(selector.select(page).run)
+
+    def view_tables(self):
+        self.goto("View Tables")
+        self.rerun(find(self.app.selectbox, label="Select Table to View").select(self.rng.choice(TABLE_NAMES)).run)
+        find(self.app.text_input, label="Type the filter text:").input(self.rng.choice(FILTER_TERMS))
+        self.rerun(find(self.app.button, label="Filter").click().run)
+
+    def sql_queries(self):
+        self.goto("SQL Queries")
+        self.rerun(find(self.app.selectbox, label="Select the Query").select(self.rng.choice(list(queries.QUESTIONS))).run)
+
+    def crud_add(self):
+        self.goto("CRUD Operations")
+        suffix = uuid.uuid4().hex[:8]
+        find(self.app.text_input, key="add_provider_name").input(f"{NAME_PREFIX}{suffix}")
+        find(self.app.text_input, key="add_provider_type").input("Restaurant")
+        find(self.app.text_input, key="add_provider_address").input(f"{suffix} Test Street")
+        find(self.app.text_input, key="add_provider_city").input(self.rng.choice(CITIES))
+        find(self.app.text_input, key="add_provider_contact").input(f"+1-555-{self.rng.randrange(10**7):07d}")
+        self.rerun(find(self.app.button, label="Add Provider").click().run)
+
+    def crud_update(self):
+        self.goto("CRUD Operations")
+        try:
+            selector = find(self.app.selectbox, key="select_provider")
+        except LookupError:
+            return
+        # Only touch rows the harness created
+        own = [option for option in selector.options if NAME_PREFIX in option]
+        if not own:
+            return
+        self.rerun(selector.select(self.rng.choice(own)).run)
+        find(self.app.text_input, key="update_provider_contact").input(f"+1-555-{self.rng.randrange(10**7):07d}")
+        self.rerun(find(self.app.button, label="Update Provider").click().run)
+
+    FLOWS = (("view_tables", 5), ("sql_queries", 3), ("crud_add", 1), ("crud_update", 1))
+
+    def run_flows(self, iterations):
+        names, weights = zip(*self.FLOWS)
+        for _ in range(iterations):
+            flow = getattr(self, self.rng.choices(names, weights)[0])
+            try:
+                flow()
+            except LookupError:
+                # The page did not render the widget (e.g. an error stopped the script)
+                self.errors += 1
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def mysql_status(cursor, name):
+    cursor.execute("SHOW GLOBAL STATUS LIKE %s", (name,))
+    return int(cursor.fetchone()[1])
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return float("nan")
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run_level(sessions, iterations, seed, timeout, monitor):
+    """Run `sessions` concurrent sessions for `iterations` flows each; return one report row."""
+    cursor = monitor.cursor()
+    connections_before = mysql_status(cursor, "Connections")
+    peak = {"threads_connected": 0, "rss": rss_bytes()}
+    done = threading.Event()
+
+    # The monitor connection is only used by the sampler while the sessions run
+    sampler_cursor = monitor.cursor()
+
+    def sample():
+        while not done.wait(0.25):
+            peak["rss"] = max(peak["rss"], rss_bytes())
+            try:
+                peak["threads_connected"] = max(peak["threads_connected"], mysql_status(sampler_cursor, "Threads_connected"))
+            except mysql.connector.Error:
+                pass
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    users = []
+    lock = threading.Lock()
+
+    def user(n):
+        session = Session(random.Random(seed * 1000 + n), timeout)
+        session.run_flows(iterations)
+        with lock:
+            users.append(session)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    sampler.start()
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    sampler.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    latencies = sorted(l for session in users for l in session.latencies)
+    report = {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "errors": sum(session.errors for session in users),
+        "reruns_per_s": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "db_connections_opened": mysql_status(cursor, "Connections") - connections_before,
+        "db_threads_peak": peak["threads_connected"],
+        "cpu_cores": round(cpu / wall, 2),
+        "rss_peak_mb": round(peak["rss"] / 2**20, 1),
+    }
+    sampler_cursor.close()
+    cursor.close()
+    return report
+
+
+def cleanup(monitor):
+    cursor = monitor.cursor()
+    cursor.execute("DELETE FROM providers_data WHERE Name LIKE %s", (f"{NAME_PREFIX}%",))
+    monitor.commit()
+    print(f"Deleted {cursor.rowcount} {NAME_PREFIX}* providers")
+    cursor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent headless sessions against food_app.py")
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=20, help="flows per session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per rerun")
+    parser.add_argument("--cleanup", action="store_true", help="only delete providers created by earlier runs")
+    args = parser.parse_args()
+
+    db = load_config().database
+    monitor = mysql.connector.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                      database=db.database, autocommit=True)
+    try:
+        if args.cleanup:
+            cleanup(monitor)
+        else:
+            columns = None
+            for level in (int(n) for n in args.sessions.split(",")):
+                report = run_level(level, args.iterations, args.seed, args.timeout, monitor)
+                if columns is None:
+                    columns = list(report)
+                    print("  ".join(f"{c:>{max(len(c), 8)}}" for c in columns))
+                print("  ".join(f"{report[c]!s:>{max(len(c), 8)}}" for c in columns))
+    finally:
+        monitor.close()
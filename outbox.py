@@ -0,0 +1,260 @@
+"""Transactional outbox and append-only change log.
+
+crud.Store writes one row per changed record into change_outbox inside the
+same transaction as the change itself, so an event exists if and only if
+the change committed. Deletes also emit events for the child rows that
+ON DELETE CASCADE removes, flagged with "cascade": true.
+
+A Relay moves committed events, oldest first, into an append-only JSON-lines
+log (<log_dir>/changes.jsonl) and deletes them from the outbox. Event_IDs
+already present in the log are skipped, so a relay that crashes between
+appending and deleting does not duplicate events. Event_IDs come from
+AUTO_INCREMENT, so an event can commit after one with a higher ID; the relay
+deletes exactly the events it read, and the late one goes out with the next
+batch (the log is in commit order, not strictly in ID order). Several relays
+may run at once: they serialize on the outbox row locks and a lock of the log.
+
+Consumers read the log from their own offset (a byte position stored under
+<log_dir>/offsets/) and commit it after handling a batch, so every consumer
+sees each event at least once and can restart where it stopped:
+
+    consumer = Consumer(log_dir, "notifications")
+    for event in consumer.poll():
+        ...
+    consumer.commit()
+
+`python outbox.py relay` runs a relay loop; `python outbox.py tail <name>`
+prints events as a named consumer.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+from validation import CASCADE_FILTERS, SCHEMA
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "changes.jsonl"
+
+
+def create_outbox_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_outbox (
+            Event_ID BIGINT AUTO_INCREMENT PRIMARY KEY,
+            Table_Name VARCHAR(64) NOT NULL,
+            Operation VARCHAR(16) NOT NULL,
+            Row_Key BIGINT NOT NULL,
+            Payload JSON,
+            Created_At DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        ) ENGINE=InnoDB;
+    """)
+
+
+def _json_default(value):
+    # numpy scalars (bulk imports) have item(); dates, datetimes and Decimals become strings
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def record(cursor, events):
+    """Add (table, operation, key, payload) events to the outbox in the caller's transaction."""
+    if not events:
+        return
+    cursor.executemany(
+        "INSERT INTO change_outbox (Table_Name, Operation, Row_Key, Payload) VALUES (%s, %s, %s, %s)",
+        [(table, operation, int(key), json.dumps(payload, default=_json_default))
+         for table, operation, key, payload in events]
+    )
+
+
+def delete_events(cursor, table, primary_key, keys, operation="delete"):
+    """Events for deleting keys from table, read before the DELETE so cascaded children are included."""
+    placeholders = ", ".join(["%s"] * len(keys))
+    cursor.execute(f"SELECT {primary_key} FROM {table} WHERE {primary_key} IN ({placeholders})", tuple(keys))
+    events = [(table, operation, row[0], {primary_key: row[0]}) for row in cursor.fetchall()]
+    for child, where in CASCADE_FILTERS[table]:
+        cursor.execute(f"SELECT {SCHEMA[child][0]} FROM {child} WHERE {where.format(keys=placeholders)}", tuple(keys))
+        events += [(child, operation, row[0], {"cascade": True}) for row in cursor.fetchall()]
+    return events
+
+
+class Relay:
+    def __init__(self, connect, log_dir, batch_size=1000):
+        self.connect = connect
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_path = os.path.join(log_dir, LOG_FILE)
+
+    @staticmethod
+    def _truncate_partial_line(log):
+        """Drop a line left half-written by a crashed relay, so the next append starts clean."""
+        size = log.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        log.seek(max(size - 65536, 0))
+        tail = log.read()
+        if not tail.endswith(b"\n"):
+            log.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+
+    def _recent_ids(self, log):
+        """Event_IDs in the tail of the log, enough to cover the last batches appended."""
+        log.seek(0, os.SEEK_END)
+        position = max(log.tell() - self.batch_size * 2048, 0)
+        log.seek(position)
+        lines = log.read().splitlines()
+        recent = set()
+        for line in lines if position == 0 else lines[1:]:
+            try:
+                recent.add(json.loads(line)["event_id"])
+            except ValueError:
+                continue
+        return recent
+
+    def relay_once(self):
+        """Move one batch from the outbox to the log; returns the number of events appended."""
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT Event_ID, Table_Name, Operation, Row_Key, Payload, Created_At FROM change_outbox "
+                "ORDER BY Event_ID LIMIT %s FOR UPDATE", (self.batch_size,)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                conn.rollback()
+                return 0
+            with open(self.log_path, "a+b") as log:
+                fcntl.flock(log, fcntl.LOCK_EX)
+                self._truncate_partial_line(log)
+                recent = self._recent_ids(log)
+                lines = [
+                    json.dumps({"event_id": event_id, "table": table, "op": operation, "key": key,
+                                "row": json.loads(payload) if payload else None, "at": str(created_at)}).encode() + b"\n"
+                    for event_id, table, operation, key, payload, created_at in rows
+                    if event_id not in recent
+                ]
+                log.seek(0, os.SEEK_END)
+                log.write(b"".join(lines))
+                log.flush()
+                os.fsync(log.fileno())
+            cursor.execute(f"DELETE FROM change_outbox WHERE Event_ID IN ({', '.join(['%s'] * len(rows))})",
+                           tuple(row[0] for row in rows))
+            conn.commit()
+            return len(lines)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def drain(self):
+        total = 0
+        while True:
+            moved = self.relay_once()
+            total += moved
+            if moved < self.batch_size:
+                return total
+
+
+class RelayThread(threading.Thread):
+    """Daemon thread that drains the outbox every interval_seconds."""
+
+    def __init__(self, relay, interval_seconds):
+        super().__init__(name="outbox-relay", daemon=True)
+        self.relay = relay
+        self.interval_seconds = interval_seconds
+        self.relayed = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.relayed += self.relay.drain()
+            except Exception:
+                logger.exception("Outbox relay failed")
+            self.stop_event.wait(self.interval_seconds)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class Consumer:
+    def __init__(self, log_dir, name):
+        self.log_path = os.path.join(log_dir, LOG_FILE)
+        self.offset_path = os.path.join(log_dir, "offsets", name)
+        os.makedirs(os.path.dirname(self.offset_path), exist_ok=True)
+        self.committed = self._read_offset()
+        self.position = self.committed
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def poll(self, max_events=1000):
+        """Return up to max_events events after the current position (complete lines only)."""
+        if not os.path.exists(self.log_path):
+            return []
+        events = []
+        with open(self.log_path, "rb") as log:
+            log.seek(self.position)
+            while len(events) < max_events:
+                line = log.readline()
+                if not line.endswith(b"\n"):
+                    break
+                self.position += len(line)
+                events.append(json.loads(line))
+        return events
+
+    def commit(self):
+        """Persist the position reached by poll(); a restart resumes from here."""
+        tmp_path = f"{self.offset_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(self.position))
+        os.replace(tmp_path, self.offset_path)
+        self.committed = self.position
+
+    def follow(self, handle, poll_interval=0.5):
+        """Call handle(event) for every event, forever, committing after each batch."""
+        while True:
+            events = self.poll()
+            for event in events:
+                handle(event)
+            if events:
+                self.commit()
+            else:
+                time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    import sys
+
+    import mysql.connector
+
+    from config import load_config
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    config = load_config()
+    command = sys.argv[1] if len(sys.argv) > 1 else "relay"
+    if command == "tail":
+        Consumer(config.outbox.log_dir, sys.argv[2] if len(sys.argv) > 2 else "tail").follow(
+            lambda event: print(json.dumps(event)))
+    else:
+        db = config.database
+
+        def connect():
+            return mysql.connector.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                           database=db.database, connection_timeout=db.connect_timeout)
+
+        relay = Relay(connect, config.outbox.log_dir, config.outbox.batch_size)
+        while True:
+            moved = relay.drain()
+            if moved:
+                logger.info("Relayed %s events", moved)
+            time.sleep(config.outbox.relay_interval_seconds)
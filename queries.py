@@ -0,0 +1,195 @@
+"""Canned analytics queries, shared by the SQL Queries page and the HTTP API.
+
+CANNED_QUERIES maps a URL-safe name to the question shown in the app, the
+SQL that answers it and the column names of its result. Every table in the
+SQL is read through deletions.live_query(), so soft-deleted providers and
+receivers, and the listings and claims below them, are left out while their
+background delete is still running.
+"""
+from deletions import LIVE_FILTERS, live_query
+
+# {table} in the SQL below stands for the live rows of that table
+LIVE_TABLES = {table: f"({live_query(table)})" for table in LIVE_FILTERS}
+
+_CANNED_QUERIES = {
+    "providers_receivers_per_city": (
+        "How many food providers and receivers are there in each city",
+        """
+            WITH base AS (
+                SELECT
+                    COALESCE(p.city, r.city) AS city,
+                    IFNULL(p.Providers_count, 0) AS Providers_count,
+                    IFNULL(r.receivers_count, 0) AS receivers_count
+                FROM
+                    (SELECT p.City AS city, COUNT(DISTINCT p.Provider_ID) AS Providers_count FROM {providers_data} AS p GROUP BY 1) AS p
+                LEFT JOIN
+                    (SELECT r.City AS city, COUNT(DISTINCT r.Receiver_ID) AS receivers_count FROM {receivers_data} AS r GROUP BY 1) AS r
+                ON p.City = r.City
+
+                UNION
+
+                SELECT
+                    COALESCE(p.city, r.city) AS city,
+                    IFNULL(p.Providers_count, 0) AS Providers_count,
+                    IFNULL(r.receivers_count, 0) AS receivers_count
+                FROM
+                    (SELECT p.City AS city, COUNT(DISTINCT p.Provider_ID) AS Providers_count FROM {providers_data} AS p GROUP BY 1) AS p
+                RIGHT JOIN
+                    (SELECT r.City AS city, COUNT(DISTINCT r.Receiver_ID) AS receivers_count FROM {receivers_data} AS r GROUP BY 1) AS r
+                ON p.City = r.City
+            )
+            SELECT DISTINCT *
+            FROM base
+            ORDER BY Providers_Count DESC
+        """,
+        ["city", "Providers_Count", "Receivers_count"],
+    ),
+    "top_provider_type_by_quantity": (
+        "Which type of food provider (restaurant, grocery store, etc.) contributes the most food",
+        """
+            SELECT provider_Type,sum(Quantity) as provided_quantity from {food_listings_data} AS f
+            group by provider_Type
+            order by provided_quantity desc
+            limit 1;
+        """,
+        ["provider_Type", "provided_quantity"],
+    ),
+    "provider_contacts_in_city": (
+        "What is the contact information of food providers in a specific city",
+        """
+            SELECT Provider_ID, Name, Type, Address, City, Contact from {providers_data} AS p
+            where City="Lake Jesusview";
+        """,
+        ["provider_id", "Name", "Type", "Address", "City", "Contact"],
+    ),
+    "top_receiver_by_claimed_quantity": (
+        "Which receivers have claimed the most food",
+        """
+            select r.Name as receiver_name,sum(Quantity)as Food_quantity_claimed,count(c.Claim_ID)as Claim_count
+            from {claims_data} AS c
+            left join {receivers_data} AS r on c.receiver_ID=r.receiver_ID
+            left join {food_listings_data} AS f on c.food_ID=f.food_ID
+            where c.Status="Completed"
+            group by r.Name
+            order by Food_quantity_claimed desc
+            limit 1;
+        """,
+        ["receiver_name", "Food_quantity", "claim_count"],
+    ),
+    "total_available_quantity": (
+        "What is the total quantity of food available from all providers",
+        """
+            with base as (select distinct * from {food_listings_data} AS f)
+            select sum(Quantity) as Total_Quantity from base
+        """,
+        ["Total_Quantity"],
+    ),
+    "top_city_by_listings": (
+        "Which city has the highest number of food listings",
+        """
+            SELECT Location, COUNT(distinct food_ID) as count_listing
+            FROM {food_listings_data} AS f
+            GROUP BY Location
+            ORDER BY count_listing DESC
+            LIMIT 1;
+        """,
+        ["city", "count_listing"],
+    ),
+    "top_food_type": (
+        "What are the most commonly available food types",
+        """
+            SELECT Food_Type,count(distinct Food_ID)as count_food from {food_listings_data} AS f
+            group by Food_Type
+            order by count_food desc
+            limit 1;
+        """,
+        ["city", "count"],
+    ),
+    "listings_per_food_name": (
+        "How many food claims have been made for each food item",
+        """
+            SELECT Food_Name,count(distinct food_id) as Food_count from {food_listings_data} AS f
+            group by Food_Name
+            order by Food_count;
+        """,
+        ["Food_Name", "Food_claim_count"],
+    ),
+    "top_provider_type_by_completed_claims": (
+        "Which provider has had the highest number of successful food claims",
+        """
+            SELECT Provider_Type,count(distinct claim_id) as successful_claims
+            from {food_listings_data} AS f join {claims_data} AS c on f.food_ID=c.food_ID
+            where c.Status="Completed"
+            group by Provider_Type
+            order by successful_claims desc
+            limit 1 ;
+        """,
+        ["Provider_Type", "successful_claims"],
+    ),
+    "claim_status_percentages": (
+        "What percentage of food claims are completed vs. pending vs. canceled",
+        """
+            SELECT Status,
+                (COUNT(distinct claim_id) * 100.0 / (SELECT COUNT(distinct claim_id) FROM {claims_data} AS c)) AS percentage
+            FROM {claims_data} AS c
+            GROUP BY Status;
+        """,
+        ["Status", "percentage"],
+    ),
+    "average_quantity_per_receiver": (
+        "What is the average quantity of food claimed per receiver",
+        """
+            select sum(Quantity) / count(distinct receiver_id) as average_quantity_per_receiver
+            from {food_listings_data} AS f join {claims_data} AS c on f.food_id = c.food_id  ;
+        """,
+        ["average_quantity_per_receiver"],
+    ),
+    "top_meal_type_by_completed_claims": (
+        "Which meal type (breakfast, lunch, dinner, snacks) is claimed the most",
+        """
+            select Meal_Type, count(distinct claim_id) as count_claims
+            from {food_listings_data} AS f
+            join {claims_data} AS c on f.food_id = c.food_id
+            where c.Status = 'Completed'
+            group by Meal_Type
+            order by count_claims desc
+            limit 1;
+        """,
+        ["Meal_Type", "count_meal_type"],
+    ),
+    "quantity_per_provider": (
+        "What is the total quantity of food donated by each provider",
+        """
+            select  p.Provider_ID, p.name as provider_name, sum(Quantity) as total_quantity
+            from {food_listings_data} AS f join {providers_data} AS p on f.Provider_ID = p.Provider_ID
+            group by p.Provider_ID, p.name;
+        """,
+        ["provider_id", "provider_name", "total_quantity"],
+    ),
+    "top_food_name_and_type": (
+        "Which food name and food type are most provided",
+        """
+            select Food_Name,sum(Quantity) as total_quantity,Food_Type from {food_listings_data} AS f
+            group by Food_Name,Food_Type
+            order by total_quantity desc
+            limit 1;
+        """,
+        ["Food_Name", "total_quantity", "Food_Type"],
+    ),
+    "top_claim_status": (
+        "Which status has the highest number of claims",
+        """
+            select Status,count(distinct claim_id)as count from {claims_data} AS c
+            group by Status
+            order by count desc
+            limit 1;
+        """,
+        ["Status", "count"],
+    ),
+}
+
+CANNED_QUERIES = {
+    name: (question, sql.format(**LIVE_TABLES), columns) for name, (question, sql, columns) in _CANNED_QUERIES.items()
+}
+
+QUESTIONS = {question: name for name, (question, _, _) in CANNED_QUERIES.items()}
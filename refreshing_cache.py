@@ -0,0 +1,103 @@
+"""In-process cache that serves expired values while they reload in the background.
+
+RefreshingCache replaces a plain TTL cache for the table loads and canned
+queries:
+
+- a fresh value (younger than ttl) is returned as is;
+- an expired value is still returned immediately, and one background
+  thread reloads it (stale-while-revalidate), so a TTL expiry never blocks
+  a page;
+- a missing value is loaded in the caller's request, but concurrent callers
+  for the same key wait on the same load (single-flight) instead of running
+  it again; background refreshes are single-flight the same way;
+- invalidate(), called after this app's writes, drops every value, so the
+  next read waits for a load that starts after the write instead of seeing
+  stale data. Loads started before an invalidate() are not stored.
+
+warm() starts loads without waiting for them; the app calls it once per
+server process so the first sessions find the tables and canned queries
+loaded, or join loads already in flight.
+
+Loaders run in worker threads, so they must not use Streamlit elements.
+Values are shared by every session of the process: callers must not modify
+them in place.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshingCache:
+    def __init__(self, ttl, max_entries=100, workers=4):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cache-refresh")
+        self.stats = {"fresh": 0, "stale": 0, "loads": 0, "joined": 0}
+
+    def _load(self, key, loader, generation):
+        try:
+            value = loader()
+            with self.lock:
+                self.stats["loads"] += 1
+                if generation == self.generation:
+                    self.entries[key] = (value, time.monotonic())
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            return value
+        finally:
+            with self.lock:
+                self.inflight.pop((key, generation), None)
+
+    def _start(self, key, loader):
+        """Future of the load of key in the current generation, starting it unless one is in flight."""
+        flight = (key, self.generation)
+        future = self.inflight.get(flight)
+        if future is None:
+            future = self.executor.submit(self._load, key, loader, self.generation)
+            self.inflight[flight] = future
+        else:
+            self.stats["joined"] += 1
+        return future
+
+    def get(self, key, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                self.entries.move_to_end(key)
+                if time.monotonic() - loaded_at < self.ttl:
+                    self.stats["fresh"] += 1
+                else:
+                    self.stats["stale"] += 1
+                    future = self._start(key, loader)
+                    future.add_done_callback(self._log_failure)
+                return value
+            future = self._start(key, loader)
+        return future.result()
+
+    @staticmethod
+    def _log_failure(future):
+        if future.exception() is not None:
+            logger.warning("Background cache refresh failed: %s", future.exception())
+
+    def warm(self, loads):
+        """Start loading {key: loader} in the background; returns the futures."""
+        with self.lock:
+            futures = [self._start(key, loader) for key, loader in loads.items() if key not in self.entries]
+        for future in futures:
+            future.add_done_callback(self._log_failure)
+        return futures
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
@@ -0,0 +1,206 @@
+"""Pre-aggregated claim rollups by time bucket, Status, City and Provider_Type.
+
+claims_rollup holds one row per (Grain, Bucket_Start, Status, City, Provider_Type)
+with the number of claims and the claimed quantity. Every grain ('hour', 'day',
+'week') is kept, so a trend over any range is read from a few hundred rows at
+the finest grain that fits it, instead of re-scanning claims_data.
+
+The CRUD helpers keep the table current by calling apply_claim_delta() in the
+same transaction as their write: -1 for the affected claims before the change
+and +1 after it. Deletes that cascade from listings, providers or receivers
+must subtract the affected claims before the parent row is removed, because
+MySQL does not fire anything on cascaded deletes.
+
+listings_rollup does the same for food_listings_data per (Expiry_Date, City),
+so the dashboard KPIs never scan the listings table.
+"""
+from datetime import datetime, timedelta
+
+GRAINS = {
+    "hour": "DATE_ADD(CAST(DATE(c.Timestamp) AS DATETIME), INTERVAL HOUR(c.Timestamp) HOUR)",
+    "day": "CAST(DATE(c.Timestamp) AS DATETIME)",
+    "week": "CAST(DATE_SUB(DATE(c.Timestamp), INTERVAL WEEKDAY(c.Timestamp) DAY) AS DATETIME)",
+}
+
+# Bucket widths used to pick the grain for a date range
+GRAIN_SECONDS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+MAX_TREND_BUCKETS = 300
+
+
+def create_rollup_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS claims_rollup (
+            Grain VARCHAR(4) NOT NULL,
+            Bucket_Start DATETIME NOT NULL,
+            Status VARCHAR(100) NOT NULL,
+            City VARCHAR(255) NOT NULL,
+            Provider_Type VARCHAR(100) NOT NULL,
+            Claim_Count INT NOT NULL DEFAULT 0,
+            Claimed_Quantity BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (Grain, Bucket_Start, Status, City, Provider_Type)
+        ) ENGINE=InnoDB;
+    """)
+
+
+def apply_claim_delta(cursor, where_sql, params, sign):
+    """Add (sign=1) or subtract (sign=-1) the claims matching where_sql from the rollups.
+
+    where_sql filters claims_data c joined to food_listings_data f,
+    e.g. "c.Claim_ID = %s" or "f.Provider_ID = %s".
+    """
+    buckets = " UNION ALL ".join(
+        f"""SELECT '{grain}' AS Grain, {expr} AS Bucket_Start,
+                   COALESCE(c.Status, '') AS Status, COALESCE(f.Location, '') AS City,
+                   COALESCE(f.Provider_Type, '') AS Provider_Type, COALESCE(f.Quantity, 0) AS Quantity
+            FROM claims_data c JOIN food_listings_data f ON c.Food_ID = f.Food_ID
+            WHERE c.Timestamp IS NOT NULL AND ({where_sql})"""
+        for grain, expr in GRAINS.items()
+    )
+    cursor.execute(f"""
+        INSERT INTO claims_rollup (Grain, Bucket_Start, Status, City, Provider_Type, Claim_Count, Claimed_Quantity)
+        SELECT Grain, Bucket_Start, Status, City, Provider_Type, %s * COUNT(*), %s * SUM(Quantity)
+        FROM ({buckets}) AS b
+        GROUP BY Grain, Bucket_Start, Status, City, Provider_Type
+        ON DUPLICATE KEY UPDATE
+            Claim_Count = Claim_Count + VALUES(Claim_Count),
+            Claimed_Quantity = Claimed_Quantity + VALUES(Claimed_Quantity)
+    """, (sign, sign) + tuple(params) * len(GRAINS))
+    if sign < 0:
+        # Only the buckets this delta touched can have dropped to zero; the join keeps it to their primary keys
+        cursor.execute(f"""
+            DELETE r FROM claims_rollup r
+            JOIN (SELECT DISTINCT Grain, Bucket_Start, Status, City, Provider_Type FROM ({buckets}) AS b) AS k
+              ON r.Grain = k.Grain AND r.Bucket_Start = k.Bucket_Start AND r.Status = k.Status
+             AND r.City = k.City AND r.Provider_Type = k.Provider_Type
+            WHERE r.Claim_Count <= 0
+        """, tuple(params) * len(GRAINS))
+
+
+def rebuild_rollups(cursor):
+    """Recompute the rollups from scratch, e.g. after a bulk load outside the app."""
+    cursor.execute("DELETE FROM claims_rollup")
+    apply_claim_delta(cursor, "1 = 1", (), 1)
+
+
+def rollups_empty(cursor):
+    cursor.execute("SELECT 1 FROM claims_rollup LIMIT 1")
+    return cursor.fetchone() is None
+
+
+def pick_grain(start, end):
+    """Finest grain that covers [start, end] in at most MAX_TREND_BUCKETS buckets."""
+    span = (end - start).total_seconds()
+    for grain in ("hour", "day"):
+        if span / GRAIN_SECONDS[grain] <= MAX_TREND_BUCKETS:
+            return grain
+    return "week"
+
+
+def claim_trend(cursor, start, end, grain=None, status=None, city=None, provider_type=None):
+    """Return (grain, rows) of (Bucket_Start, Status, Claim_Count, Claimed_Quantity) for a range."""
+    grain = grain or pick_grain(start, end)
+    filters = ["Grain = %s", "Bucket_Start >= %s", "Bucket_Start <= %s"]
+    params = [grain, start, end]
+    for column, value in (("Status", status), ("City", city), ("Provider_Type", provider_type)):
+        if value:
+            filters.append(f"{column} = %s")
+            params.append(value)
+    cursor.execute(f"""
+        SELECT Bucket_Start, Status, SUM(Claim_Count) AS Claim_Count, SUM(Claimed_Quantity) AS Claimed_Quantity
+        FROM claims_rollup
+        WHERE {' AND '.join(filters)}
+        GROUP BY Bucket_Start, Status
+        ORDER BY Bucket_Start
+    """, params)
+    return grain, cursor.fetchall()
+
+
+def status_totals(cursor):
+    """Claim count per Status, read from the week grain."""
+    cursor.execute("""
+        SELECT Status, SUM(Claim_Count) AS Claim_Count
+        FROM claims_rollup
+        WHERE Grain = 'week'
+        GROUP BY Status
+    """)
+    return cursor.fetchall()
+
+
+# -------------------------
+# Listing rollups for the live dashboard
+# -------------------------
+def create_listing_rollup_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS listings_rollup (
+            Expiry_Date DATE NOT NULL,
+            City VARCHAR(255) NOT NULL,
+            Listing_Count INT NOT NULL DEFAULT 0,
+            Open_Count INT NOT NULL DEFAULT 0,
+            Quantity BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (Expiry_Date, City)
+        ) ENGINE=InnoDB;
+    """)
+
+
+def apply_listing_delta(cursor, where_sql, params, sign):
+    """Add or subtract the listings matching where_sql (on food_listings_data f) from listings_rollup."""
+    cursor.execute(f"""
+        INSERT INTO listings_rollup (Expiry_Date, City, Listing_Count, Open_Count, Quantity)
+        SELECT f.Expiry_Date, COALESCE(f.Location, ''), %s * COUNT(*),
+               %s * SUM(COALESCE(f.Quantity, 0) > 0), %s * SUM(COALESCE(f.Quantity, 0))
+        FROM food_listings_data f
+        WHERE f.Expiry_Date IS NOT NULL AND ({where_sql})
+        GROUP BY f.Expiry_Date, COALESCE(f.Location, '')
+        ON DUPLICATE KEY UPDATE
+            Listing_Count = Listing_Count + VALUES(Listing_Count),
+            Open_Count = Open_Count + VALUES(Open_Count),
+            Quantity = Quantity + VALUES(Quantity)
+    """, (sign, sign, sign) + tuple(params))
+    if sign < 0:
+        cursor.execute(f"""
+            DELETE r FROM listings_rollup r
+            JOIN (SELECT DISTINCT f.Expiry_Date, COALESCE(f.Location, '') AS City
+                  FROM food_listings_data f
+                  WHERE f.Expiry_Date IS NOT NULL AND ({where_sql})) AS k
+              ON r.Expiry_Date = k.Expiry_Date AND r.City = k.City
+            WHERE r.Listing_Count <= 0
+        """, tuple(params))
+
+
+def rebuild_listing_rollups(cursor):
+    cursor.execute("DELETE FROM listings_rollup")
+    apply_listing_delta(cursor, "1 = 1", (), 1)
+
+
+def listing_rollups_empty(cursor):
+    cursor.execute("SELECT 1 FROM listings_rollup LIMIT 1")
+    return cursor.fetchone() is None
+
+
+def dashboard_kpis(cursor, today, top_cities=5, trend_days=90):
+    """All dashboard numbers, read from listings_rollup and claims_rollup only."""
+    cursor.execute("""
+        SELECT COALESCE(SUM(Open_Count), 0),
+               COALESCE(SUM(CASE WHEN Expiry_Date = %s THEN Quantity ELSE 0 END), 0)
+        FROM listings_rollup WHERE Expiry_Date >= %s
+    """, (today, today))
+    open_listings, expiring_today = cursor.fetchone()
+
+    cursor.execute("""
+        SELECT City, SUM(Open_Count) AS Open_Listings
+        FROM listings_rollup WHERE Expiry_Date >= %s
+        GROUP BY City ORDER BY Open_Listings DESC LIMIT %s
+    """, (today, top_cities))
+    cities = cursor.fetchall()
+
+    start = datetime.combine(today - timedelta(days=trend_days), datetime.min.time())
+    end = datetime.combine(today, datetime.max.time())
+    grain, trend = claim_trend(cursor, start, end, grain="day")
+
+    return {
+        "open_listings": int(open_listings),
+        "expiring_today": int(expiring_today),
+        "claims_by_status": status_totals(cursor),
+        "top_cities": cities,
+        "claims_trend": trend,
+    }
@@ -0,0 +1,125 @@
+"""Routing of reads to fresh read replicas and of writes to the primary.
+
+EndpointRouter hands out connections through a connect(endpoint) function
+it is given, so it works the same for the app's pooled connections and for
+anything else that can open one. Reads try the replicas in round-robin
+order and use the first one whose replication lag is within max_lag; when
+none is reachable or fresh they go to the primary.
+
+Lag comes from SHOW REPLICA STATUS (SHOW SLAVE STATUS before MySQL 8.0.22)
+and is cached per endpoint for LAG_CHECK_SECONDS:
+- Seconds_Behind_Source within max_lag: fresh;
+- Seconds_Behind_Source past max_lag, or NULL (replication stopped or
+  broken): stale;
+- no status row: the endpoint is not a replica (a primary, or a proxy or
+  cluster reader that hides replication), so there is no lag to check and
+  it is used; this is logged once per endpoint.
+"""
+import logging
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+LAG_CHECK_SECONDS = 5
+
+
+class EndpointRouter:
+    """Route reads to fresh replicas, writes to the primary, and count load per endpoint."""
+
+    def __init__(self, primary, replicas, max_lag):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.lock = threading.Lock()
+        self.next_replica = 0
+        self.lag_checks = {}
+        self.not_replicas = set()
+        self.load = {self.name(ep): {"reads": 0, "writes": 0, "rejected": 0}
+                     for ep in [primary] + self.replicas}
+
+    @staticmethod
+    def name(endpoint):
+        return f"{endpoint['host']}:{endpoint['port']}"
+
+    def replica_order(self):
+        """Return replicas in round-robin order starting from the next one."""
+        with self.lock:
+            start = self.next_replica
+            self.next_replica = (self.next_replica + 1) % max(len(self.replicas), 1)
+        return self.replicas[start:] + self.replicas[:start]
+
+    @staticmethod
+    def replica_status(conn):
+        """The SHOW REPLICA STATUS row as a dict, or None if the server is not a replica."""
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Exception:
+                # Servers before MySQL 8.0.22 only know the old name
+                cursor.execute("SHOW SLAVE STATUS")
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def is_fresh(self, endpoint, conn):
+        """Check replica lag against the staleness bound, caching the result for LAG_CHECK_SECONDS."""
+        key = self.name(endpoint)
+        with self.lock:
+            checked = self.lag_checks.get(key)
+        if checked and time.time() - checked[0] < LAG_CHECK_SECONDS:
+            return checked[1]
+        status = self.replica_status(conn)
+        if status is None:
+            fresh = True
+            with self.lock:
+                first = key not in self.not_replicas
+                self.not_replicas.add(key)
+            if first:
+                logger.warning("Read endpoint %s reports no replica status; reads use it without a lag check", key)
+        else:
+            lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+            fresh = lag is not None and lag <= self.max_lag
+        with self.lock:
+            self.lag_checks[key] = (time.time(), fresh)
+        return fresh
+
+    def connect(self, role, connect):
+        """Open a connection for role ("primary" or "replica") with connect(endpoint).
+
+        role="replica" tries the read replicas first and falls back to the
+        primary when none is reachable or all are lagging past max_lag.
+        Errors connecting to the primary propagate.
+        """
+        if role == "replica":
+            for endpoint in self.replica_order():
+                try:
+                    conn = connect(endpoint)
+                except Exception:
+                    self.record(endpoint, "rejected")
+                    continue
+                try:
+                    fresh = self.is_fresh(endpoint, conn)
+                except Exception:
+                    # e.g. the user lacks REPLICATION CLIENT; the lag is unknown, so the replica is not used
+                    logger.warning("Could not check the lag of %s", self.name(endpoint), exc_info=True)
+                    fresh = False
+                if fresh:
+                    self.record(endpoint, "reads")
+                    return conn
+                self.record(endpoint, "rejected")
+                conn.close()
+        conn = connect(self.primary)
+        self.record(self.primary, "reads" if role == "replica" else "writes")
+        return conn
+
+    def record(self, endpoint, kind):
+        with self.lock:
+            self.load[self.name(endpoint)][kind] += 1
+
+    def load_report(self):
+        with self.lock:
+            return pd.DataFrame.from_dict(self.load, orient="index").rename_axis("endpoint").reset_index()
@@ -0,0 +1,186 @@
+"""Cache shared by every Streamlit worker process on a host.
+
+st.cache_data is per process, so N server replicas each reload every table.
+SharedCache sits behind it: table snapshots (Parquet when pyarrow is
+installed, pickle otherwise) and query results are stored once, under keys
+prefixed with a data version. A write bumps the version, which makes every
+older entry unreachable for all workers at once. Concurrent misses for the
+same key are single-flighted across processes: one worker loads, the others
+wait for its result.
+
+Backends:
+- SQLiteBackend: one SQLite file; evicts least-recently-used entries once
+  the stored bytes exceed max_bytes.
+- RedisBackend: any Redis-compatible server (needs the `redis` package);
+  eviction is left to the server's maxmemory-policy (use allkeys-lru).
+"""
+import io
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+LOAD_WAIT_SECONDS = 30
+LOAD_POLL_SECONDS = 0.05
+
+
+def serialize(value):
+    if isinstance(value, pd.DataFrame):
+        try:
+            buffer = io.BytesIO()
+            value.to_parquet(buffer, index=False)
+            return b"P" + buffer.getvalue()
+        except ImportError:
+            pass
+    return b"K" + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize(blob):
+    if blob[:1] == b"P":
+        return pd.read_parquet(io.BytesIO(blob[1:]))
+    return pickle.loads(blob[1:])
+
+
+class SQLiteBackend:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+                expires_at REAL NOT NULL, last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS loads (key TEXT PRIMARY KEY, started_at REAL NOT NULL);
+        """)
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            return None
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                     (key, value, len(value), now + ttl, now))
+        self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def version(self):
+        row = self._conn().execute("SELECT value FROM counters WHERE name = 'data'").fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self):
+        self._conn().execute("INSERT INTO counters VALUES ('data', 1) "
+                             "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+
+    def acquire_load(self, key):
+        conn = self._conn()
+        now = time.time()
+        # A stale marker means its owner died mid-load
+        conn.execute("DELETE FROM loads WHERE key = ? AND started_at < ?", (key, now - LOAD_WAIT_SECONDS))
+        return conn.execute("INSERT OR IGNORE INTO loads VALUES (?, ?)", (key, now)).rowcount == 1
+
+    def release_load(self, key):
+        self._conn().execute("DELETE FROM loads WHERE key = ?", (key,))
+
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(f"food:entry:{key}")
+
+    def set(self, key, value, ttl):
+        self.client.set(f"food:entry:{key}", value, ex=max(int(ttl), 1))
+
+    def version(self):
+        return int(self.client.get("food:version") or 0)
+
+    def bump_version(self):
+        self.client.incr("food:version")
+
+    def acquire_load(self, key):
+        return bool(self.client.set(f"food:load:{key}", 1, nx=True, ex=LOAD_WAIT_SECONDS))
+
+    def release_load(self, key):
+        self.client.delete(f"food:load:{key}")
+
+
+class SharedCache:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {"hits": 0, "loads": 0, "waits": 0}
+
+    def invalidate(self):
+        """Called after every write: entries under the old version are never read again."""
+        self.backend.bump_version()
+
+    def get_or_load(self, key, loader):
+        versioned_key = f"v{self.backend.version()}:{key}"
+        blob = self.backend.get(versioned_key)
+        if blob is not None:
+            self.stats["hits"] += 1
+            return deserialize(blob)
+
+        deadline = time.time() + LOAD_WAIT_SECONDS
+        owner = self.backend.acquire_load(versioned_key)
+        while not owner and time.time() < deadline:
+            # Another worker is loading this key; wait for its result rather than hitting MySQL too
+            self.stats["waits"] += 1
+            time.sleep(LOAD_POLL_SECONDS)
+            blob = self.backend.get(versioned_key)
+            if blob is not None:
+                return deserialize(blob)
+            owner = self.backend.acquire_load(versioned_key)
+        try:
+            value = loader()
+            self.stats["loads"] += 1
+            self.backend.set(versioned_key, serialize(value), self.ttl)
+            return value
+        finally:
+            if owner:
+                self.backend.release_load(versioned_key)
+
+
+def create_shared_cache(settings):
+    """Build the SharedCache for cache.backend, or None when sharing is off."""
+    if settings.backend == "sqlite":
+        return SharedCache(SQLiteBackend(settings.shared_path, settings.shared_max_bytes), settings.table_ttl)
+    if settings.backend == "redis":
+        return SharedCache(RedisBackend(settings.redis_url), settings.table_ttl)
+    return None
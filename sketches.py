@@ -0,0 +1,335 @@
+"""Approximate analytics sketches for the "most/highest" canned queries.
+
+Used when analytics.backend = "sketch". The store keeps:
+
+- Count-Min sketches + Space-Saving summaries for heavy hitters
+  (listings per Food_Type and per City, claims per Status,
+  completed claims per Provider_Type),
+- a HyperLogLog of distinct claiming receivers,
+- an exact running sum of claimed quantity.
+
+The CRUD helpers capture the affected listing/claim keys before and after a
+write (capture()) and, once the write commits, apply the difference
+(apply(before, -1) / apply(after, +1)). The store is rebuilt from MySQL when
+no snapshot exists on disk.
+
+Every process (each Streamlit server, the API) keeps its own copy and also
+the changes it applied since its last save. At most every save_seconds, on
+a write or a read, it takes the snapshot's lock file, loads the snapshot,
+replays its own changes onto it, writes it back and keeps the merged
+result, so processes neither overwrite each other's counts nor pickle the
+store on every write, and each sees the others' writes within save_seconds.
+
+Error bounds, with N = total count tracked by a sketch:
+- Count-Min: estimate overshoots by at most N * e / CMS_WIDTH with
+  probability 1 - e ** -CMS_DEPTH.
+- Space-Saving: any key with count > N / TOPK_CAPACITY is in the summary.
+- HyperLogLog: standard error 1.04 / sqrt(2 ** HLL_PRECISION). It cannot
+  forget, so deletes are not subtracted; rebuild() resets it.
+"""
+import atexit
+import contextlib
+import hashlib
+import math
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+CMS_WIDTH = 2048
+CMS_DEPTH = 5
+TOPK_CAPACITY = 64
+HLL_PRECISION = 12
+SAVE_SECONDS = 5
+LOCK_STALE_SECONDS = 60
+
+LISTING_KEYS_SQL = "SELECT f.Food_Type, f.Location FROM food_listings_data f WHERE {where}"
+CLAIM_KEYS_SQL = """
+    SELECT c.Status, f.Provider_Type, c.Receiver_ID, f.Quantity
+    FROM claims_data c JOIN food_listings_data f ON c.Food_ID = f.Food_ID
+    WHERE {where}
+"""
+
+
+def _digest(value, size, salt=b""):
+    return hashlib.blake2b(str(value).encode("utf-8"), digest_size=size, salt=salt).digest()
+
+
+@contextlib.contextmanager
+def _file_lock(path, stale_after=LOCK_STALE_SECONDS):
+    """Cross-process lock held by creating path exclusively; a lock older than stale_after is broken."""
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale_after:
+                    os.remove(path)
+                    continue
+            except OSError:
+                pass
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+class CountMinSketch:
+    """Frequency estimates that never undercount, for non-negative totals."""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, key):
+        hashes = np.frombuffer(_digest(key, 4 * self.depth, b"cms"), dtype=np.uint32)
+        return hashes % self.width
+
+    def update(self, key, count=1):
+        self.table[np.arange(self.depth), self._columns(key)] += count
+        self.total += count
+
+    def estimate(self, key):
+        return int(self.table[np.arange(self.depth), self._columns(key)].min())
+
+    def error_bound(self):
+        return math.ceil(math.e / self.width * self.total)
+
+
+class SpaceSaving:
+    """Bounded set of heavy-hitter candidates with per-key overcount."""
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}
+
+    def update(self, key, count=1):
+        if key in self.counters:
+            entry = self.counters[key]
+            entry[0] = max(entry[0] + count, 0)
+        elif count <= 0:
+            return
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [count, 0]
+        else:
+            victim = min(self.counters, key=lambda k: self.counters[k][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[key] = [floor + count, floor]
+
+    def candidates(self):
+        return list(self.counters)
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2 ** precision one-byte registers."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, value):
+        h = int.from_bytes(_digest(value, 8, b"hll"), "big")
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class HeavyHitters:
+    """Space-Saving picks the candidates, Count-Min supplies their counts."""
+
+    def __init__(self):
+        self.cms = CountMinSketch()
+        self.topk = SpaceSaving()
+
+    def update(self, key, count=1):
+        self.cms.update(key, count)
+        self.topk.update(key, count)
+
+    def top(self, k=1):
+        ranked = sorted(((key, self.cms.estimate(key)) for key in self.topk.candidates()),
+                        key=lambda item: item[1], reverse=True)
+        return [(key, count) for key, count in ranked[:k] if count > 0]
+
+    def error_bound(self):
+        return self.cms.error_bound()
+
+
+class SketchStore:
+    def __init__(self, path, save_seconds=SAVE_SECONDS):
+        self.path = path
+        self.save_seconds = save_seconds
+        self.snapshot_mtime = None
+        self.lock = threading.Lock()
+        self.reset()
+        atexit.register(self.flush)
+
+    def reset(self):
+        self.heavy_hitters = {
+            "listings_by_food_type": HeavyHitters(),
+            "listings_by_city": HeavyHitters(),
+            "claims_by_status": HeavyHitters(),
+            "completed_claims_by_provider_type": HeavyHitters(),
+        }
+        self.claiming_receivers = HyperLogLog()
+        self.claimed_quantity = 0
+        self._clear_pending()
+
+    def _clear_pending(self):
+        """Forget the changes since the last save (they are in the snapshot now)."""
+        self.pending_counts = {name: {} for name in self.heavy_hitters}
+        self.pending_receivers = HyperLogLog()
+        self.pending_quantity = 0
+        self.dirty = False
+        self.last_save = time.monotonic()
+
+    @staticmethod
+    def capture(cursor, listing_where=None, claim_where=None, params=()):
+        """Read the sketch keys of the listings/claims a write touches."""
+        captured = {"listings": [], "claims": []}
+        if listing_where:
+            cursor.execute(LISTING_KEYS_SQL.format(where=listing_where), params)
+            captured["listings"] = cursor.fetchall()
+        if claim_where:
+            cursor.execute(CLAIM_KEYS_SQL.format(where=claim_where), params)
+            captured["claims"] = cursor.fetchall()
+        return captured
+
+    def _count(self, name, key, count):
+        self.heavy_hitters[name].update(key, count)
+        pending = self.pending_counts[name]
+        pending[key] = pending.get(key, 0) + count
+
+    def _apply_listings(self, rows, sign):
+        for food_type, location in rows:
+            self._count("listings_by_food_type", food_type, sign)
+            self._count("listings_by_city", location, sign)
+
+    def _apply_claims(self, rows, sign):
+        for status, provider_type, receiver_id, quantity in rows:
+            self._count("claims_by_status", status, sign)
+            if status == "Completed":
+                self._count("completed_claims_by_provider_type", provider_type, sign)
+            if sign > 0:
+                self.claiming_receivers.add(receiver_id)
+                self.pending_receivers.add(receiver_id)
+            self.claimed_quantity += sign * (quantity or 0)
+            self.pending_quantity += sign * (quantity or 0)
+
+    def apply(self, captured, sign):
+        with self.lock:
+            self._apply_listings(captured["listings"], sign)
+            self._apply_claims(captured["claims"], sign)
+            self.dirty = True
+            self._flush_if_due()
+
+    def rebuild(self, conn, chunk_size=10000):
+        """Recompute every sketch with one streaming pass over each table."""
+        with self.lock:
+            self.reset()
+            for sql, apply_rows in ((LISTING_KEYS_SQL, self._apply_listings),
+                                    (CLAIM_KEYS_SQL, self._apply_claims)):
+                cursor = conn.cursor(buffered=False)
+                try:
+                    cursor.execute(sql.format(where="1 = 1"))
+                    while True:
+                        rows = cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        apply_rows(rows, 1)
+                finally:
+                    cursor.close()
+            with _file_lock(f"{self.path}.lock"):
+                self._write()
+            self._clear_pending()
+
+    def _write(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((self.heavy_hitters, self.claiming_receivers, self.claimed_quantity), f)
+        os.replace(tmp_path, self.path)
+        self.snapshot_mtime = self._snapshot_mtime()
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            self.heavy_hitters, self.claiming_receivers, self.claimed_quantity = pickle.load(f)
+        self.snapshot_mtime = self._snapshot_mtime()
+
+    def _snapshot_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _flush_if_due(self):
+        if time.monotonic() - self.last_save >= self.save_seconds:
+            self._flush()
+
+    def _flush(self):
+        """Merge this process's changes into the snapshot on disk and adopt the result (lock held)."""
+        if not self.dirty and self._snapshot_mtime() == self.snapshot_mtime:
+            self.last_save = time.monotonic()
+            return
+        with _file_lock(f"{self.path}.lock"):
+            if os.path.exists(self.path):
+                self._read()
+                for name, counts in self.pending_counts.items():
+                    for key, count in counts.items():
+                        self.heavy_hitters[name].update(key, count)
+                np.maximum(self.claiming_receivers.registers, self.pending_receivers.registers,
+                           out=self.claiming_receivers.registers)
+                self.claimed_quantity += self.pending_quantity
+            if self.dirty:
+                self._write()
+        self._clear_pending()
+
+    def flush(self):
+        """Save pending changes now (also runs at interpreter exit)."""
+        with self.lock:
+            self._flush()
+
+    def load(self):
+        """Load the snapshot from disk; return False if there is none."""
+        with self.lock:
+            if not os.path.exists(self.path):
+                return False
+            self._read()
+            self._clear_pending()
+            return True
+
+    def top(self, name, k=1):
+        """Return ([(key, estimated_count)], absolute_error_bound) for a heavy-hitter sketch."""
+        with self.lock:
+            self._flush_if_due()
+            sketch = self.heavy_hitters[name]
+            return sketch.top(k), sketch.error_bound()
+
+    def average_quantity_per_receiver(self):
+        """Return (estimate, relative_error) of claimed quantity per distinct receiver."""
+        with self.lock:
+            self._flush_if_due()
+        receivers = self.claiming_receivers.estimate()
+        if receivers < 1:
+            return None, self.claiming_receivers.relative_error()
+        return self.claimed_quantity / receivers, self.claiming_receivers.relative_error()
+
@@ -0,0 +1,256 @@
+"""Per-column statistics for the View Tables "Show Data Summary" panel.
+
+For every column of the four tables TableStats keeps the null count,
+min/max, a distinct-count estimate and the most frequent values, plus the
+table's row count. A table is profiled with SQL aggregates the first time it
+is shown (one summary query, then one GROUP BY per column for the top values
+and one for the distinct-count registers), and after that crud.Store keeps it
+current with apply(table, rows, +1 / -1) for inserted, updated and deleted
+rows (cascaded children included), so the panel never loads the table.
+
+Accuracy:
+- row count and null counts are exact;
+- min/max are exact until a delete removes a current bound; the column is
+  then marked and its bounds may be looser than the data;
+- distinct counts are HyperLogLog estimates over CRC32 hashes (MySQL and
+  Python compute the same hash, so the registers are built server-side);
+  like the analytics sketches they cannot forget deleted values;
+- top values use Space-Saving seeded with exact counts; counts are exact
+  for columns with at most TOPK_CAPACITY distinct values.
+
+Only live rows are counted (validation.LIVE_FILTERS): a soft delete
+expires the profiles of the tables it hides rows in, so they are re-profiled
+on their next read, and crud.Store leaves hidden rows out when it adjusts
+the statistics for a delete.
+
+Writes that bypass every Store of this process (other Streamlit or API
+processes, `python deletions.py` / `python archive.py` runs, manual SQL) are
+not seen until the table is profiled again: rebuild() does it at once, and
+with refresh_seconds a profile older than that is re-profiled in the
+background on its next read while the old one keeps being served. Changes
+applied while a profile is being built are replayed onto it.
+"""
+import threading
+import time
+import zlib
+from datetime import date, datetime
+
+import pandas as pd
+
+from crud import TABLE_COLUMNS
+from sketches import HyperLogLog, SpaceSaving, TOPK_CAPACITY
+from validation import LIVE_FILTERS, SCHEMA
+
+PRECISION = 10
+RANK_BITS = 32 - PRECISION
+TOP_VALUES_SHOWN = 3
+
+
+class Crc32HyperLogLog(HyperLogLog):
+    """HyperLogLog over CRC32 of the value's text, so MySQL can fill the registers with GROUP BY."""
+
+    def __init__(self):
+        super().__init__(PRECISION)
+
+    @staticmethod
+    def registers_sql(table, column):
+        rest = f"(CRC32({column}) & {(1 << RANK_BITS) - 1})"
+        return (f"SELECT CRC32({column}) >> {RANK_BITS}, "
+                f"MAX(IF({rest} = 0, {RANK_BITS + 1}, {RANK_BITS + 1} - LENGTH(BIN({rest})))) "
+                f"FROM {table} WHERE {column} IS NOT NULL AND {LIVE_FILTERS[table]} GROUP BY 1")
+
+    def add(self, value):
+        h = zlib.crc32(str(value).encode("utf-8"))
+        rest = h & ((1 << RANK_BITS) - 1)
+        rank = RANK_BITS - rest.bit_length() + 1
+        index = h >> RANK_BITS
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+
+def _comparable(value, like):
+    """Bring form/API text (e.g. '2026-01-31') to the type of the stored bound before comparing."""
+    if isinstance(value, str) and isinstance(like, datetime):
+        return datetime.fromisoformat(value)
+    if isinstance(value, str) and isinstance(like, date):
+        return date.fromisoformat(value[:10])
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class ColumnStats:
+    def __init__(self, nulls, minimum, maximum, registers=None, top=None):
+        self.nulls = int(nulls or 0)
+        self.min = minimum
+        self.max = maximum
+        self.bounds_exact = True
+        self.hll = Crc32HyperLogLog()
+        for index, rank in registers or ():
+            self.hll.registers[int(index)] = int(rank)
+        self.top = SpaceSaving()
+        for value, count in top or ():
+            self.top.update(value, int(count))
+
+    def apply(self, value, sign):
+        if value is None or (isinstance(value, float) and pd.isna(value)):
+            self.nulls += sign
+            return
+        try:
+            value = _comparable(value, self.min if self.min is not None else self.max)
+            if sign > 0:
+                self.hll.add(value)
+                self.min = value if self.min is None or value < self.min else self.min
+                self.max = value if self.max is None or value > self.max else self.max
+            elif value == self.min or value == self.max:
+                self.bounds_exact = False
+        except (TypeError, ValueError):
+            self.bounds_exact = False
+        self.top.update(value, sign)
+
+
+class TableStats:
+    def __init__(self, connect, refresh_seconds=None):
+        self.connect = connect
+        self.refresh_seconds = refresh_seconds
+        self.tables = {}
+        self.refreshing = set()
+        # Per table, one list per running _profile() of the (rows, sign) changes applied meanwhile
+        self.changes = {}
+        self.lock = threading.Lock()
+
+    def _profile(self, table):
+        columns = TABLE_COLUMNS[table]
+        primary_key = SCHEMA[table][0]
+        live = LIVE_FILTERS[table]
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            # Every query below reads the same snapshot
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            aggregates = ", ".join(f"SUM({c} IS NULL), MIN({c}), MAX({c})" for c in columns)
+            cursor.execute(f"SELECT COUNT(*), {aggregates} FROM {table} WHERE {live}")
+            row = cursor.fetchone()
+            profile = {"rows": int(row[0]), "columns": {}, "profiled_at": time.monotonic(), "expired": False}
+            for i, column in enumerate(columns):
+                nulls, minimum, maximum = row[1 + 3 * i: 4 + 3 * i]
+                cursor.execute(Crc32HyperLogLog.registers_sql(table, column))
+                registers = cursor.fetchall()
+                top = None
+                if column != primary_key:
+                    cursor.execute(f"SELECT {column}, COUNT(*) AS n FROM {table} WHERE {column} IS NOT NULL "
+                                   f"AND {live} GROUP BY {column} ORDER BY n DESC LIMIT {TOPK_CAPACITY}")
+                    top = cursor.fetchall()
+                profile["columns"][column] = ColumnStats(nulls, minimum, maximum, registers, top)
+            return profile
+        finally:
+            cursor.close()
+            conn.rollback()
+            conn.close()
+
+    def rebuild(self, table):
+        """Profile the table again and swap the result in.
+
+        Writes applied while the queries run are recorded and replayed onto
+        the new profile, so none are lost. A write that committed just before
+        the snapshot but applied just after the recording started (a window of
+        the few milliseconds between commit and apply()) is counted twice until
+        the next profile.
+        """
+        changes = []
+        with self.lock:
+            self.changes.setdefault(table, []).append(changes)
+
+        def stop_recording():
+            self.changes[table] = [other for other in self.changes[table] if other is not changes]
+        try:
+            profile = self._profile(table)
+        except BaseException:
+            with self.lock:
+                stop_recording()
+            raise
+        # One critical section from the end of the recording to the swap, so no change falls between them
+        with self.lock:
+            stop_recording()
+            for rows, sign in changes:
+                if rows is None:
+                    # expire() ran meanwhile; the snapshot may predate the soft delete
+                    profile["expired"] = True
+                else:
+                    self._apply(profile, rows, sign)
+            self.tables[table] = profile
+        return profile
+
+    def _refresh(self, table):
+        try:
+            self.rebuild(table)
+        finally:
+            with self.lock:
+                self.refreshing.discard(table)
+
+    def _table(self, table):
+        with self.lock:
+            profile = self.tables.get(table)
+            stale = (profile is not None and table not in self.refreshing
+                     and (profile["expired"] or self.refresh_seconds is not None
+                          and time.monotonic() - profile["profiled_at"] >= self.refresh_seconds))
+            if stale:
+                self.refreshing.add(table)
+        if stale:
+            threading.Thread(target=self._refresh, args=(table,), name=f"table-stats-{table}", daemon=True).start()
+        return profile if profile is not None else self.rebuild(table)
+
+    @staticmethod
+    def _apply(profile, rows, sign):
+        profile["rows"] += sign * len(rows)
+        for row in rows:
+            for column, stats in profile["columns"].items():
+                stats.apply(row.get(column), sign)
+
+    def apply(self, table, rows, sign):
+        """Add (sign=1) or remove (sign=-1) rows, given as dicts keyed by column name."""
+        with self.lock:
+            for changes in self.changes.get(table, ()):
+                changes.append((rows, sign))
+            profile = self.tables.get(table)
+            # Not profiled yet: the profile being built gets these rows replayed onto it
+            if profile is not None:
+                self._apply(profile, rows, sign)
+
+    def expire(self, tables):
+        """Have the tables profiled again, in the background, on their next read (after a soft delete)."""
+        with self.lock:
+            for table in tables:
+                if table in self.tables:
+                    self.tables[table]["expired"] = True
+                for changes in self.changes.get(table, ()):
+                    changes.append((None, 0))
+
+    def row_count(self, table):
+        return self._table(table)["rows"]
+
+    def summary(self, table):
+        """One row per column: nulls, distinct estimate, min/max and the most frequent values."""
+        profile = self._table(table)
+        primary_key = SCHEMA[table][0]
+        with self.lock:
+            rows = []
+            for column, stats in profile["columns"].items():
+                if column == primary_key:
+                    distinct, top = profile["rows"], ""
+                else:
+                    distinct = min(round(stats.hll.estimate()), profile["rows"] - stats.nulls)
+                    ranked = sorted(((value, entry[0]) for value, entry in stats.top.counters.items() if entry[0] > 0),
+                                    key=lambda item: item[1], reverse=True)
+                    top = ", ".join(f"{value} ({count})" for value, count in ranked[:TOP_VALUES_SHOWN])
+                rows.append({
+                    "column": column,
+                    "nulls": stats.nulls,
+                    "null_%": round(100 * stats.nulls / profile["rows"], 1) if profile["rows"] else 0.0,
+                    "distinct (est.)": distinct,
+                    "min": str(stats.min) if stats.min is not None else "",
+                    "max": str(stats.max) if stats.max is not None else "",
+                    "bounds": "exact" if stats.bounds_exact else "may be loose",
+                    "top values": top,
+                })
+        return pd.DataFrame(rows)
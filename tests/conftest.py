@@ -0,0 +1,92 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crud import TABLE_COLUMNS  # noqa: E402
+from sharding import SHARD_SCHEMA, Shard  # noqa: E402
+from validation import SOFT_DELETE_TABLES  # noqa: E402
+
+
+class SqliteConnection:
+    """sqlite3 connection taking mysql-connector's cursor(buffered=...); SQLite cursors already stream."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self, buffered=None):
+        return self.conn.cursor()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+@pytest.fixture(scope="session")
+def sample_rows():
+    """Rows of the four tables, keyed by table; every listing is in its provider's city."""
+    rng = random.Random(0)
+    cities = ["Lake Jesusview", "New Jessica", "East Sheena", "Mumbai", "Pune", "Chennai", "Delhi", "Kolkata"]
+    providers = [{"Provider_ID": i, "Name": f"Provider {i}", "Type": rng.choice(["Restaurant", "Grocery Store", "Caterer"]),
+                  "Address": f"{i} Main St", "City": rng.choice(cities), "Contact": f"555-{i:04d}"} for i in range(1, 201)]
+    receivers = [{"Receiver_ID": i, "Name": f"Receiver {i % 250}", "Type": rng.choice(["NGO", "Shelter"]),
+                  "City": rng.choice(cities), "Contact": f"556-{i:04d}"} for i in range(1, 301)]
+    listings = []
+    for i in range(1, 2001):
+        provider = rng.choice(providers)
+        listings.append({"Food_ID": i, "Food_Name": rng.choice(["Rice", "Bread", "Soup", "Salad", "Fruit"]),
+                         "Quantity": rng.randint(1, 50), "Expiry_Date": f"2026-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+                         "Provider_ID": provider["Provider_ID"], "Provider_Type": provider["Type"],
+                         "Location": provider["City"], "Food_Type": rng.choice(["Vegetarian", "Vegan", "Non-Vegetarian"]),
+                         "Meal_Type": rng.choice(["Breakfast", "Lunch", "Dinner", "Snacks"])})
+    claims = [{"Claim_ID": i, "Food_ID": rng.randint(1, 2000), "Receiver_ID": rng.randint(1, 300),
+               "Status": rng.choice(["Completed", "Pending", "Cancelled"]),
+               "Timestamp": f"2026-03-{rng.randint(10, 28)} 12:00:00"} for i in range(1, 3001)]
+    return {"providers_data": providers, "receivers_data": receivers, "food_listings_data": listings,
+            "claims_data": claims}
+
+
+@pytest.fixture
+def make_database(tmp_path, sample_rows):
+    """Factory of SQLite databases with the post-migration schema (Deleted_At included), loaded with sample_rows.
+
+    Quantities are REAL so that SQLite divides like MySQL.
+    """
+    def make(name="food.db"):
+        database = Shard("sqlite", path=str(tmp_path / name))
+
+        def create(cursor):
+            for statement in SHARD_SCHEMA:
+                cursor.execute(statement.replace("Quantity INT", "Quantity REAL"))
+            for table in SOFT_DELETE_TABLES:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN Deleted_At DATETIME NULL")
+            for table, rows in sample_rows.items():
+                columns = TABLE_COLUMNS[table]
+                cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                                   [tuple(row[c] for c in columns) for row in rows])
+        database.transaction(create)
+        return database
+    return make
+
+
+@pytest.fixture(scope="session")
+def mysql_connect():
+    """Connect function for the configured MySQL database; skips the test if there is no server."""
+    mysql_connector = pytest.importorskip("mysql.connector")
+    from config import load_config
+
+    db = load_config().database
+
+    def connect():
+        return mysql_connector.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                       database=db.database, connection_timeout=db.connect_timeout)
+    try:
+        connect().close()
+    except mysql_connector.Error as e:
+        pytest.skip(f"no MySQL server: {e}")
+    return connect
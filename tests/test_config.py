@@ -0,0 +1,19 @@
+import pytest
+
+from config import AppConfig, CaptureConfig, ConfigError, OutboxConfig, ShardingConfig, validate
+
+SHARDED = ShardingConfig(enabled=True, shards=["sqlite:///shard_0.db"])
+
+
+@pytest.mark.parametrize("section", [{"outbox": OutboxConfig(enabled=True)},
+                                     {"capture": CaptureConfig(enabled=True)}])
+def test_sharding_rejects_single_database_features(section):
+    validate(AppConfig(sharding=SHARDED))
+    with pytest.raises(ConfigError):
+        validate(AppConfig(sharding=SHARDED, **section))
+
+
+def test_api_refuses_to_start_sharded():
+    api = pytest.importorskip("api")
+    with pytest.raises(ConfigError):
+        api.Api(AppConfig(sharding=SHARDED))
@@ -0,0 +1,96 @@
+import csv
+import gzip
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import export
+from conftest import SqliteConnection
+
+# Peak RSS at ROWS may exceed peak RSS at ROWS / 10 by at most this much
+RSS_GROWTH_LIMIT_MB = 64
+ROWS = 1_000_000
+
+
+def claims_sql(rows):
+    """A claims-shaped result of rows generated rows."""
+    return f"""
+        WITH RECURSIVE numbers(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM numbers WHERE n + 1 < {rows})
+        SELECT n AS Claim_ID, n % 1000 AS Food_ID, n % 500 AS Receiver_ID,
+               CASE n % 3 WHEN 0 THEN 'Pending' WHEN 1 THEN 'Completed' ELSE 'Cancelled' END AS Status,
+               datetime('2025-01-01', '+' || n || ' seconds') AS Timestamp
+        FROM numbers
+    """
+
+
+def export_rows(sql, export_format, path, chunk_size=export.CHUNK_SIZE):
+    conn = SqliteConnection(sqlite3.connect(":memory:"))
+    try:
+        export.export_query(conn, sql, export_format, str(path), chunk_size=chunk_size)
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("export_format", ["CSV", "CSV (gzip)"])
+def test_csv_holds_every_row(tmp_path, export_format):
+    path = tmp_path / f"claims.{export.FORMATS[export_format][0]}"
+    export_rows(claims_sql(25_000), export_format, path)
+    with (gzip.open(path, "rt") if export_format == "CSV (gzip)" else open(path)) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Claim_ID", "Food_ID", "Receiver_ID", "Status", "Timestamp"]
+    assert len(rows) == 25_001
+
+
+def test_parquet_holds_every_row(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "claims.parquet"
+    export_rows(claims_sql(25_000), "Parquet", path)
+    table = pq.read_table(path)
+    assert table.num_rows == 25_000
+    assert str(table.schema.field("Claim_ID").type) == "int64"
+
+
+def test_parquet_column_null_in_first_chunk(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "sparse.parquet"
+    export_rows("""
+        WITH RECURSIVE numbers(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM numbers WHERE n + 1 < 100)
+        SELECT n AS Claim_ID, CASE WHEN n < 50 THEN NULL ELSE n END AS Food_ID FROM numbers
+    """, "Parquet", path, chunk_size=10)
+    assert pq.read_table(path).column("Food_ID").null_count == 50
+
+
+def test_parquet_schema_comes_from_mysql_column_types():
+    pa = pytest.importorskip("pyarrow")
+    field_type = pytest.importorskip("mysql.connector").FieldType
+    description = [("Food_ID", field_type.LONG), ("Quantity", field_type.NEWDECIMAL),
+                   ("Expiry_Date", field_type.DATE), ("Food_Name", field_type.VAR_STRING)]
+    # Every column is NULL in the first chunk, which used to give them Arrow's null type
+    schema = export.arrow_schema(description, [(None, None, None, None)])
+    assert schema.types == [pa.int64(), pa.float64(), pa.date32(), pa.string()]
+
+
+def peak_rss_mb(export_format, rows, tmp_path):
+    """Peak RSS in MB of a fresh process exporting rows generated rows."""
+    script = f"""
+import resource, sqlite3, sys
+sys.path[:0] = {[os.path.dirname(os.path.dirname(os.path.abspath(__file__))), os.path.dirname(os.path.abspath(__file__))]!r}
+import export
+from conftest import SqliteConnection
+from test_export import claims_sql
+export.export_query(SqliteConnection(sqlite3.connect(":memory:")), claims_sql({rows}), {export_format!r},
+                    {str(tmp_path / f"rss_{rows}")!r})
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+    return float(subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout)
+
+
+@pytest.mark.parametrize("export_format", list(export.FORMATS))
+def test_peak_rss_does_not_grow_with_rows(tmp_path, export_format):
+    if export_format == "Parquet":
+        pytest.importorskip("pyarrow")
+    small, large = peak_rss_mb(export_format, ROWS // 10, tmp_path), peak_rss_mb(export_format, ROWS, tmp_path)
+    assert large - small <= RSS_GROWTH_LIMIT_MB
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from conftest import SqliteConnection
+from geo import Gazetteer, LazyProximityIndex, ProximityIndex
+
+PLACES = {"chennai": (13.0827, 80.2707), "tambaram": (12.9249, 80.1000)}
+
+
+def wait_for_index(lazy):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        index = lazy.current()
+        if index is not None:
+            return index
+        time.sleep(0.01)
+    raise AssertionError("the index was not built within 5s")
+
+
+def test_distances_to_placeholder_cities_are_hidden():
+    index = ProximityIndex(Gazetteer(dict(PLACES), approximate_unknown=True), cell_km=10.0)
+    index.upsert_receiver(1, "Chennai")
+    index.upsert_receiver(2, "Lake Jesusview")
+    index.upsert_listing(10, "Chennai", None, 5, 1)
+    index.upsert_listing(11, "Tambaram", None, 5, 1)
+    index.upsert_listing(12, "Lake Jesusview", None, 5, 2)
+    # Put the placeholder city next to Chennai, so it falls inside the search radius
+    index.listings.insert(13, 13.09, 80.28, (None, 5, 3, True))
+
+    near_chennai = dict(index.open_listings_near_receiver(1, 50))
+    assert near_chennai[10] == 0
+    assert 20 < near_chennai[11] < 30
+    assert near_chennai[13] is None
+    # The placeholder city's own listings are at distance 0; nothing else has a meaningful distance
+    near_placeholder = index.open_listings_near_receiver(2, 50)
+    assert near_placeholder[0] == (12, 0.0)
+    assert all(distance is None for _, distance in near_placeholder[1:])
+
+
+def test_lazy_index_builds_in_the_background_and_replays_writes(make_database):
+    database = make_database()
+    release = threading.Event()
+
+    def connect():
+        assert release.wait(5)
+        return SqliteConnection(database.connect())
+
+    lazy = LazyProximityIndex(Gazetteer(approximate_unknown=True), connect, cell_km=10.0)
+    assert lazy.current() is None
+    lazy.remove_receiver(2)
+    lazy.upsert_listing(1, "Nowhere Else", None, 7, 1)
+    release.set()
+    index = wait_for_index(lazy)
+    assert index.build_report["listings"]["rows"] == 2000
+    assert 2 not in index.receivers
+    lat, lon, _ = index.listings.cells[index.listings.points[1]][1]
+    assert (lat, lon) == index.gazetteer.placeholder_point("Nowhere Else")
+
+
+def test_lazy_index_rebuilds_when_due():
+    builds = []
+
+    class BackdatedIndex(LazyProximityIndex):
+        """Builds an empty index dated an hour ago, so the next read finds it due."""
+
+        def _build(self):
+            builds.append(threading.current_thread().name)
+            with self.lock:
+                self.index, self.built_at = ProximityIndex(self.gazetteer), time.monotonic() - 3600
+                self.building, self.changes = False, None
+
+    def wait_for_build():
+        deadline = time.monotonic() + 5
+        while lazy.building and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    lazy = BackdatedIndex(Gazetteer(), connect=None, rebuild_seconds=60)
+    assert lazy.current() is None
+    wait_for_build()
+    first = lazy.index
+    # The rebuild runs in the background while the old index keeps being served
+    assert lazy.current() is first
+    wait_for_build()
+    assert builds == ["geo-index", "geo-index"]
+    assert lazy.index is not first
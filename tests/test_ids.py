@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+import crud
+import ids
+
+
+@pytest.fixture
+def connect(mysql_connect):
+    conn = mysql_connect()
+    cursor = conn.cursor()
+    ids.create_sequence_table(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return mysql_connect
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(slot,)) for slot in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_parallel_allocators_hand_out_each_id_once(connect):
+    workers, ids_per_worker = 32, 2000
+    results = [[] for _ in range(workers)]
+
+    def work(slot):
+        # One allocator per thread stands in for one app process or import job
+        allocator = ids.IdAllocator(connect, block_size=50)
+        results[slot] = [allocator.next_id("claims_data") for _ in range(ids_per_worker)]
+
+    run_threads(work, workers)
+    allocated = [i for ids_ in results for i in ids_]
+    assert len(allocated) == len(set(allocated))
+
+
+def test_explicit_ids_race_allocated_inserts(connect):
+    """Worker 0 inserts explicit IDs beyond the sequence, as an import would; the others insert allocated IDs."""
+    workers, rows_per_worker = 16, 200
+    name = f"idcheck-{threading.get_ident()}"
+    store = crud.Store(connect)
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(Provider_ID), 0) FROM providers_data")
+    explicit_base = cursor.fetchone()[0] + 10_000_000
+    cursor.close()
+    conn.close()
+    inserted = [[] for _ in range(workers)]
+    errors = []
+
+    def work(slot):
+        allocator = ids.IdAllocator(connect, block_size=50)
+        try:
+            for n in range(rows_per_worker):
+                key = explicit_base + n if slot == 0 else allocator.next_id("providers_data")
+                store.insert("providers_data", [{"Provider_ID": key, "Name": name, "Type": "check",
+                                                 "Address": "", "City": "", "Contact": ""}],
+                             explicit_keys=[key] if slot == 0 else ())
+                inserted[slot].append(key)
+        except Exception as e:
+            errors.append(e)
+
+    run_threads(work, workers)
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT Provider_ID FROM providers_data WHERE Name = %s", (name,))
+        stored = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT Next_ID FROM id_sequences WHERE Table_Name = 'providers_data'")
+        next_id = cursor.fetchone()[0]
+        cursor.execute("DELETE FROM providers_data WHERE Name = %s", (name,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    assert not errors
+    keys = [key for keys in inserted for key in keys]
+    assert next_id > max(keys)
+    assert sorted(stored) == sorted(keys) and len(set(keys)) == len(keys)
+
+
+def test_explicit_id_below_the_sequence_is_rejected(connect):
+    next_id = ids.IdAllocator(connect, block_size=1).next_id("providers_data")
+    with pytest.raises(ids.ExplicitIdError):
+        crud.Store(connect).insert("providers_data", [{"Provider_ID": next_id, "Name": "check", "Type": "check",
+                                                       "Address": "", "City": "", "Contact": ""}],
+                                   explicit_keys=[next_id])
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+import columnar
+from config import DatabaseConfig
+from queries import CANNED_QUERIES
+
+SETTINGS = DatabaseConfig(arrow_fetch=False)
+DELETED_PROVIDERS = (1, 2)
+DELETED_RECEIVERS = (7, 8, 9)
+
+
+def read(database, name):
+    _, sql, columns = CANNED_QUERIES[name]
+    conn = database.connect()
+    try:
+        return columnar.read_frame(conn, sql, SETTINGS, columns=columns)
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def databases(make_database):
+    """(soft-deleted, hard-deleted): the same providers and receivers deleted both ways."""
+    soft, hard = make_database("soft.db"), make_database("hard.db")
+    providers, receivers = ", ".join(map(str, DELETED_PROVIDERS)), ", ".join(map(str, DELETED_RECEIVERS))
+
+    def soft_delete(cursor):
+        cursor.execute(f"UPDATE providers_data SET Deleted_At = CURRENT_TIMESTAMP WHERE Provider_ID IN ({providers})")
+        cursor.execute(f"UPDATE receivers_data SET Deleted_At = CURRENT_TIMESTAMP WHERE Receiver_ID IN ({receivers})")
+
+    def hard_delete(cursor):
+        # Claims have no FOREIGN KEY on Receiver_ID; the rest cascades
+        cursor.execute(f"DELETE FROM claims_data WHERE Receiver_ID IN ({receivers})")
+        cursor.execute(f"DELETE FROM receivers_data WHERE Receiver_ID IN ({receivers})")
+        cursor.execute(f"DELETE FROM providers_data WHERE Provider_ID IN ({providers})")
+    soft.transaction(soft_delete)
+    hard.transaction(hard_delete)
+    return soft, hard
+
+
+@pytest.mark.parametrize("name", CANNED_QUERIES)
+def test_canned_query_runs_on_migrated_schema(databases, name):
+    soft, _ = databases
+    frame = read(soft, name)
+    assert list(frame.columns) == CANNED_QUERIES[name][2]
+    assert not frame.empty
+
+
+@pytest.mark.parametrize("name", CANNED_QUERIES)
+def test_canned_query_hides_soft_deleted_rows(databases, name):
+    soft, hard = databases
+    pd.testing.assert_frame_equal(read(soft, name), read(hard, name), check_dtype=False)
+
+
+def test_provider_contacts_leave_out_deleted_providers(databases):
+    soft, _ = databases
+    soft.transaction(lambda cursor: cursor.execute(
+        "UPDATE providers_data SET Deleted_At = CURRENT_TIMESTAMP WHERE City = 'Lake Jesusview'"))
+    assert read(soft, "provider_contacts_in_city").empty
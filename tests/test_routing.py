@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+import routing
+from routing import EndpointRouter
+
+PRIMARY = {"host": "primary", "port": 3306}
+REPLICAS = [{"host": "replica-a", "port": 3306}, {"host": "replica-b", "port": 3306}]
+
+
+class Server:
+    """A database endpoint as the router sees it: SHOW REPLICA STATUS answers and a count of status queries."""
+
+    def __init__(self, status=None, reachable=True, old=False, denied=False):
+        self.status = status
+        self.reachable = reachable
+        self.old = old
+        self.denied = denied
+        self.checks = 0
+        self.opened = []
+
+    def connect(self):
+        if not self.reachable:
+            raise ConnectionError("unreachable")
+        self.opened.append(Connection(self))
+        return self.opened[-1]
+
+
+class Connection:
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+
+    def cursor(self, dictionary=False):
+        return Cursor(self.server)
+
+    def close(self):
+        self.closed = True
+
+
+class Cursor:
+    def __init__(self, server):
+        self.server = server
+
+    def execute(self, sql):
+        if self.server.denied:
+            raise PermissionError("REPLICATION CLIENT privilege needed")
+        if sql == "SHOW REPLICA STATUS" and self.server.old:
+            raise RuntimeError("You have an error in your SQL syntax")
+        self.server.checks += 1
+
+    def fetchone(self):
+        return self.server.status
+
+    def close(self):
+        pass
+
+
+def route(servers, max_lag=10):
+    """(router, connect) over servers keyed by host; connect(endpoint) opens a Connection."""
+    return EndpointRouter(PRIMARY, REPLICAS, max_lag), lambda endpoint: servers[endpoint["host"]].connect()
+
+
+def servers(a=None, b=None, **kwargs):
+    return {"primary": Server(), "replica-a": a or Server(**kwargs), "replica-b": b or Server(**kwargs)}
+
+
+def test_reads_go_to_a_fresh_replica():
+    router, connect = route(servers(status={"Seconds_Behind_Source": 2}))
+    assert router.connect("replica", connect).server is not None
+    load = router.load_report().set_index("endpoint")
+    assert load.loc["primary:3306", "reads"] == 0
+    assert load["reads"].sum() == 1
+
+
+def test_writes_go_to_the_primary():
+    all_servers = servers(status={"Seconds_Behind_Source": 0})
+    router, connect = route(all_servers)
+    assert router.connect("primary", connect).server is all_servers["primary"]
+    assert router.load_report().set_index("endpoint").loc["primary:3306", "writes"] == 1
+
+
+@pytest.mark.parametrize("status", [{"Seconds_Behind_Source": 60}, {"Seconds_Behind_Source": None}],
+                         ids=["lagging", "replication stopped"])
+def test_stale_replicas_fall_back_to_the_primary(status):
+    all_servers = servers(status=status)
+    router, connect = route(all_servers)
+    assert router.connect("replica", connect).server is all_servers["primary"]
+    load = router.load_report().set_index("endpoint")
+    assert load.loc["primary:3306", "reads"] == 1
+    assert load.loc[["replica-a:3306", "replica-b:3306"], "rejected"].tolist() == [1, 1]
+
+
+def test_unreachable_replica_is_skipped():
+    all_servers = servers(a=Server(reachable=False), b=Server(status={"Seconds_Behind_Source": 0}))
+    router, connect = route(all_servers)
+    assert {router.connect("replica", connect).server for _ in range(4)} == {all_servers["replica-b"]}
+
+
+def test_endpoint_without_replica_status_is_not_a_replica():
+    all_servers = servers(status=None)
+    router, connect = route(all_servers)
+    assert router.connect("replica", connect).server in (all_servers["replica-a"], all_servers["replica-b"])
+
+
+def test_old_servers_answer_show_slave_status():
+    all_servers = servers(status={"Seconds_Behind_Master": 1}, old=True)
+    router, connect = route(all_servers)
+    assert router.connect("replica", connect).server is not all_servers["primary"]
+
+
+def test_failed_lag_check_rejects_the_replica_and_closes_it():
+    all_servers = servers(denied=True)
+    router, connect = route(all_servers)
+    assert router.connect("replica", connect).server is all_servers["primary"]
+    assert all(conn.closed for name in ("replica-a", "replica-b") for conn in all_servers[name].opened)
+
+
+def test_lag_is_checked_once_per_interval_across_threads(monkeypatch):
+    monkeypatch.setattr(routing, "LAG_CHECK_SECONDS", 3600)
+    all_servers = servers(status={"Seconds_Behind_Source": 0})
+    router, connect = route(all_servers)
+    router.connect("replica", connect)
+    router.connect("replica", connect)
+    threads = [threading.Thread(target=router.connect, args=("replica", connect)) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all_servers["replica-a"].checks == 1 and all_servers["replica-b"].checks == 1
+    assert router.load_report()["reads"].sum() == 18
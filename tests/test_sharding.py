@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from queries import CANNED_QUERIES
+from sharding import SHARD_QUERIES, Directory, Shard, ShardedStore, ShardSet, scatter_gather
+
+
+def same_rows(expected, actual):
+    """Equal up to row order (ties in ORDER BY may come back in any order) and float rounding."""
+    if expected.shape != actual.shape:
+        return False
+    actual = actual.set_axis(expected.columns, axis=1)
+    expected = expected.sort_values(list(expected.columns), ignore_index=True)
+    actual = actual.sort_values(list(actual.columns), ignore_index=True)
+    for column in expected.columns:
+        e, a = expected[column], actual[column]
+        if pd.api.types.is_numeric_dtype(e) and pd.api.types.is_numeric_dtype(a):
+            if not np.allclose(e.to_numpy(dtype=float), a.to_numpy(dtype=float), equal_nan=True):
+                return False
+        elif not (e.astype(str) == a.astype(str)).all():
+            return False
+    return True
+
+
+@pytest.fixture
+def sharded(tmp_path, sample_rows, make_database):
+    """(shard set, unsharded reference database) holding the same rows, with the same deletes applied to both."""
+    shard_set = ShardSet([Shard("sqlite", path=str(tmp_path / f"shard_{i}.db")) for i in range(3)],
+                         Directory(Shard("sqlite", path=str(tmp_path / "directory.db"))))
+    shard_set.create()
+    store = ShardedStore(shard_set)
+    for table, rows in sample_rows.items():
+        store.insert(table, rows)
+    store.delete("receivers_data", [7, 8, 9])
+    store.delete("providers_data", [1, 2])
+
+    def delete_unsharded(cursor):
+        # Claims have no FOREIGN KEY on Receiver_ID; the rest cascades
+        cursor.execute("DELETE FROM claims_data WHERE Receiver_ID IN (7, 8, 9)")
+        cursor.execute("DELETE FROM receivers_data WHERE Receiver_ID IN (7, 8, 9)")
+        cursor.execute("DELETE FROM providers_data WHERE Provider_ID IN (1, 2)")
+    reference = make_database("unsharded.db")
+    reference.transaction(delete_unsharded)
+    return shard_set, reference
+
+
+def test_listings_live_on_their_providers_shard(sharded, sample_rows):
+    shard_set, _ = sharded
+    homes = shard_set.directory.locate("providers_data", [p["Provider_ID"] for p in sample_rows["providers_data"]])
+    for index, shard in enumerate(shard_set.shards):
+        frame = shard.query("SELECT Food_ID, Provider_ID FROM food_listings_data")
+        assert all(homes[int(p)] == index for p in frame["Provider_ID"])
+
+
+def test_deleted_receivers_claims_are_gone_from_every_shard(sharded):
+    shard_set, _ = sharded
+    assert shard_set.gather("SELECT Claim_ID FROM claims_data WHERE Receiver_ID IN (7, 8, 9)").empty
+
+
+@pytest.mark.parametrize("name", SHARD_QUERIES)
+def test_scatter_gather_matches_canned_sql(sharded, name):
+    shard_set, reference = sharded
+    assert same_rows(reference.query(CANNED_QUERIES[name][1]), scatter_gather(shard_set, name))
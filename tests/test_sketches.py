@@ -0,0 +1,79 @@
+import random
+import sqlite3
+
+import pytest
+
+from conftest import SqliteConnection
+from sketches import SketchStore
+
+ROWS = 20_000
+EXACT = {
+    "listings_by_food_type": "SELECT Food_Type, COUNT(*) FROM food_listings_data GROUP BY Food_Type",
+    "listings_by_city": "SELECT Location, COUNT(*) FROM food_listings_data GROUP BY Location",
+    "claims_by_status": "SELECT Status, COUNT(*) FROM claims_data GROUP BY Status",
+    "completed_claims_by_provider_type": """
+        SELECT f.Provider_Type, COUNT(*) FROM claims_data c JOIN food_listings_data f ON c.Food_ID = f.Food_ID
+        WHERE c.Status = 'Completed' GROUP BY f.Provider_Type""",
+}
+
+
+@pytest.fixture(scope="module")
+def conn():
+    rng = random.Random(0)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE food_listings_data (Food_ID INT, Quantity INT, Provider_Type TEXT, "
+                 "Location TEXT, Food_Type TEXT)")
+    conn.execute("CREATE TABLE claims_data (Claim_ID INT, Food_ID INT, Receiver_ID INT, Status TEXT)")
+    cities = [f"City {i}" for i in range(500)]
+    # Skewed like real data: a few cities, types and statuses carry most rows
+    conn.executemany("INSERT INTO food_listings_data VALUES (?, ?, ?, ?, ?)", [
+        (i, rng.randint(1, 50), rng.choices(["Restaurant", "Grocery Store", "Caterer"], [5, 3, 1])[0],
+         cities[min(int(rng.paretovariate(1.2)) - 1, len(cities) - 1)],
+         rng.choices(["Vegetarian", "Vegan", "Non-Vegetarian"], [4, 1, 3])[0]) for i in range(ROWS)])
+    conn.executemany("INSERT INTO claims_data VALUES (?, ?, ?, ?)", [
+        (i, rng.randrange(ROWS), rng.randrange(ROWS // 4), rng.choices(["Completed", "Pending", "Cancelled"], [5, 3, 2])[0])
+        for i in range(ROWS)])
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def store(tmp_path, conn):
+    store = SketchStore(str(tmp_path / "sketches.pkl"))
+    store.rebuild(SqliteConnection(conn))
+    return store
+
+
+@pytest.mark.parametrize("name", EXACT)
+def test_heavy_hitters_match_exact_sql(conn, store, name):
+    counts = dict(conn.execute(EXACT[name]).fetchall())
+    sketch = store.heavy_hitters[name]
+    bound = sketch.error_bound()
+    for key, count in counts.items():
+        assert count <= sketch.cms.estimate(key) <= count + bound, key
+    floor = sketch.cms.total / sketch.topk.capacity
+    assert all(key in sketch.topk.counters for key, count in counts.items() if count > floor)
+    top_key, top_count = max(counts.items(), key=lambda item: item[1])
+    (found_key, _), = sketch.top(1)
+    assert found_key == top_key or counts.get(found_key, 0) + bound >= top_count
+
+
+def test_average_quantity_per_receiver(conn, store):
+    (average,) = conn.execute("""
+        SELECT SUM(f.Quantity) * 1.0 / COUNT(DISTINCT c.Receiver_ID)
+        FROM claims_data c JOIN food_listings_data f ON c.Food_ID = f.Food_ID""").fetchone()
+    estimate, relative_error = store.average_quantity_per_receiver()
+    # HyperLogLog is within 3 standard errors except with probability ~0.3%
+    assert abs(estimate - average) <= 3 * relative_error * average
+
+
+def test_two_processes_saves_merge(conn, store):
+    first, second = SketchStore(store.path, save_seconds=0), SketchStore(store.path, save_seconds=0)
+    first.load()
+    second.load()
+    first.apply({"listings": [("Vegan", "City 0")] * 30, "claims": []}, 1)
+    second.apply({"listings": [("Vegan", "City 1")] * 20, "claims": []}, 1)
+    first.flush()
+    vegan = dict(conn.execute(EXACT["listings_by_food_type"]).fetchall())["Vegan"] + 50
+    sketch = first.heavy_hitters["listings_by_food_type"]
+    assert vegan <= sketch.cms.estimate("Vegan") <= vegan + sketch.error_bound()
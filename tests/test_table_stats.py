@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from table_stats import ColumnStats, TableStats
+
+PROVIDER = {"Provider_ID": 1, "Name": "Provider 1", "Type": "Caterer", "Address": "1 Main St", "City": "Pune",
+            "Contact": "555-0001"}
+
+
+class SlowTableStats(TableStats):
+    """Profiles of an empty providers_data that block until release is set, counting how often they ran."""
+
+    def __init__(self, refresh_seconds=None):
+        super().__init__(connect=None, refresh_seconds=refresh_seconds)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.profiles = 0
+
+    def _profile(self, table):
+        self.profiles += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return {"rows": 0, "columns": {column: ColumnStats(0, None, None) for column in PROVIDER},
+                "profiled_at": 0.0, "expired": False}
+
+
+def rebuild_in_background(stats):
+    stats.started.clear()
+    thread = threading.Thread(target=stats.rebuild, args=("providers_data",))
+    thread.start()
+    assert stats.started.wait(5)
+    return thread
+
+
+@pytest.mark.parametrize("profiled_before", [False, True], ids=["first profile", "re-profile"])
+def test_changes_during_a_rebuild_are_replayed(profiled_before):
+    stats = SlowTableStats()
+    if profiled_before:
+        stats.release.set()
+        stats.rebuild("providers_data")
+        stats.release.clear()
+    thread = rebuild_in_background(stats)
+    stats.apply("providers_data", [PROVIDER], 1)
+    stats.release.set()
+    thread.join()
+    assert stats.row_count("providers_data") == 1
+    assert stats.summary("providers_data").set_index("column").loc["City", "top values"] == "Pune (1)"
+
+
+def test_expire_during_a_rebuild_carries_over():
+    stats = SlowTableStats()
+    thread = rebuild_in_background(stats)
+    stats.expire(["providers_data"])
+    stats.release.set()
+    thread.join()
+    assert stats.tables["providers_data"]["expired"]
+
+
+def test_expired_profile_is_served_while_it_refreshes():
+    stats = SlowTableStats()
+    stats.release.set()
+    stats.rebuild("providers_data")
+    stats.apply("providers_data", [PROVIDER], 1)
+    stats.expire(["providers_data"])
+    stats.release.clear()
+    stats.started.clear()
+    assert stats.row_count("providers_data") == 1
+    assert stats.started.wait(5)
+    stats.release.set()
+    for thread in threading.enumerate():
+        if thread.name == "table-stats-providers_data":
+            thread.join()
+    assert stats.profiles == 2 and not stats.tables["providers_data"]["expired"]
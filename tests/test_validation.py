@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from validation import validate_batch
+
+
+class Registry:
+    """IdRegistry over fixed ID sets; confirm() agrees with contains()."""
+
+    def __init__(self, ids):
+        self.ids = {table: set(keys) for table, keys in ids.items()}
+
+    def contains(self, table, keys):
+        return np.array([int(key) in self.ids.get(table, ()) for key in keys], dtype=bool)
+
+    def confirm(self, table, keys, live=True):
+        return self.contains(table, keys)
+
+
+REGISTRY = Registry({"food_listings_data": [1, 2], "receivers_data": [1, 2], "claims_data": [1]})
+
+
+def claims(*rows):
+    return pd.DataFrame(rows, columns=["Claim_ID", "Food_ID", "Receiver_ID", "Status", "Timestamp"])
+
+
+def problems(frame):
+    return [tuple(problem) for problem in validate_batch(REGISTRY, "claims_data", frame)[["row", "column", "problem"]]
+            .itertuples(index=False)]
+
+
+def test_fractional_id_is_not_an_integer():
+    assert problems(claims((1.5, 1, 1, "Pending", None))) == [(0, "Claim_ID", "not an integer")]
+
+
+def test_fractional_reference_is_not_an_integer():
+    assert problems(claims((5, 2.5, 1, "Pending", None))) == [(0, "Food_ID", "not an integer")]
+
+
+def test_key_problems():
+    assert problems(claims((1, 1, 1, "Pending", None), (0, 1, 3, "Pending", None), (6, 1, 2, "Pending", None))) == [
+        (0, "Claim_ID", "already exists"),
+        (1, "Claim_ID", "not a positive integer"),
+        (1, "Receiver_ID", "no such Receiver_ID in receivers_data"),
+    ]
+
+
+def test_valid_batch():
+    assert problems(claims((7, 1, 2, "Pending", None), (8.0, 2, 1, "Completed", None))) == []
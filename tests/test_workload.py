@@ -0,0 +1,77 @@
+import json
+import sqlite3
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import pytest
+
+import workload
+from workload import Recorder, Replayer, fingerprint, peak_open, read_log
+
+
+def test_parameters_survive_encoding():
+    params = [datetime(2026, 3, 1, 12, 30, 5, 250), date(2026, 3, 1), time(7, 45), timedelta(minutes=90),
+              Decimal("12.50"), b"\x00\xffraw", "text", 3, 2.5, None, True]
+    decoded = workload._decode(json.loads(json.dumps(params, default=workload._encode)))
+    assert decoded == tuple(params)
+    assert [type(v) for v in decoded] == [type(v) for v in params]
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM claims_data WHERE Claim_ID = 42", "SELECT * FROM claims_data WHERE Claim_ID = ?"),
+    ("select  Name\n from providers_data where City = 'O''Brien' and Type='x\\'y'",
+     "select Name from providers_data where City = ? and Type=?"),
+    ("SELECT 1.5, Food_ID FROM food_listings_data WHERE Food_ID IN (%s, %s,%s)",
+     "SELECT ?, Food_ID FROM food_listings_data WHERE Food_ID IN (...)"),
+    ("DELETE FROM food_listings_data WHERE Food_ID IN (?)", "DELETE FROM food_listings_data WHERE Food_ID IN (...)"),
+    ("SELECT COUNT(*) FROM table2 t2", "SELECT COUNT(*) FROM table2 t2"),
+])
+def test_fingerprint(sql, expected):
+    assert fingerprint(sql) == expected
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "replay.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.commit()
+    conn.close()
+    return lambda: sqlite3.connect(path, check_same_thread=False)
+
+
+def test_log_read_back_whole_and_cut_off(tmp_path, database):
+    recorder = Recorder(str(tmp_path / "logs"))
+    conn = recorder.wrap(database(), {"host": "localhost", "port": 0})
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"name {i}") for i in range(200)])
+    conn.commit()
+    for i in range(200):
+        cursor.execute("SELECT name FROM t WHERE id = ?", (i,))
+        cursor.fetchall()
+    cursor.close()
+    conn.close()
+    recorder.close()
+
+    _, templates, complete = read_log(recorder.path)
+    assert len(templates) == 2
+    assert [e["e"] for e in complete].count("x") == 201 and complete[-1]["e"] == "close"
+    assert sum(e.get("rows", 0) for e in complete if e["e"] == "x") == 400
+
+    with open(recorder.path, "rb") as f:
+        data = f.read()
+    with open(recorder.path, "wb") as f:
+        f.write(data[:len(data) * 2 // 3])
+    start, _, events = read_log(recorder.path)
+    assert start is not None and 0 < len(events) < len(complete)
+
+
+def test_queueing_is_start_lag_not_schedule_lag(database):
+    # Four overlapping 100 ms connections replayed on two replay connections
+    timelines = [(0, [{"e": "x", "at": at, "sql": "SELECT name FROM t WHERE id = ?", "p": (1,)}
+                      for at in range(0, 101, 20)]) for _ in range(4)]
+    assert peak_open(timelines) == 4
+    replayer = Replayer(database, speed=1.0, concurrency=2)
+    results = replayer.results("test", replayer.run(timelines))
+    assert results["late_starts"] == 2 and results["start_lag_p95_ms"] >= 80
+    assert results["schedule_lag_p95_ms"] <= 50
@@ -0,0 +1,221 @@
+"""Set-based primary/foreign key validation against cached ID bitmaps.
+
+IdRegistry keeps one boolean bitmap per table (index = ID) loaded with a
+single SELECT of the key column. validate_batch() checks a whole batch of
+rows against those bitmaps in one vectorized pass and returns every
+violation, so bad rows are reported before any INSERT is attempted.
+
+Writes keep the bitmaps current with add()/remove(). Deletes that cascade
+into child tables call invalidate() on the children instead, and the
+children are reloaded on next use.
+
+Other processes (other app workers, api.py, the archive and deletion jobs)
+write too, so the bitmaps can be stale. A row is therefore only rejected
+after confirm() has looked the offending IDs up in the database; the answer
+is written back into the bitmap. Bitmaps cover IDs below MAX_BITMAP_ID; the
+few IDs above it are kept in a set, so one huge ID does not allocate a huge
+array.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+# table -> (primary key, {foreign key column: referenced table})
+SCHEMA = {
+    "providers_data": ("Provider_ID", {}),
+    "receivers_data": ("Receiver_ID", {}),
+    "food_listings_data": ("Food_ID", {"Provider_ID": "providers_data"}),
+    "claims_data": ("Claim_ID", {"Food_ID": "food_listings_data", "Receiver_ID": "receivers_data"}),
+}
+
+# Tables whose rows disappear through ON DELETE CASCADE when a row of the key is deleted
+CASCADES = {
+    "providers_data": ("food_listings_data", "claims_data"),
+    "receivers_data": ("claims_data",),
+    "food_listings_data": ("claims_data",),
+    "claims_data": (),
+}
+
+# (child table, filter on the child) selecting the rows ON DELETE CASCADE removes with parent keys {keys}
+CASCADE_FILTERS = {
+    "providers_data": (
+        ("food_listings_data", "Provider_ID IN ({keys})"),
+        ("claims_data", "Food_ID IN (SELECT Food_ID FROM food_listings_data WHERE Provider_ID IN ({keys}))"),
+    ),
+    "receivers_data": (("claims_data", "Receiver_ID IN ({keys})"),),
+    "food_listings_data": (("claims_data", "Food_ID IN ({keys})"),),
+    "claims_data": (),
+}
+
+# Tables with a Deleted_At column: soft-deleted rows wait for a deletion job (see deletions.py)
+SOFT_DELETE_TABLES = ("providers_data", "receivers_data")
+
+# Filter on each table that hides soft-deleted parents and every row below them
+LIVE_FILTERS = {
+    "providers_data": "Deleted_At IS NULL",
+    "receivers_data": "Deleted_At IS NULL",
+    "food_listings_data": (
+        "NOT EXISTS (SELECT 1 FROM providers_data p "
+        "WHERE p.Provider_ID = food_listings_data.Provider_ID AND p.Deleted_At IS NOT NULL)"
+    ),
+    "claims_data": (
+        "NOT EXISTS (SELECT 1 FROM receivers_data r "
+        "WHERE r.Receiver_ID = claims_data.Receiver_ID AND r.Deleted_At IS NOT NULL) "
+        "AND NOT EXISTS (SELECT 1 FROM food_listings_data f JOIN providers_data p ON f.Provider_ID = p.Provider_ID "
+        "WHERE f.Food_ID = claims_data.Food_ID AND p.Deleted_At IS NOT NULL)"
+    ),
+}
+
+# IDs at or above this are kept in a set instead of the bitmap (a 16 MB bitmap at most)
+MAX_BITMAP_ID = 16_000_000
+# IDs per lookup query in confirm()
+CONFIRM_CHUNK = 1000
+
+
+class IdRegistry:
+    def __init__(self, connect):
+        self.connect = connect
+        self.bitmaps = {}
+        self.overflow = {}
+        self.lock = threading.Lock()
+
+    def _query_ids(self, sql, params=()):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _load_ids(self, table):
+        # Soft-deleted parents are no longer valid references
+        live = " WHERE Deleted_At IS NULL" if table in SOFT_DELETE_TABLES else ""
+        return self._query_ids(f"SELECT {SCHEMA[table][0]} FROM {table}{live}")
+
+    def _lookup(self, table, ids, live=True):
+        """The subset of ids that exist in the database now (live=False: soft-deleted rows count too)."""
+        key = SCHEMA[table][0]
+        live = " AND Deleted_At IS NULL" if live and table in SOFT_DELETE_TABLES else ""
+        found = [self._query_ids(f"SELECT {key} FROM {table} WHERE {key} IN ({', '.join(['%s'] * len(chunk))})"
+                                 f"{live}", tuple(int(i) for i in chunk))
+                 for chunk in np.array_split(ids, max(1, -(-len(ids) // CONFIRM_CHUNK)))]
+        return np.concatenate(found) if found else np.array([], dtype=np.int64)
+
+    def _ensure(self, table):
+        """Load table's bitmap if needed; call with the lock held."""
+        if table not in self.bitmaps:
+            ids = self._load_ids(table)
+            ids = ids[ids >= 0]
+            small = ids[ids < MAX_BITMAP_ID]
+            bitmap = np.zeros(int(small.max()) + 1 if len(small) else 0, dtype=bool)
+            bitmap[small] = True
+            self.bitmaps[table] = bitmap
+            self.overflow[table] = set(ids[ids >= MAX_BITMAP_ID].tolist())
+
+    def contains(self, table, ids):
+        """Vectorized membership test; returns a bool array aligned with ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        with self.lock:
+            self._ensure(table)
+            bitmap, overflow = self.bitmaps[table], self.overflow[table]
+        in_range = (ids >= 0) & (ids < len(bitmap))
+        found = np.zeros(len(ids), dtype=bool)
+        found[in_range] = bitmap[ids[in_range]]
+        large = np.flatnonzero(ids >= MAX_BITMAP_ID)
+        if len(large) and overflow:
+            found[large] = [int(i) in overflow for i in ids[large]]
+        return found
+
+    def confirm(self, table, ids, live=True):
+        """Look ids up in the database; returns the exists mask aligned with ids.
+
+        Used on the IDs a batch would be rejected for, so a stale bitmap
+        never rejects a valid row. With live=True (references) the answer
+        also corrects the cached bitmap; live=False (primary keys) counts
+        soft-deleted rows too, since they still hold their key.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        candidates = np.unique(ids[ids >= 0])
+        existing = self._lookup(table, candidates, live) if len(candidates) else np.array([], dtype=np.int64)
+        if live:
+            self.add(table, existing)
+            self._discard(table, np.setdiff1d(candidates, existing))
+        return np.isin(ids, existing)
+
+    def add(self, table, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        with self.lock:
+            bitmap = self.bitmaps.get(table)
+            if bitmap is None or len(ids) == 0:
+                return
+            small = ids[(ids >= 0) & (ids < MAX_BITMAP_ID)]
+            if len(small) and small.max() >= len(bitmap):
+                bitmap = np.concatenate([bitmap, np.zeros(int(small.max()) + 1 - len(bitmap), dtype=bool)])
+            bitmap[small] = True
+            self.bitmaps[table] = bitmap
+            self.overflow[table].update(ids[ids >= MAX_BITMAP_ID].tolist())
+
+    def _discard(self, table, ids):
+        with self.lock:
+            bitmap = self.bitmaps.get(table)
+            if bitmap is not None:
+                bitmap[ids[(ids >= 0) & (ids < len(bitmap))]] = False
+                self.overflow[table].difference_update(ids[ids >= MAX_BITMAP_ID].tolist())
+
+    def remove(self, table, ids):
+        """Drop deleted IDs, and forget child tables the delete cascaded into."""
+        self._discard(table, np.asarray(ids, dtype=np.int64))
+        with self.lock:
+            for child in CASCADES[table]:
+                self.bitmaps.pop(child, None)
+
+    def invalidate(self, *tables):
+        with self.lock:
+            for table in tables or list(self.bitmaps):
+                self.bitmaps.pop(table, None)
+
+
+def validate_batch(registry, table, rows, check_existing_keys=True):
+    """Return a DataFrame of (row, column, value, problem) for every violation in rows.
+
+    rows is a DataFrame with the table's columns; an empty result means the
+    batch can be inserted without key errors.
+    """
+    primary_key, foreign_keys = SCHEMA[table]
+    problems = []
+
+    def report(mask, column, problem):
+        for position in np.flatnonzero(mask):
+            problems.append((int(position), column, rows[column].iloc[position], problem))
+
+    for column in [primary_key] + list(foreign_keys):
+        if column not in rows.columns:
+            return pd.DataFrame([(None, column, None, "missing column")], columns=["row", "column", "value", "problem"])
+
+    keys = pd.to_numeric(rows[primary_key], errors="coerce")
+    # 1.5 would otherwise be truncated to 1 and checked as that key
+    fractional = (keys.notna() & (keys % 1 != 0)).to_numpy()
+    report(fractional, primary_key, "not an integer")
+    report((keys.isna() | (keys <= 0)).to_numpy() & ~fractional, primary_key, "not a positive integer")
+    report(rows[primary_key].duplicated(keep=False).to_numpy(), primary_key, "duplicated within batch")
+    valid_keys = keys.where(~fractional).fillna(-1).astype(np.int64).to_numpy()
+    if check_existing_keys:
+        taken = registry.contains(table, valid_keys)
+        if taken.any():
+            taken[taken] = registry.confirm(table, valid_keys[taken], live=False)
+        report(taken, primary_key, "already exists")
+
+    for column, parent in foreign_keys.items():
+        refs = pd.to_numeric(rows[column], errors="coerce")
+        refs = refs.where(refs % 1 == 0)
+        report(refs.isna().to_numpy(), column, "not an integer")
+        ref_ids = refs.fillna(-1).astype(np.int64).to_numpy()
+        missing = refs.notna().to_numpy() & ~registry.contains(parent, ref_ids)
+        if missing.any():
+            missing[missing] = ~registry.confirm(parent, ref_ids[missing])
+        report(missing, column, f"no such {SCHEMA[parent][0]} in {parent}")
+
+    return pd.DataFrame(problems, columns=["row", "column", "value", "problem"]).sort_values(["row", "column"], ignore_index=True)
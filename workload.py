@@ -0,0 +1,614 @@
+"""Capture of the app's database workload, and replay of it against a copy.
+
+Capture (capture.enabled) wraps every connection made by the app's
+connect_endpoint() - the page sessions' get_mysql_connection() and the
+background workers alike - so that each cursor execute()/executemany(), and
+each commit and rollback, is appended to a gzipped JSON-lines log in
+capture.log_dir, one file per server process. The log holds:
+
+- a header with the wall-clock start of the log;
+- each distinct statement text once, as {"q": id, "sql": text}; statements
+  then refer to it by id, so a page that runs the same query all day costs
+  a few bytes per run;
+- one line per statement: connection, start offset "at" (ms since the log
+  started; the inter-arrival gaps are the differences), parameters, time
+  spent in execute plus fetching the rows ("ms"), rows fetched (or affected)
+  and error;
+- open/commit/rollback/close lines per connection, so replay keeps each
+  connection's statements, and its transactions, together.
+
+Parameters are the values staff typed and the data they read back filters
+on: keep the logs on the server and delete them after use.
+
+Replay re-runs a log against a local copy of the database, taken before the
+capture started (restore it before each replay, since writes are replayed
+too, or pass --reads-only). Each captured connection is replayed in order
+on one of --concurrency worker connections, at the captured pace (--speed 1),
+compressed (--speed 10) or as fast as possible (--speed max). Statements are
+grouped by fingerprint (the statement with its literals replaced by ?), and
+the per-fingerprint latencies are written to a results file; comparing the
+results of two builds shows where latency changed:
+
+    python workload.py summary workload/food_app-*.jsonl.gz
+    python workload.py replay LOG --database food_copy --speed 10 --concurrency 8 --out before.json
+    python workload.py replay LOG --database food_copy --speed 10 --concurrency 8 --out after.json
+    python workload.py compare before.json after.json
+
+A captured connection waits for a free replay connection, so with fewer
+replay connections than the capture had open at its peak, timelines start
+late. That queueing is reported on its own (start lag, late starts, with a
+warning), and each timeline's schedule lag is measured from when it
+actually started, so it only shows the database falling behind.
+
+Replay measures the database side of a build (schema, indexes, server
+settings, statements the app sends); it sends the captured statements, not
+the ones the code under test would send. Reads that columnar.read_frame()
+sends through connectorx are captured without row counts.
+"""
+import argparse
+import atexit
+import base64
+import contextlib
+import gzip
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from datetime import time as time_of_day
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+SPEEDS = {"1": 1.0, "10": 10.0, "max": None}
+LATE_START_MS = 10
+
+
+# -------------------------
+# Parameter encoding
+# -------------------------
+def _encode(value):
+    """JSON default= hook for the parameter types the app sends."""
+    if isinstance(value, datetime):
+        return {"$": "datetime", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {"$": "date", "v": value.isoformat()}
+    if isinstance(value, time_of_day):
+        return {"$": "time", "v": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"$": "timedelta", "v": value.total_seconds()}
+    if isinstance(value, Decimal):
+        return {"$": "decimal", "v": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$": "bytes", "v": base64.b64encode(value).decode("ascii")}
+    if hasattr(value, "item"):
+        # NumPy scalars from DataFrame rows
+        return value.item()
+    raise TypeError(f"Cannot record parameter of type {type(value).__name__}")
+
+
+_DECODERS = {
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "time": time_of_day.fromisoformat,
+    "timedelta": lambda v: timedelta(seconds=v),
+    "decimal": Decimal,
+    "bytes": base64.b64decode,
+}
+
+
+def _decode(value):
+    """Inverse of _encode() over a decoded JSON parameter structure."""
+    if isinstance(value, dict):
+        if set(value) == {"$", "v"}:
+            return _DECODERS[value["$"]](value["v"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return tuple(_decode(v) for v in value)
+    return value
+
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\((?:\s*(?:\?|%s)\s*,)*\s*(?:\?|%s)\s*\)")
+
+
+def fingerprint(sql):
+    """sql with literals as ?, placeholder lists collapsed and whitespace normalised."""
+    sql = _LITERALS.sub("?", " ".join(sql.split()))
+    return _LISTS.sub("(...)", sql)
+
+
+# -------------------------
+# Capture
+# -------------------------
+class Recorder:
+    """Appends the statements of wrapped connections to this process's log."""
+
+    def __init__(self, log_dir):
+        os.makedirs(log_dir, exist_ok=True)
+        started = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(log_dir, f"food_app-{started}-{os.getpid()}.jsonl.gz")
+        self.lock = threading.Lock()
+        self.file = gzip.open(self.path, "wt", encoding="utf-8")
+        self.origin = time.perf_counter()
+        self.templates = {}
+        self.connection_ids = itertools.count(1)
+        self.last_flush = time.monotonic()
+        self._write({"log": 1, "start": time.time(), "pid": os.getpid()})
+        atexit.register(self.close)
+
+    def now(self):
+        """Milliseconds since the log started."""
+        return round((time.perf_counter() - self.origin) * 1000, 3)
+
+    def _write(self, event):
+        self.file.write(json.dumps(event, separators=(",", ":"), default=_encode) + "\n")
+        if time.monotonic() - self.last_flush > 1:
+            # A sync flush every second, so a killed process loses at most a second of log
+            self.file.flush()
+            self.last_flush = time.monotonic()
+
+    def record(self, event, sql=None):
+        with self.lock:
+            if self.file.closed:
+                return
+            if sql is not None:
+                template = self.templates.get(sql)
+                if template is None:
+                    template = self.templates[sql] = len(self.templates) + 1
+                    self._write({"q": template, "sql": sql})
+                event["q"] = template
+            try:
+                self._write(event)
+            except TypeError as e:
+                logger.warning("Statement not captured: %s", e)
+
+    def wrap(self, conn, endpoint):
+        """conn, recording its statements; endpoint is the {"host", "port"} it was opened to."""
+        conn_id = next(self.connection_ids)
+        self.record({"e": "open", "c": conn_id, "at": self.now(), "db": f"{endpoint['host']}:{endpoint['port']}",
+                     "src": threading.current_thread().name})
+        return CapturingConnection(conn, self, conn_id)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class CapturingConnection:
+    """DBAPI connection proxy; everything other than cursors and transactions passes straight through."""
+
+    def __init__(self, conn, recorder, conn_id):
+        self._conn = conn
+        self._recorder = recorder
+        self._id = conn_id
+        self._cursors = weakref.WeakSet()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = CapturingCursor(self._conn.cursor(*args, **kwargs), self._recorder, self._id)
+        self._cursors.add(cursor)
+        return cursor
+
+    def _end(self, kind, action):
+        # Statements whose rows were never read to the end are recorded before the transaction ends
+        for cursor in list(self._cursors):
+            cursor._flush()
+        at = self._recorder.now()
+        try:
+            return action()
+        finally:
+            self._recorder.record({"e": kind, "c": self._id, "at": at})
+
+    def commit(self):
+        return self._end("commit", self._conn.commit)
+
+    def rollback(self):
+        return self._end("rollback", self._conn.rollback)
+
+    def close(self):
+        return self._end("close", self._conn.close)
+
+    @contextlib.contextmanager
+    def capture(self, sql):
+        """Record sql run on this connection's server by other means (connectorx)."""
+        event = {"e": "x", "c": self._id, "at": self._recorder.now()}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            event["err"] = str(e)
+            raise
+        finally:
+            event["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            self._recorder.record(event, sql)
+
+
+class CapturingCursor:
+    """Cursor proxy; a statement is recorded once its rows are fetched or the cursor moves on."""
+
+    def __init__(self, cursor, recorder, conn_id):
+        self._cursor = cursor
+        self._recorder = recorder
+        self._conn_id = conn_id
+        self._pending = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _flush(self):
+        if self._pending is not None:
+            event, sql = self._pending
+            self._pending = None
+            event["ms"] = round(event["ms"], 3)
+            if "rows" not in event:
+                event["rows"] = self._cursor.rowcount
+            self._recorder.record(event, sql)
+
+    def _run(self, sql, params, many, action):
+        self._flush()
+        event = {"e": "x", "c": self._conn_id, "at": self._recorder.now()}
+        if params:
+            event["p"] = params
+        if many:
+            event["many"] = 1
+        start = time.perf_counter()
+        try:
+            return action()
+        except Exception as e:
+            event["err"] = str(e)
+            raise
+        finally:
+            event["ms"] = (time.perf_counter() - start) * 1000
+            self._pending = (event, sql)
+            if "err" in event or self._cursor.description is None:
+                self._flush()
+
+    def execute(self, sql, params=(), *args, **kwargs):
+        return self._run(sql, params, False, lambda: self._cursor.execute(sql, params, *args, **kwargs))
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        return self._run(sql, seq_params, True, lambda: self._cursor.executemany(sql, seq_params, *args, **kwargs))
+
+    def _fetch(self, action, done, count):
+        start = time.perf_counter()
+        result = action()
+        if self._pending is not None:
+            event = self._pending[0]
+            event["ms"] += (time.perf_counter() - start) * 1000
+            event["rows"] = event.get("rows", 0) + count(result)
+            if done(result):
+                self._flush()
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone, lambda row: row is None, lambda row: row is not None)
+
+    def fetchmany(self, size=None):
+        action = self._cursor.fetchmany if size is None else lambda: self._cursor.fetchmany(size)
+        return self._fetch(action, lambda rows: not rows, len)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall, lambda rows: True, len)
+
+    def close(self):
+        self._flush()
+        return self._cursor.close()
+
+
+# -------------------------
+# Reading logs
+# -------------------------
+def read_log(path):
+    """(wall-clock start, templates {id: sql}, events) of one log; a log cut off mid-write is read up to its last line."""
+    start, templates, events = None, {}, []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                if "log" in event:
+                    start = event["start"]
+                elif "sql" in event:
+                    templates[event["q"]] = event["sql"]
+                else:
+                    events.append(event)
+        except (EOFError, gzip.BadGzipFile):
+            logger.warning("%s ends early (process did not exit cleanly); replaying what was written", path)
+    return start, templates, events
+
+
+def load_connections(paths):
+    """Captured connections of all logs on one timeline: [(open at ms, [event, ...])], by open time.
+
+    Each statement event gets its SQL text as "sql" and its decoded parameters.
+    """
+    logs = [(path, *read_log(path)) for path in paths]
+    origin = min(start for _, start, _, _ in logs)
+    connections = {}
+    for path, start, templates, events in logs:
+        offset = (start - origin) * 1000
+        for event in events:
+            event["at"] += offset
+            if event["e"] == "x":
+                event["sql"] = templates[event["q"]]
+                event["p"] = _decode(event.get("p", []))
+            connections.setdefault((path, event["c"]), []).append(event)
+    timelines = []
+    for events in connections.values():
+        events.sort(key=lambda event: event["at"])
+        timelines.append((events[0]["at"], events))
+    timelines.sort(key=lambda timeline: timeline[0])
+    return timelines
+
+
+def peak_open(timelines):
+    """Most captured connections open at the same time (from first to last event of each)."""
+    edges = sorted(edge for _, events in timelines for edge in ((events[0]["at"], 1), (events[-1]["at"], -1)))
+    peak = open_now = 0
+    for _, change in edges:
+        open_now += change
+        peak = max(peak, open_now)
+    return peak
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return float("nan")
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def is_read(sql):
+    return sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "SHOW", "WITH", "EXPLAIN")
+
+
+def summarize(paths):
+    """Print statement counts, captured latencies and inter-arrival gaps of the logs."""
+    timelines = load_connections(paths)
+    statements = sorted((e for _, events in timelines for e in events if e["e"] == "x"), key=lambda e: e["at"])
+    if not statements:
+        print("No statements captured")
+        return
+    gaps = sorted(b["at"] - a["at"] for a, b in zip(statements, statements[1:]))
+    span = (statements[-1]["at"] - statements[0]["at"]) / 1000
+    print(f"{len(statements)} statements on {len(timelines)} connections over {span:.1f}s")
+    if gaps:
+        print(f"inter-arrival gap ms: p50 {percentile(gaps, 0.5):.1f}  p95 {percentile(gaps, 0.95):.1f}  "
+              f"max {gaps[-1]:.1f}")
+    by_fingerprint = {}
+    for event in statements:
+        by_fingerprint.setdefault(fingerprint(event["sql"]), []).append(event)
+    print(f"{'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}  statement")
+    for text, events in sorted(by_fingerprint.items(), key=lambda item: -sum(e["ms"] for e in item[1])):
+        latencies = sorted(e["ms"] for e in events)
+        errors = sum("err" in e for e in events)
+        print(f"{len(events):>7} {percentile(latencies, 0.5):>8.1f} {percentile(latencies, 0.95):>8.1f} "
+              f"{errors:>6}  {text[:100]}")
+
+
+# -------------------------
+# Replay
+# -------------------------
+class Replayer:
+    """Re-run captured connections on `concurrency` connections opened by connect()."""
+
+    def __init__(self, connect, speed, concurrency, reads_only=False):
+        self.connect = connect
+        self.speed = speed
+        self.concurrency = concurrency
+        self.reads_only = reads_only
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.lags = []
+        self.start_lags = []
+        self.skipped = 0
+        self.peak_open = 0
+
+    def _wait(self, at, shift_ms=0.0):
+        """Sleep until the scaled offset `at` of the capture, plus shift_ms; returns how late this is, in ms."""
+        if self.speed is None:
+            return 0.0
+        delay = self.start + at / 1000 / self.speed + shift_ms / 1000 - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+            return 0.0
+        return -delay * 1000
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self.connect()
+            self.connections.append(conn)
+        return conn
+
+    def _statement(self, cursor, event):
+        key = fingerprint(event["sql"])
+        start = time.perf_counter()
+        try:
+            if event.get("many"):
+                cursor.executemany(event["sql"], event["p"])
+            else:
+                cursor.execute(event["sql"], event["p"])
+            if cursor.description is not None:
+                cursor.fetchall()
+            error = False
+        except Exception as e:
+            logger.debug("Replayed statement failed: %s", e)
+            error = True
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.latencies.setdefault(key, []).append(round(elapsed, 3))
+            if error:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def _replay_connection(self, events):
+        conn = self._connection()
+        cursor = conn.cursor()
+        # How late this timeline started, e.g. waiting for a replay connection; its later
+        # statements are scheduled from the actual start so that queueing is not counted twice
+        start_lag = self._wait(events[0]["at"])
+        with self.lock:
+            self.start_lags.append(start_lag)
+        try:
+            for event in events:
+                lag = self._wait(event["at"], start_lag)
+                if event["e"] == "x":
+                    if self.reads_only and not is_read(event["sql"]):
+                        with self.lock:
+                            self.skipped += 1
+                        continue
+                    with self.lock:
+                        self.lags.append(lag)
+                    self._statement(cursor, event)
+                elif event["e"] == "commit" and not self.reads_only:
+                    conn.commit()
+                elif event["e"] == "rollback":
+                    conn.rollback()
+        finally:
+            cursor.close()
+            # The app's pool resets a connection when it is returned; end any open transaction the same way
+            conn.rollback()
+
+    def run(self, timelines):
+        """Replay every timeline; returns the wall-clock seconds taken."""
+        self.connections = []
+        self.peak_open = peak_open(timelines)
+        if self.speed is not None and self.concurrency < self.peak_open:
+            logger.warning("The capture had %d connections open at once but replay uses %d: timelines will "
+                           "start late (see the start lag); use --concurrency %d to replay the captured overlap",
+                           self.peak_open, self.concurrency, self.peak_open)
+        self.start = time.perf_counter()
+        if self.speed is not None and timelines:
+            # Start the replay clock at the first captured connection, not at the start of the log
+            self.start -= timelines[0][0] / 1000 / self.speed
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as executor:
+            futures = [executor.submit(self._replay_connection, events) for _, events in timelines]
+            for future in futures:
+                future.result()
+        seconds = time.perf_counter() - self.start
+        for conn in self.connections:
+            conn.close()
+        return seconds
+
+    def results(self, label, seconds):
+        lags = sorted(self.lags)
+        start_lags = sorted(self.start_lags)
+        return {
+            "label": label,
+            "speed": "max" if self.speed is None else self.speed,
+            "concurrency": self.concurrency,
+            "peak_open_connections": self.peak_open,
+            "reads_only": self.reads_only,
+            "seconds": round(seconds, 3),
+            "schedule_lag_p95_ms": round(percentile(lags, 0.95), 1) if lags else 0.0,
+            "start_lag_p95_ms": round(percentile(start_lags, 0.95), 1) if start_lags else 0.0,
+            "late_starts": sum(lag > LATE_START_MS for lag in start_lags),
+            "skipped": self.skipped,
+            "statements": {key: {"latencies": values, "errors": self.errors.get(key, 0)}
+                           for key, values in self.latencies.items()},
+        }
+
+
+def print_results(results):
+    statements = results["statements"]
+    count = sum(len(s["latencies"]) for s in statements.values())
+    errors = sum(s["errors"] for s in statements.values())
+    print(f"{results['label']}: {count} statements ({errors} failed, {results['skipped']} skipped) in "
+          f"{results['seconds']:.1f}s at speed {results['speed']}, concurrency {results['concurrency']}; "
+          f"p95 schedule lag {results['schedule_lag_p95_ms']:.1f} ms")
+    late = results.get("late_starts", 0)
+    if late:
+        print(f"  {late} connections started more than {LATE_START_MS} ms late (p95 start lag "
+              f"{results['start_lag_p95_ms']:.1f} ms): the capture had {results['peak_open_connections']} open "
+              f"at once, replay used {results['concurrency']}")
+
+
+def compare(before, after, top=20):
+    """Print per-fingerprint latency changes from the `before` results to the `after` results."""
+    rows = []
+    for key in set(before["statements"]) | set(after["statements"]):
+        a = sorted(before["statements"].get(key, {}).get("latencies", []))
+        b = sorted(after["statements"].get(key, {}).get("latencies", []))
+        rows.append((sum(b) - sum(a), key, a, b))
+    rows.sort(key=lambda row: -abs(row[0]))
+    for results in (before, after):
+        print_results(results)
+    total_a = sum(sum(s["latencies"]) for s in before["statements"].values())
+    total_b = sum(sum(s["latencies"]) for s in after["statements"].values())
+    print(f"total statement time: {total_a / 1000:.2f}s -> {total_b / 1000:.2f}s "
+          f"({_change(total_a, total_b)})\n")
+    print(f"{'count':>13} {'p50 ms':>17} {'p95 ms':>17} {'p50':>7} {'total s':>8}  statement")
+    for delta, key, a, b in rows[:top]:
+        p50 = (percentile(a, 0.5), percentile(b, 0.5))
+        p95 = (percentile(a, 0.95), percentile(b, 0.95))
+        print(f"{len(a):>6}->{len(b):<6} {p50[0]:>7.1f}->{p50[1]:<8.1f} {p95[0]:>7.1f}->{p95[1]:<8.1f} "
+              f"{_change(*p50):>7} {delta / 1000:>+8.2f}  {key[:80]}")
+
+
+def _change(a, b):
+    if not a or a != a or b != b:
+        return "n/a"
+    return f"{(b - a) / a:+.0%}"
+
+
+if __name__ == "__main__":
+    import mysql.connector
+
+    from config import load_config
+
+    parser = argparse.ArgumentParser(description="Summarise, replay and compare captured database workloads")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary_parser = commands.add_parser("summary", help="statement counts and gaps of captured logs")
+    summary_parser.add_argument("logs", nargs="+")
+    replay_parser = commands.add_parser("replay", help="re-run captured logs against a database copy")
+    replay_parser.add_argument("logs", nargs="+")
+    replay_parser.add_argument("--database", required=True,
+                               help="database to replay into; named explicitly so the live one is not hit by accident")
+    replay_parser.add_argument("--host", help="defaults to database.host")
+    replay_parser.add_argument("--port", type=int, help="defaults to database.port")
+    replay_parser.add_argument("--speed", choices=sorted(SPEEDS), default="1", help="1x, 10x or max speed")
+    replay_parser.add_argument("--concurrency", type=int, default=8, help="replay connections")
+    replay_parser.add_argument("--reads-only", action="store_true", help="skip writes and commits")
+    replay_parser.add_argument("--label", help="build name shown in reports; defaults to the --out file name")
+    replay_parser.add_argument("--out", required=True, help="JSON results file for compare")
+    compare_parser = commands.add_parser("compare", help="latency changes between two replay results")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--top", type=int, default=20, help="statements to list")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        summarize(args.logs)
+    elif args.command == "compare":
+        with open(args.before) as f_before, open(args.after) as f_after:
+            compare(json.load(f_before), json.load(f_after), args.top)
+    else:
+        db = load_config().database
+
+        def connect():
+            return mysql.connector.connect(
+                host=args.host or db.host, port=args.port or db.port, user=db.user, password=db.password,
+                database=args.database, connection_timeout=db.connect_timeout,
+                init_command=f"SET SESSION MAX_EXECUTION_TIME={db.read_timeout * 1000}")
+
+        replayer = Replayer(connect, SPEEDS[args.speed], args.concurrency, args.reads_only)
+        seconds = replayer.run(load_connections(args.logs))
+        results = replayer.results(args.label or os.path.splitext(os.path.basename(args.out))[0], seconds)
+        with open(args.out, "w") as f:
+            json.dump(results, f)
+        print_results(results)